@@ -1,6 +1,9 @@
-import re
 from dataclasses import dataclass, field
-import json
+import logging
+from signal_parser import parse_alert_fields
+from logging_setup import LazyJson
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -18,22 +21,7 @@ class Order:
 
 
 def parse_order_text(text: str) -> Order:
-    patterns = {
-        "ticker": r"Segnale su (.+)",
-        "time": r"Ora:\s*(.+)",
-        "close_price": r"Prezzo chiusura:\s*([\d.]+)",
-        "action": r"Azione:\s*(.+)",
-        "comment": r"Commento:\s*(.+)",
-        "trade_id": r"id trade\s+(.+)",
-        "size": r"size:\s*([\d.]+)",
-        "message": r"Message:\s*(.+)"
-    }
-
-    extracted = {}
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text)
-        if match:
-            extracted[key] = match.group(1).strip()
+    extracted = parse_alert_fields(text)
 
     # Determina il tipo di ordine
     comment = extracted.get("comment", "").upper()
@@ -60,23 +48,22 @@ def parse_order_text(text: str) -> Order:
 
 
 def process_order_request(request) -> Order:
-    print("=======================================")
-    print("Received Order Request")
-    print("_______________________________________")
     # Estrai il corpo JSON dalla request
     data = request.get_json()
-    print("json data: ", json.dumps(data, indent=2))
+    logger.debug("Received Order Request: %s", LazyJson(data))
 
     # Esegui il parsing del campo "text"
     order = parse_order_text(data["text"])
 
-    print("_______________________________________")
-    print("ticker:", order.ticker)
-    print("action:", order.action)
-    print("comment:", order.comment)
-    print("message:", order.message)
-    print("size:", order.size)
-    print("order_type:", order.order_type)
-    print("=======================================")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Ordine parsificato", extra={
+            "ticker": order.ticker,
+            "action": order.action,
+            "comment": order.comment,
+            "order_message": order.message,
+            "size": order.size,
+            "order_type": order.order_type,
+            "trade_id": order.trade_id,
+        })
 
     return order
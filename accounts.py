@@ -0,0 +1,125 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Account su cui replicare ogni segnale, es. ACCOUNTS=main,sub1,sub2. "main" usa API_KEY,
+# SECRET e PASSPHRASE; gli altri <NOME>_API_KEY, <NOME>_SECRET, <NOME>_PASSPHRASE e
+# facoltativi <NOME>_SIZE_SCALE (moltiplicatore della size, default 1) e <NOME>_EXCHANGE.
+# Senza ACCOUNTS il server opera sul solo account "main", come prima.
+ACCOUNTS = [name.strip() for name in os.getenv("ACCOUNTS", "").split(",") if name.strip()]
+PRIMARY_ACCOUNT = "main"
+# Exchange con un client implementato; bybit è riconosciuto ma non ancora supportato
+SUPPORTED_EXCHANGES = ("bitget",)
+
+
+@dataclass
+class Account:
+    """Credenziali e dimensionamento di un account (il primo della lista è l'account principale)."""
+    name: str
+    api_key: Optional[str] = field(default=None, repr=False)
+    secret: Optional[str] = field(default=None, repr=False)
+    passphrase: Optional[str] = field(default=None, repr=False)
+    exchange: str = "bitget"
+    size_scale: float = 1.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "Account":
+        prefix = "" if name == PRIMARY_ACCOUNT else f"{name.upper()}_"
+        try:
+            size_scale = float(os.getenv(f"{prefix}SIZE_SCALE", 1))
+        except ValueError:
+            raise ValueError(f"{prefix}SIZE_SCALE non valido per l'account {name}")
+        return cls(
+            name=name,
+            api_key=os.getenv(f"{prefix}API_KEY"),
+            secret=os.getenv(f"{prefix}SECRET"),
+            passphrase=os.getenv(f"{prefix}PASSPHRASE"),
+            exchange=os.getenv(f"{prefix}EXCHANGE", "bitget").lower(),
+            size_scale=size_scale,
+        )
+
+
+def load_accounts(names: Optional[List[str]] = None) -> List[Account]:
+    """
+    Account configurati, il principale per primo. Solleva ValueError per un exchange senza
+    client, un moltiplicatore non positivo o credenziali mancanti su un account secondario.
+    """
+    names = list(names if names is not None else ACCOUNTS) or [PRIMARY_ACCOUNT]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account duplicati in ACCOUNTS: {', '.join(names)}")
+    accounts = []
+    for name in names:
+        account = Account.from_env(name)
+        if account.exchange not in SUPPORTED_EXCHANGES:
+            raise ValueError(f"Exchange {account.exchange} non supportato (account {name})")
+        if account.size_scale <= 0:
+            raise ValueError(f"Moltiplicatore della size non positivo per l'account {name}")
+        if name != PRIMARY_ACCOUNT and not (account.api_key and account.secret and account.passphrase):
+            raise ValueError(f"Credenziali mancanti per l'account {name}")
+        accounts.append(account)
+    return accounts
+
+
+class AccountRegistry:
+    """
+    Account e relativi client, creati al primo uso: ogni client ha il proprio pool di
+    connessioni, rate limiter, cache della leva e position book (i limiti di Bitget sono
+    per account). `primary_client` riusa un client già creato per l'account principale.
+    """
+
+    def __init__(self, accounts: List[Account], create_client: Callable[[Account], object],
+                 create_outbox: Optional[Callable[[Account], object]] = None, primary_client=None):
+        self._accounts: Dict[str, Account] = {account.name: account for account in accounts}
+        self.primary = accounts[0]
+        self._create_client = create_client
+        self._create_outbox = create_outbox
+        self._clients = {}
+        self._outboxes = {}
+        if primary_client is not None:
+            self._clients[self.primary.name] = primary_client
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self._accounts.values())
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def account(self, name: str) -> Account:
+        return self._accounts[name]
+
+    def _lazy(self, cache: dict, name: str, create):
+        value = cache.get(name, cache)
+        if value is cache:
+            with self._lock:
+                value = cache.get(name, cache)
+                if value is cache:
+                    value = cache[name] = create(self._accounts[name])
+        return value
+
+    def client(self, name: str):
+        return self._lazy(self._clients, name, self._create_client)
+
+    def outbox(self, name: str):
+        """Outbox dell'account (None se disattivato): le gambe vengono ritentate con il suo client."""
+        if self._create_outbox is None:
+            return None
+        return self._lazy(self._outboxes, name, self._create_outbox)
+
+    def leg_prefix(self, name: str) -> str:
+        """Prefisso delle gambe e dei clientOid: vuoto per l'account principale."""
+        return "" if name == self.primary.name else f"{name}-"
+
+    def stats(self) -> dict:
+        stats = {}
+        for account in self:
+            client = self._clients.get(account.name)
+            stats[account.name] = {
+                "exchange": account.exchange,
+                "size_scale": account.size_scale,
+                "http_pool": client.pool_metrics() if client else None,
+                "rate_limits": client.rate_limiter.stats() if client else None,
+                "positions": client.positions.stats() if client else None,
+            }
+        return stats
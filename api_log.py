@@ -0,0 +1,101 @@
+import os
+import json
+import zlib
+from typing import Any, Optional, Tuple
+
+# Compressione zlib del record delle chiamate API oltre una soglia in byte (le risposte piccole restano JSON)
+COMPRESS = os.getenv("API_LOG_COMPRESS", "true").lower() == "true"
+COMPRESS_MIN_BYTES = int(os.getenv("API_LOG_COMPRESS_MIN_BYTES", 512))
+COMPRESS_LEVEL = 6
+
+# Chiavi mai salvate in chiaro (header firmati e credenziali), confrontate in minuscolo
+SECRET_KEYS = frozenset({
+    "access-key", "access-sign", "access-passphrase", "apikey", "api_key",
+    "secret", "secretkey", "api_secret", "passphrase", "password", "sign", "signature",
+})
+REDACTED = "***"
+
+_separators = (",", ":")
+
+
+def redact(value: Any) -> Any:
+    """Copia di dizionari e liste con i valori delle chiavi segrete mascherati."""
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in SECRET_KEYS else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def _as_dict(value: Any) -> dict:
+    """I chiamanti storici passavano stringhe JSON: vengono decodificate una sola volta."""
+    if isinstance(value, dict):
+        return value
+    try:
+        decoded = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return decoded if isinstance(decoded, dict) else {}
+
+
+def order_id_of(data: Any) -> Optional[str]:
+    """orderId della risposta Bitget (place-order, tpsl) o del primo ordine di close-positions."""
+    if isinstance(data, dict):
+        if data.get("orderId"):
+            return str(data["orderId"])
+        success = data.get("successList")
+        if isinstance(success, list) and success and isinstance(success[0], dict):
+            return order_id_of(success[0])
+    return None
+
+
+def encode(record: Any) -> Tuple[bytes, int]:
+    """Serializza il record una volta sola: (byte da salvare, 1 se compressi con zlib)."""
+    raw = json.dumps(record, separators=_separators, ensure_ascii=False, default=str).encode("utf-8")
+    if COMPRESS and len(raw) >= COMPRESS_MIN_BYTES:
+        return zlib.compress(raw, COMPRESS_LEVEL), 1
+    return raw, 0
+
+
+def decode(data: Optional[bytes], compressed: Any = 0) -> Any:
+    """Record salvato in api_requests.data, decompresso e decodificato."""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if compressed:
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+
+def compact_row(request_log: Any, response_log: Any, signal_id: Optional[str] = None) -> tuple:
+    """
+    Riga di api_requests: colonne indicizzate estratte dal log della chiamata e un solo record
+    {payload, response} al posto di body/headers/payload/response_* serializzati più volte.
+    Il body firmato coincide con il payload e gli header firmati non vengono salvati.
+    """
+    req = _as_dict(request_log)
+    res = _as_dict(response_log)
+    response_json = res.get("response_json")
+    record = {"payload": redact(req.get("payload"))}
+    if isinstance(response_json, dict) and response_json:
+        record["response"] = redact(response_json)
+    elif res.get("response_body"):
+        record["response"] = res["response_body"]  # testo non JSON o messaggio di errore
+    data, compressed = encode(record)
+    data_field = res.get("response_data")
+    if data_field in (None, "") and isinstance(response_json, dict):
+        data_field = response_json.get("data")
+    return (
+        req.get("endpoint", ""),
+        str(res.get("response_status", "")),
+        res.get("response_code") or "",
+        (res.get("response_msg") or "")[:255],
+        order_id_of(data_field),
+        req.get("latency_ms"),
+        req.get("queue_delay_ms"),
+        signal_id,
+        req.get("account"),
+        data,
+        compressed,
+    )
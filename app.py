@@ -1,137 +1,283 @@
 # app.py
+import env_setup  # noqa: F401  (.env caricato prima di ogni modulo che legge variabili all'import)
 import json
-import uuid
 import math
-from flask import Flask, request, jsonify
-from utils import parse_signal_string
-from bitget_client import BitgetClient
-from db_module import DatabaseService
-from Order import Order, process_order_request
+import logging
+import threading
+from flask import Blueprint, Flask, Response, current_app, request, jsonify
+from Order import Order
 import os
+from typing import Optional
+import services
+import order_flow
+import signal_flow
+from execution_planner import ExecutionPlanner
+from order_queue import OrderDispatcher, LaneFull
+from basket import BasketLeg
+from order_flow import AccountOrder
+from contracts import PositionPlan
+from signal_dedup import DuplicateSignal
+from logging_setup import configure_logging, signal_context
+from metrics import SignalTrace, use_trace, current_trace, render_prometheus, TRACE_SIGNALS, WEBHOOK_SECONDS
 
-app = Flask(__name__)
-client = BitgetClient()
-db = DatabaseService()
+# Log JSON scritti da un thread dedicato: stdout non blocca il percorso dell'ordine
+configure_logging()
+logger = logging.getLogger(__name__)
 
+# DB, client Bitget, deduplica e outbox vivono in services.py e vengono creati al primo uso
+# (o dal thread di avvio di create_app): l'import di questo modulo non apre connessioni
+webhook = Blueprint("webhook", __name__)
 
-@app.route("/order", methods=["POST"])
+ASYNC_ORDERS = os.getenv("ASYNC_ORDERS", "false").lower() == "true"
+
+
+def execute_order(order: Order, signal_id: str):
+    """Esegue un ordine OPEN o CLOSE (o un blocco di un basket) e restituisce il risultato da salvare."""
+    if isinstance(order, AccountOrder):
+        return execute_accounts(order, signal_id)
+    if isinstance(order, PositionPlan):
+        return execute_plan(order, signal_id)
+    if isinstance(order, BasketLeg):
+        return place_basket_leg(order, signal_id)
+    if order.order_type == "OPEN":
+        return place_order(order, signal_id)
+    if order.order_type == "CLOSE":
+        result = services.get_client().close_all_positions(symbol=order.ticker.replace(".P", ""), signal_id=signal_id)
+        return dict(result, signal_id=signal_id)
+    raise ValueError("Tipo di ordine non riconosciuto")
+
+
+def save_order_result(signal_id: str, result_json):
+    """Aggiorna il record request_log del segnale con la risposta (usato dai worker asincroni)."""
+    db = services.get_db()
+    db.update_request_response(None, json.dumps(result_json), signal_id=signal_id)
+    trace = current_trace()
+    if TRACE_SIGNALS and trace is not None:
+        db.update_request_trace(signal_id, trace.as_dict())
+
+
+_dispatcher: Optional[OrderDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> OrderDispatcher:
+    """Una corsia per symbol: ordine rigoroso sullo stesso ticker, parallelismo tra ticker diversi."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = OrderDispatcher(execute_order, on_done=save_order_result)
+    return _dispatcher
+
+
+@webhook.route("/order", methods=["POST"])
 def handle_order():
     """Gestisce una nuova richiesta di ordine (OPEN o CLOSE)."""
-    order = process_order_request(request)
-    signal_id = str(uuid.uuid4())
-
-  
-    print("***************************")
-    print("richiesta ricevuta: ", request)
+    trace = SignalTrace()
+    status = 500
     try:
-        data = request.get_json(force=False, silent=False)
-        print("richiesta ricevuta:", json.dumps(data, indent=2))
-    except Exception as e:
-        print(f"❌ Errore nel parsing JSON: {e}")
-        print("Corpo grezzo:", request.data.decode('utf-8', errors='ignore'))
+        with use_trace(trace):
+            response = current_app.make_response(_receive_signal(trace))
+        status = response.status_code
+        return response
+    finally:
+        WEBHOOK_SECONDS.observe(trace.elapsed(), order_type=trace.order_type or "unknown", status=status)
+        # In modalità asincrona la traccia viene salvata dal worker a esecuzione conclusa
+        if TRACE_SIGNALS and trace.signal_id and status != 202:
+            services.get_db().update_request_trace(trace.signal_id, trace.as_dict())
+
+
+def _receive_signal(trace: SignalTrace):
+    signal = signal_flow.receive(request, services.get_dedup(), trace)
+    # Tutte le righe di log del segnale (anche dai worker) portano il suo signal_id
+    with signal_context(signal.signal_id):
+        return _handle_signal(signal, trace)
+
+
+def _handle_signal(signal: signal_flow.Signal, trace: SignalTrace):
+    """I/O del segnale con il DB sincrono e le corsie a thread; le decisioni sono in signal_flow."""
+    signal_flow.log_received(signal)
 
     # ✅ Salva richiesta in ingresso nel DB
-    request_id = db.log_incoming_request(
-        signal_id=signal_id,
-        request_text=request.get_json(),
-        response_text="null",
-    )
+    db = services.get_db()
+    try:
+        request_id = db.log_incoming_request(**signal.log_fields())
+    except DuplicateSignal:
+        signal.mark_duplicate(trace)
+        request_id = db.log_incoming_request(**signal.log_fields())
 
-    if order.order_type == "OPEN":
-        result_json = place_order(order, signal_id)
-    elif order.order_type == "CLOSE":
-        client.close_all_positions(symbol=order.ticker.replace(".P", ""))
-        result_json = {"status": "closed", "signal_id": signal_id}
-    else:
-        return jsonify({"error": "Tipo di ordine non riconosciuto"}), 400
+    step = signal_flow.plan(signal, services.get_accounts(), services.get_client().contracts)
+    if isinstance(step, signal_flow.Reply):
+        return _reply(db, request_id, signal.signal_id, step)
+
+    dispatcher = get_dispatcher()
+    try:
+        # Modalità asincrona: l'ordine viene eseguito da un worker, TradingView riceve subito 202
+        if ASYNC_ORDERS:
+            step.submit(dispatcher)
+            return _reply(db, request_id, signal.signal_id, step.accepted())
+        result_json = step.result(step.execute(dispatcher))
+    except LaneFull as e:
+        return _reply(db, request_id, signal.signal_id, signal_flow.rejected(signal.signal_id, e))
 
     # ✅ Aggiorna il record request_log con la risposta
-    db.update_request_response(request_id, json.dumps(result_json))
+    return _reply(db, request_id, signal.signal_id, signal_flow.Reply(200, result_json))
+
+
+def _reply(db, request_id, signal_id: str, reply: signal_flow.Reply):
+    if reply.save:
+        db.update_request_response(request_id, json.dumps(reply.body), signal_id=signal_id)
+    return jsonify(reply.body), reply.status
+
+
+@webhook.route("/signal/<signal_id>", methods=["GET"])
+def signal_status(signal_id):
+    """Stato di un segnale: risposta salvata in request_log o stato del worker se non ancora scritta."""
+    record = services.get_db().get_request_by_signal(signal_id)
+    status, result = signal_flow.signal_status(signal_id, record, get_dispatcher().status(signal_id))
+    return jsonify(result), status
+
+
+@webhook.route("/signals", methods=["GET"])
+def list_signals():
+    """
+    Segnali dal più recente con le chiamate Bitget collegate.
+    Filtri: ticker, from/to (ISO, orario del server); paginazione keyset con before=<next_before>.
+    """
+    try:
+        query = signal_flow.signals_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status, result = signal_flow.signals_page(services.get_db().find_signals(*query))
+    return jsonify(result), status
+
 
-    return jsonify(result_json)
+@webhook.route("/signal/<signal_id>/calls", methods=["GET"])
+def signal_calls(signal_id):
+    """Dettaglio di un segnale: richiesta salvata e chiamate Bitget con payload e risposta."""
+    db = services.get_db()
+    record = db.get_request_by_signal(signal_id)
+    status, result = signal_flow.signal_calls(signal_id, record, db.get_api_calls(signal_id) if record else None)
+    return jsonify(result), status
 
-@app.route("/ping", methods=["GET"])
+
+@webhook.route("/ping", methods=["GET"])
 def ping():
-    """Verifica lo stato del server e restituisce l'ultimo signal_id nel DB."""
-    result = db.get_last_request_info()
+    """
+    Verifica lo stato del server e restituisce l'ultimo signal_id ricevuto (snapshot in memoria).
+    Risponde anche durante l'avvio, prima che DB ed exchange siano collegati ("ready": false).
+    """
+    ready = services.wait_ready(0)
+    db = services.peek_db()
+    result = db.last_signal() if db is not None else None
 
     if not result:
         return jsonify({
             "status": "ok",
-            "message": "Nessuna richiesta trovata in request_log"
+            "ready": ready,
+            "message": "Nessuna richiesta trovata in request_log" if db is not None else "Avvio in corso"
         }), 200
 
     return jsonify({
         "status": "ok",
+        "ready": ready,
         "signal_id": result["signal_id"],
-        "received_at": result["request_time"].strftime("%Y-%m-%d %H:%M:%S")
+        "received_at": signal_flow.format_time(result["request_time"])
+    }), 200
+
+@webhook.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Istogrammi di latenza del processo nel formato di Prometheus."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@webhook.route("/stats", methods=["GET"])
+def stats():
+    """Metriche del pool di connessioni verso Bitget e chiamate evitate dalla cache di stato."""
+    client = services.get_client()
+    outbox_worker, position_stream = services.outbox_worker(), services.position_stream()
+    return jsonify({
+        "startup": services.startup_stats(),
+        "http_pool": client.pool_metrics(),
+        "leverage_cache": client.state_cache.stats(),
+        "rate_limits": client.rate_limiter.stats(),
+        "order_lanes": get_dispatcher().stats(),
+        "dedup": services.get_dedup().stats(),
+        "contracts": client.contracts.stats(),
+        "outbox": outbox_worker.stats() if outbox_worker else None,
+        "accounts": services.account_stats(),
+        "positions": dict(client.positions.stats(), stream=position_stream.stats() if position_stream else None)
     }), 200
 
+
+def plan_order(order: Order, msg: Optional[dict] = None, scale: float = 1.0) -> PositionPlan:
+    """Gambe arrotondate e validate di un ordine OPEN (vedi order_flow.plan_order)."""
+    return order_flow.plan_order(order, services.get_client().contracts, msg, scale)
+
+
+def plan_basket_leg(leg: BasketLeg, scale: float = 1.0) -> PositionPlan:
+    """Gambe di un blocco dell'alert basket, arrotondate e validate come plan_order."""
+    return order_flow.plan_basket_leg(leg, services.get_client().contracts, scale)
+
+
 def place_order(order: Order, signal_id: str):
     """
     Esegue tutte le chiamate Bitget e le logga con lo stesso signal_id.
-    Supporta TP multipli con qty_distribution oppure TP singolo.
+    Leva e ordine principale partono per primi; le gambe TP/SL, indipendenti
+    tra loro, vengono inviate in parallelo dopo l'ingresso.
+    Ogni gamba ha un clientOid derivato dal signal_id, quindi un alert ripetuto
+    viene rifiutato da Bitget anche se arriva a un altro worker.
+    """
+    return execute_plan(plan_order(order), signal_id)
+
+
+def place_basket_leg(leg: BasketLeg, signal_id: str):
+    """Esegue un blocco dell'alert basket: ingresso, TP parziali e SL sul symbol del blocco."""
+    return execute_plan(leg.plan or plan_basket_leg(leg), signal_id, oid_prefix=f"{leg.key}-")
+
+
+def execute_plan(plan: PositionPlan, signal_id: str, oid_prefix=""):
+    return execute_position(plan.symbol, "USDT", plan.side, plan.trade_side, plan.size, plan.take_profits,
+                            plan.stop_loss, signal_id, oid_prefix=oid_prefix)
+
+
+def execute_position(symbol, margin_coin, side, trade_side, qty, take_profit_legs, sl_price, signal_id,
+                     oid_prefix=""):
+    """
+    Piano di esecuzione di una posizione: leva -> ordine principale -> TP/SL in parallelo.
+    I clientOid sono derivati dal signal_id (con oid_prefix per i blocchi di un basket).
+    Le gambe fallite per errori transitori passano all'outbox e vengono ritentate con lo
+    stesso clientOid; se è l'ingresso a fallire, TP e SL partono solo dopo il suo recupero.
+    """
+    legs = order_flow.PositionLegs(services.get_client(), services.get_outbox(), symbol, margin_coin, side,
+                                   trade_side, qty, take_profit_legs, sl_price, signal_id, oid_prefix)
+    return legs.results(legs.add_to(ExecutionPlanner()).run())
+
+
+def execute_accounts(job: AccountOrder, signal_id: str):
+    """
+    Stesso segnale su tutti gli account di ACCOUNTS: le gambe di ogni account, con il suo
+    client e i suoi clientOid, in un unico planner (vedi order_flow.AccountFanOut).
+    """
+    fan_out = order_flow.AccountFanOut(services.get_accounts(), job, signal_id)
+    return fan_out.results(fan_out.add_to(ExecutionPlanner()).run())
+
+
+def create_app(start_services: bool = True) -> Flask:
+    """
+    Applicazione Flask del webhook. Con start_services DB, deduplica, client Bitget e
+    thread di background vengono avviati in un thread separato: il processo accetta
+    richieste (e /ping risponde) subito, un ordine arrivato prima attende solo i singoli
+    servizi che gli servono.
     """
-    symbol = order.ticker.replace(".P", "")
-    margin_coin = "USDT"
-    side = order.action
-    trade_side = order.order_type.lower()
-    leverage = "20"
-
-    msg = parse_signal_string(order.message)
-    qty = abs(order.size)
-
-    take_profit_orders = {}
-    stop_loss_order = None
-
-    # -----------------------------
-    # TP multipli con qty_distribution
-    # -----------------------------
-    if "qty_distribution" in msg and all(k in msg for k in ["tp1", "tp2", "tp3", "stop_loss"]):
-        tp1_price, tp2_price, tp3_price, sl_price = msg["tp1"], msg["tp2"], msg["tp3"], msg["stop_loss"]
-        tp1_qty = max(1, round(msg["qty_distribution"]["TP1"] / 100 * qty))
-        tp2_qty = max(1, round(msg["qty_distribution"]["TP2"] / 100 * qty))
-        tp3_qty = max(1, round(msg["qty_distribution"]["TP3"] / 100 * qty))
-
-        take_profit_orders = {
-            "tp1": client.place_tp_sl(symbol, margin_coin, str(tp1_qty), side, tp1_price, "profit_plan", signal_id),
-            "tp2": client.place_tp_sl(symbol, margin_coin, str(tp2_qty), side, tp2_price, "profit_plan", signal_id),
-            "tp3": client.place_tp_sl(symbol, margin_coin, str(tp3_qty), side, tp3_price, "profit_plan", signal_id)
-        }
-        stop_loss_order = client.place_tp_sl(symbol, margin_coin, str(qty), side, sl_price, "loss_plan", signal_id)
-
-    # -----------------------------
-    # TP singolo
-    # -----------------------------
-    elif "tp" in msg and "stop_loss" in msg:
-        tp_price = msg["tp"]
-        sl_price = msg["stop_loss"]
-
-        take_profit_orders = {
-            "tp": client.place_tp_sl(symbol, margin_coin, str(qty), side, tp_price, "profit_plan", signal_id)
-        }
-        stop_loss_order = client.place_tp_sl(symbol, margin_coin, str(qty), side, sl_price, "loss_plan", signal_id)
-
-    else:
-        # Messaggio non valido
-        raise ValueError("Il messaggio del segnale non contiene TP/SL validi")
-
-    # -----------------------------
-    # Set leva e piazza ordine principale
-    # -----------------------------
-    leverage_result = client.set_leverage(symbol, margin_coin, leverage, side, signal_id)
-    order_result = client.place_order(symbol, margin_coin, str(qty), side, trade_side, signal_id)
-
-    results = {
-        "leverage": leverage_result,
-        "order": order_result,
-        "takeProfit": take_profit_orders,
-        "stopLoss": stop_loss_order
-    }
-
-    return results
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(webhook)
+    if start_services:
+        services.start()
+    return flask_app
 
 
+app = create_app()  # gunicorn app:app
 
 
 if __name__ == "__main__":
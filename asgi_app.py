@@ -0,0 +1,394 @@
+"""
+Variante ASGI/asyncio del webhook: stesse rotte e stesso flusso di app.py (deduplica,
+corsie per symbol, piano leva -> ingresso -> TP/SL, outbox), ma ogni segnale è un task
+dell'event loop e le chiamate a Bitget viaggiano su aiohttp. Un worker non è più limitato
+dal numero di thread: mentre un ordine attende l'exchange il loop ne serve altri.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi_app:app
+
+Richiede aiohttp e un server ASGI (uvicorn), opzionali in requirements.txt. Rotte:
+POST /order, GET /ping, GET /signal/<signal_id>, GET /signal/<signal_id>/calls, GET /signals,
+GET /stats, GET /metrics.
+"""
+import env_setup  # noqa: F401  (.env caricato prima di ogni modulo che legge variabili all'import)
+import os
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qsl
+from typing import Optional
+
+import order_flow
+import signal_flow
+from async_db import AsyncDatabaseService
+from execution_planner import AsyncExecutionPlanner
+from order_queue import AsyncOrderDispatcher, LaneFull
+from basket import BasketLeg
+from order_flow import AccountOrder
+from contracts import PositionPlan
+from signal_dedup import DuplicateSignal
+from logging_setup import configure_logging, signal_context
+from metrics import SignalTrace, use_trace, render_prometheus, TRACE_SIGNALS, WEBHOOK_SECONDS
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+ASYNC_ORDERS = os.getenv("ASYNC_ORDERS", "false").lower() == "true"
+
+
+class _JsonRequest:
+    """Corpo della richiesta con l'interfaccia get_json() usata da process_order_request."""
+
+    def __init__(self, body: bytes):
+        self._data = json.loads(body) if body else None
+
+    def get_json(self):
+        return self._data
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send(send, status: int, body: bytes, content_type: bytes = b"application/json"):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class WebhookApp:
+    """
+    Applicazione ASGI del webhook. DB, deduplica e client Bitget vengono creati in
+    background all'avvio (lifespan): /ping risponde subito, un ordine arrivato prima
+    attende che i servizi siano pronti. `db` e `client` sostituiscono quelli predefiniti
+    (benchmark, simulatore).
+    """
+
+    def __init__(self, db=None, client=None):
+        self._db = db
+        self.db: Optional[AsyncDatabaseService] = None
+        self.client = client
+        self.accounts = None
+        self.dedup = None
+        self.outbox = None
+        self.dispatcher = AsyncOrderDispatcher(self.execute_order, on_done=self.save_order_result)
+        self._outbox_workers = {}
+        self._position_streams = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._startup_task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self._ready_seconds: Optional[float] = None
+        self._startup_error: Optional[str] = None
+
+    # --- Avvio e chiusura ---
+
+    def _create_services(self, loop: asyncio.AbstractEventLoop):
+        """Servizi con I/O bloccante (DB, file dei contratti, thread di background): fuori dal loop."""
+        from services import BITGET_WARMUP
+        from accounts import AccountRegistry, load_accounts
+        from async_bitget_client import AsyncBitgetClient, BlockingFacade
+        from signal_dedup import SignalDeduplicator
+        from contracts import CONTRACTS_REFRESH_SECONDS
+        from position_book import POSITION_RECONCILE_SECONDS, POSITION_STREAM
+        from order_outbox import ORDER_OUTBOX, OrderOutbox, OutboxWorker, account_outbox_path
+
+        db = self._db
+        if db is None:
+            from db_module import DatabaseService
+            db = DatabaseService()
+            try:
+                db.load_last_signal()
+            except Exception as e:
+                logger.warning("⚠️ Impossibile leggere l'ultimo segnale da request_log: %s", e)
+        self.db = AsyncDatabaseService(db)
+
+        dedup = SignalDeduplicator(db)
+        try:
+            dedup.warm()
+        except Exception as e:
+            logger.warning("⚠️ Impossibile caricare le impronte recenti da request_log: %s", e)
+        self.dedup = dedup
+
+        accounts = load_accounts()
+        primary = self.client or AsyncBitgetClient(db_service=db, account=accounts[0])
+        if CONTRACTS_REFRESH_SECONDS > 0:
+            primary.contracts.start()
+
+        def create_client(account):
+            return AsyncBitgetClient(db_service=db, account=account, contracts=primary.contracts)
+
+        def create_outbox(account):
+            return OrderOutbox() if account is accounts[0] else OrderOutbox(account_outbox_path(account.name))
+
+        registry = AccountRegistry(accounts, create_client, create_outbox if ORDER_OUTBOX else None,
+                                   primary_client=primary)
+        for account in registry:
+            client = registry.client(account.name)
+            if BITGET_WARMUP:
+                client.warmup()  # pool delle GET di background; la sessione aiohttp nasce al primo ordine
+            if POSITION_RECONCILE_SECONDS > 0:
+                client.positions.start()
+            if POSITION_STREAM:
+                self._position_streams[account.name] = client.position_stream().start()
+            outbox = registry.outbox(account.name)
+            if outbox is not None:
+                # Il worker è un thread: le sue POST vengono eseguite nel loop del client
+                self._outbox_workers[account.name] = OutboxWorker(outbox, BlockingFacade(client, loop)).start()
+        self.outbox = registry.outbox(registry.primary.name)
+        self.accounts = registry
+        self.client = primary
+
+    async def _startup(self):
+        try:
+            await asyncio.to_thread(self._create_services, asyncio.get_running_loop())
+        except Exception as e:
+            self._startup_error = str(e)
+            logger.exception("❌ Avvio dei servizi non riuscito")
+        self._ready_seconds = time.monotonic() - self._started_at
+        self._ready.set()
+        logger.info("✅ Servizi pronti in %.0f ms", self._ready_seconds * 1000)
+
+    def start(self):
+        """Avvia i servizi in background (idempotente; chiamato dal lifespan o dalla prima richiesta)."""
+        if self._ready is None:
+            self._ready = asyncio.Event()
+            self._startup_task = asyncio.get_running_loop().create_task(self._startup())
+
+    async def shutdown(self):
+        if self._ready is not None:
+            await self._ready.wait()
+        for worker in self._outbox_workers.values():
+            worker.stop()
+        for stream in self._position_streams.values():
+            stream.stop()
+        if self.accounts is not None:
+            self.client.contracts.stop()
+            for account in self.accounts:
+                client = self.accounts.client(account.name)
+                client.positions.stop()
+                await client.close()
+        if self.db is not None:
+            await self.db.flush()
+
+    def ready(self) -> bool:
+        return self._ready is not None and self._ready.is_set()
+
+    # --- ASGI ---
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        self.start()
+
+        method, path = scope["method"], scope["path"]
+        # /signal/<id> e /signal/<id>/calls come le rotte Flask: un id non contiene "/"
+        parts = path.split("/")
+        signal_id = parts[2] if len(parts) in (3, 4) and parts[1] == "signal" else ""
+        try:
+            if path == "/order" and method == "POST":
+                status, result = await self.handle_order(await _read_body(receive))
+            elif path == "/ping" and method == "GET":
+                status, result = self.ping()
+            elif signal_id and len(parts) == 3 and method == "GET":
+                status, result = await self.signal_status(signal_id)
+            elif signal_id and parts[3:] == ["calls"] and method == "GET":
+                status, result = await self.signal_calls(signal_id)
+            elif path == "/signals" and method == "GET":
+                query = parse_qsl(scope.get("query_string", b"").decode(), keep_blank_values=True)
+                status, result = await self.list_signals(dict(reversed(query)))  # primo valore, come Flask
+            elif path == "/stats" and method == "GET":
+                status, result = self.stats()
+            elif path == "/metrics" and method == "GET":
+                return await _send(send, 200, render_prometheus().encode(), b"text/plain; version=0.0.4")
+            else:
+                status, result = 404, {"error": "Risorsa non trovata"}
+        except Exception as e:
+            logger.exception("❌ Errore durante la gestione di %s %s", method, path)
+            status, result = 500, {"error": type(e).__name__, "message": str(e)}
+        await _send(send, status, json.dumps(result, default=str).encode())
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()  # non attende i servizi: il worker accetta richieste subito
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Ordini ---
+
+    async def handle_order(self, body: bytes):
+        """Gestisce una nuova richiesta di ordine (OPEN o CLOSE)."""
+        trace = SignalTrace()
+        status = 500
+        try:
+            with use_trace(trace):
+                status, result = await self._receive_signal(trace, body)
+            return status, result
+        finally:
+            WEBHOOK_SECONDS.observe(trace.elapsed(), order_type=trace.order_type or "unknown", status=status)
+            # In modalità asincrona la traccia viene salvata a esecuzione conclusa
+            if TRACE_SIGNALS and trace.signal_id and status != 202 and self.db is not None:
+                await self.db.update_request_trace(trace.signal_id, trace.as_dict())
+
+    async def _receive_signal(self, trace: SignalTrace, body: bytes):
+        await self._ready.wait()
+        if self.accounts is None:
+            return 503, {"error": "Servizi non disponibili", "message": self._startup_error}
+
+        # Come Flask: corpo non JSON (o vuoto, o non un oggetto) -> 400 invece di un 500 nel parsing
+        try:
+            request = _JsonRequest(body)
+        except ValueError:
+            return 400, {"error": "JSON non valido"}
+        if not isinstance(request.get_json(), dict):
+            return 400, {"error": "Corpo della richiesta mancante o non valido"}
+
+        signal = signal_flow.receive(request, self.dedup, trace)
+        with signal_context(signal.signal_id):
+            return await self._handle_signal(signal, trace)
+
+    async def _handle_signal(self, signal: signal_flow.Signal, trace: SignalTrace):
+        """I/O del segnale con il DB asyncio e le corsie del loop, come app._handle_signal."""
+        signal_flow.log_received(signal)
+
+        try:
+            request_id = await self.db.log_incoming_request(**signal.log_fields())
+        except DuplicateSignal:
+            signal.mark_duplicate(trace)
+            request_id = await self.db.log_incoming_request(**signal.log_fields())
+
+        step = signal_flow.plan(signal, self.accounts, self.client.contracts)
+        if isinstance(step, signal_flow.Reply):
+            return await self._reply(request_id, signal.signal_id, step)
+
+        try:
+            if ASYNC_ORDERS:
+                step.submit(self.dispatcher)
+                return await self._reply(request_id, signal.signal_id, step.accepted())
+            result_json = step.result(await step.execute(self.dispatcher))
+        except LaneFull as e:
+            return await self._reply(request_id, signal.signal_id, signal_flow.rejected(signal.signal_id, e))
+        return await self._reply(request_id, signal.signal_id, signal_flow.Reply(200, result_json))
+
+    async def _reply(self, request_id, signal_id: str, reply: signal_flow.Reply):
+        if reply.save:
+            await self.db.update_request_response(request_id, json.dumps(reply.body), signal_id=signal_id)
+        return reply.status, reply.body
+
+    async def execute_order(self, order, signal_id: str):
+        """Esegue un ordine OPEN o CLOSE (o un blocco di un basket) e restituisce il risultato da salvare."""
+        if isinstance(order, AccountOrder):
+            fan_out = order_flow.AccountFanOut(self.accounts, order, signal_id)
+            return fan_out.results(await fan_out.add_to(AsyncExecutionPlanner()).run())
+        if isinstance(order, PositionPlan):
+            return await self.execute_plan(order, signal_id)
+        if isinstance(order, BasketLeg):
+            return await self.execute_plan(order.plan, signal_id, oid_prefix=f"{order.key}-")
+        if order.order_type == "CLOSE":
+            result = await self.client.close_all_positions(symbol=order.ticker.replace(".P", ""), signal_id=signal_id)
+            return dict(result, signal_id=signal_id)
+        raise ValueError("Tipo di ordine non riconosciuto")
+
+    async def execute_plan(self, plan: PositionPlan, signal_id: str, oid_prefix=""):
+        """Leva -> ordine principale -> TP/SL in parallelo, come app.execute_position."""
+        legs = order_flow.PositionLegs(self.client, self.outbox, plan.symbol, "USDT", plan.side, plan.trade_side,
+                                       plan.size, plan.take_profits, plan.stop_loss, signal_id, oid_prefix)
+        return legs.results(await legs.add_to(AsyncExecutionPlanner()).run())
+
+    async def save_order_result(self, signal_id: str, result_json):
+        """Aggiorna request_log con la risposta di un ordine eseguito in modalità asincrona."""
+        await self.db.update_request_response(None, json.dumps(result_json), signal_id=signal_id)
+
+    # --- Consultazione ---
+
+    async def signal_status(self, signal_id: str):
+        """Stato di un segnale: risposta salvata in request_log o stato della corsia se non ancora scritta."""
+        if self.db is None:
+            return 503, {"error": "Avvio in corso", "signal_id": signal_id}
+        record = await self.db.get_request_by_signal(signal_id)
+        return signal_flow.signal_status(signal_id, record, self.dispatcher.status(signal_id))
+
+    async def signal_calls(self, signal_id: str):
+        """Dettaglio di un segnale: richiesta salvata e chiamate Bitget con payload e risposta."""
+        if self.db is None:
+            return 503, {"error": "Avvio in corso", "signal_id": signal_id}
+        record = await self.db.get_request_by_signal(signal_id)
+        calls = await self.db.get_api_calls(signal_id) if record else None
+        return signal_flow.signal_calls(signal_id, record, calls)
+
+    async def list_signals(self, args: dict):
+        """Segnali dal più recente con le chiamate Bitget collegate (filtri come app.list_signals)."""
+        try:
+            query = signal_flow.signals_query(args)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if self.db is None:
+            return 503, {"error": "Avvio in corso"}
+        return signal_flow.signals_page(await self.db.find_signals(*query))
+
+    def ping(self):
+        """Stato del server e ultimo signal_id ricevuto (snapshot in memoria), anche durante l'avvio."""
+        result = self.db.last_signal() if self.db is not None else None
+        if not result:
+            return 200, {
+                "status": "ok",
+                "ready": self.ready(),
+                "message": "Nessuna richiesta trovata in request_log" if self.db is not None else "Avvio in corso"
+            }
+        return 200, {
+            "status": "ok",
+            "ready": self.ready(),
+            "signal_id": result["signal_id"],
+            "received_at": signal_flow.format_time(result["request_time"])
+        }
+
+    def stats(self):
+        startup = {
+            "ready": self.ready(),
+            "ready_ms": round(self._ready_seconds * 1000, 1) if self._ready_seconds is not None else None,
+            "error": self._startup_error,
+        }
+        client = self.client
+        if self.accounts is None:
+            return 200, {"startup": startup}
+        return 200, {
+            "startup": startup,
+            "http_pool": client.pool_metrics(),
+            "leverage_cache": client.state_cache.stats(),
+            "rate_limits": client.rate_limiter.stats(),
+            "order_lanes": self.dispatcher.stats(),
+            "dedup": self.dedup.stats(),
+            "contracts": client.contracts.stats(),
+            "outbox": self._outbox_stats(self.accounts.primary.name),
+            "accounts": {name: dict(account, outbox=self._outbox_stats(name))
+                         for name, account in self.accounts.stats().items()},
+            "positions": dict(client.positions.stats(), stream=self._stream_stats(self.accounts.primary.name))
+        }
+
+    def _outbox_stats(self, account: str):
+        worker = self._outbox_workers.get(account)
+        return worker.stats() if worker else None
+
+    def _stream_stats(self, account: str):
+        stream = self._position_streams.get(account)
+        return stream.stats() if stream else None
+
+
+def create_app(db=None, client=None) -> WebhookApp:
+    return WebhookApp(db=db, client=client)
+
+
+app = create_app()  # uvicorn asgi_app:app
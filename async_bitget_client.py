@@ -0,0 +1,202 @@
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from functools import partial
+
+from bitget_client import (
+    BitgetClientBase, BASE_URL, RATE_LIMIT_RETRIES, SET_LEVERAGE_PATH, PLACE_ORDER_PATH, PLACE_TPSL_PATH,
+    PLACE_POS_TPSL_PATH, CLOSE_POSITIONS_PATH, CANCEL_PLAN_PATH, _outcome, _json_body, _http_result, leverage_payload,
+    order_payload, tpsl_payload, pos_tpsl_payload, pos_tpsl_fallbacks, close_positions_payload, cancel_plan_payload,
+    split_pos_tpsl,
+)
+from http_pool import POOL_SIZE, PoolMetrics
+from request_signer import serialize_payload
+from rate_limiter import PRIORITY_ENTRY, PRIORITY_PLAN, retry_after
+from metrics import measure, BITGET_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class _Response:
+    """Risposta aiohttp già letta, con l'interfaccia di requests usata dal client (status_code, headers, json)."""
+
+    def __init__(self, status: int, headers, body: bytes):
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+class AsyncBitgetClient(BitgetClientBase):
+    """
+    Client asyncio per il server ASGI: stessi payload, firma, rate limiter, cache e log del
+    BitgetClient sincrono, ma le POST viaggiano su una sessione aiohttp e l'attesa della
+    risposta (o del rate limiter) non occupa un thread. Va usato da un solo event loop;
+    la sessione viene creata al primo invio dentro quel loop.
+    """
+
+    def __init__(self, db_service=None, pool_size: int = POOL_SIZE, account=None, contracts=None):
+        super().__init__(db_service, account, contracts)
+        self.pool_size = pool_size
+        self.post_metrics = PoolMetrics()  # solo richieste: aiohttp non espone le connessioni aperte
+        self._session = None
+
+    async def session(self):
+        if self._session is None:
+            import aiohttp  # dipendenza opzionale, solo per il server ASGI
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=10),
+                headers={"Connection": "keep-alive"},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _write_call(self, request_log, response_log, signal_id=None, legs=None):
+        # Con il BatchWriter la riga viene solo accodata; con scritture sincrone il commit
+        # avviene nel thread pool del loop, senza fermare gli altri segnali
+        if getattr(self.db_service, "writer", None) is not None:
+            return super()._write_call(request_log, response_log, signal_id, legs)
+        asyncio.get_running_loop().run_in_executor(
+            None, partial(super()._write_call, request_log, response_log, signal_id, legs))
+
+    def pool_metrics(self):
+        return dict(self.post_metrics.snapshot(), background=self.http.metrics.snapshot())
+
+    async def _post(self, path, payload, signal_id=None, priority=PRIORITY_ENTRY, split=None):
+        endpoint = path.rsplit("/", 1)[-1]
+        with measure(BITGET_REQUEST_SECONDS, f"bitget.{endpoint}", endpoint=endpoint) as labels:
+            response_data = await self._send(path, payload, signal_id, priority, split)
+            labels["outcome"] = _outcome(response_data)
+        return response_data
+
+    async def _send(self, path, payload, signal_id=None, priority=PRIORITY_ENTRY, split=None):
+        """POST firmata come BitgetClient._send: stessi byte firmati e inviati, stessi retry sui 429."""
+        import aiohttp
+        body_bytes = serialize_payload(payload)
+        queue_delay = await self.rate_limiter.acquire_async(path, priority)
+        headers = self.signer.headers("POST", path, body_bytes)
+        request_log = {"timestamp": str(datetime.now()), "endpoint": path, "payload": payload}
+        started = time.perf_counter()
+        session = await self.session()
+
+        try:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                started = time.perf_counter()
+                try:
+                    async with session.post(BASE_URL + path, headers=headers, data=body_bytes) as raw:
+                        response = _Response(raw.status, raw.headers, await raw.read())
+                finally:
+                    self.post_metrics.record_request(time.perf_counter() - started)
+                response_data = _json_body(response)
+                limited, wait = retry_after(response, response_data)
+                if not limited or attempt == RATE_LIMIT_RETRIES:
+                    break
+                logger.warning("⚠️ Rate limit Bitget su %s, nuovo tentativo tra %ss", path, wait,
+                               extra={"signal_id": signal_id})
+                self.rate_limiter.penalize(path, wait)
+                queue_delay += await self.rate_limiter.acquire_async(path, priority)
+                headers = self.signer.headers("POST", path, body_bytes)
+            if response.status_code >= 500:
+                # Come il client sincrono: solo un 5xx è un errore del server, un 4xx porta il code del rifiuto
+                return self._fail(path, payload, "RequestException", f"HTTP {response.status_code} per {path}",
+                                  request_log, started, queue_delay, signal_id)
+            response_data = _http_result(response.status_code, response_data, response.text)
+            return self._complete(path, payload, response.status_code, response_data, request_log, started,
+                                  queue_delay, signal_id, split)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return self._fail(path, payload, "RequestException", e, request_log, started, queue_delay, signal_id)
+
+        except Exception as e:
+            return self._fail(path, payload, "UnexpectedError", e, request_log, started, queue_delay, signal_id)
+
+    # --- Metodi operativi: stessa logica di BitgetClient, con await sulle chiamate ---
+
+    async def set_leverage(self, symbol, margin_coin, leverage, side, signal_id=None):
+        payload = leverage_payload(symbol, margin_coin, leverage, side)
+        cached = self._cached_leverage(payload)
+        if cached is not None:
+            return cached
+        response = await self._post(SET_LEVERAGE_PATH, payload, signal_id)
+        self._store_leverage(payload, response)
+        return response
+
+    async def place_order(self, symbol, margin_coin, quantity, side, trade_side, signal_id=None, client_oid=None):
+        payload = order_payload(symbol, margin_coin, quantity, side, trade_side, client_oid)
+        response = await self._post(PLACE_ORDER_PATH, payload, signal_id)
+        if isinstance(response, dict) and response.get("code") == "00000":
+            self.positions.apply_fill(symbol, side, trade_side, quantity)
+        return response
+
+    async def place_tp_sl(self, symbol, margin_coin, quantity, side, trigger_price, plan_type, signal_id=None,
+                          client_oid=None):
+        payload = tpsl_payload(symbol, margin_coin, quantity, side, trigger_price, plan_type, client_oid)
+        return await self._post(PLACE_TPSL_PATH, payload, signal_id, priority=PRIORITY_PLAN)
+
+    async def place_pos_tpsl(self, symbol, margin_coin, side, tp_price, sl_price, signal_id=None,
+                             tp_client_oid=None, sl_client_oid=None, tp_size=None, sl_size=None):
+        payload = pos_tpsl_payload(symbol, margin_coin, side, tp_price, sl_price, tp_client_oid, sl_client_oid)
+        response = await self._post(PLACE_POS_TPSL_PATH, payload, signal_id, priority=PRIORITY_PLAN,
+                                    split=split_pos_tpsl)
+        (_, profit), (_, loss) = split_pos_tpsl(payload, response)
+        results = {"profit": profit, "loss": loss}
+        for name, size, price, plan_type, oid in pos_tpsl_fallbacks(response, results,
+                                                                    (tp_size, tp_price, tp_client_oid),
+                                                                    (sl_size, sl_price, sl_client_oid)):
+            logger.warning("⚠️ place-pos-tpsl non riuscito per la gamba %s, invio con place-tpsl-order", name,
+                           extra={"signal_id": signal_id})
+            results[name] = await self.place_tp_sl(symbol, margin_coin, size, side, price, plan_type, signal_id,
+                                                   client_oid=oid)
+        return results
+
+    async def cancel_plan_orders(self, symbol, margin_coin="USDT", signal_id=None):
+        return await self._post(CANCEL_PLAN_PATH, cancel_plan_payload(symbol, margin_coin), signal_id,
+                                priority=PRIORITY_PLAN)
+
+    async def close_all_positions(self, symbol, signal_id=None):
+        flat = self._flat_close(symbol, signal_id)
+        if flat is not None:
+            return flat
+        response = await self._post(CLOSE_POSITIONS_PATH, close_positions_payload(symbol), signal_id)
+        failed = self._close_failed(symbol, response, signal_id)
+        if failed is not None:
+            return failed
+        cancelled = await self.cancel_plan_orders(symbol, signal_id=signal_id)
+        return {"status": "closed", "close": response, "cancelPlans": cancelled}
+
+
+class BlockingFacade:
+    """
+    Metodi di AsyncBitgetClient richiamabili da un thread (es. OutboxWorker): la chiamata
+    viene eseguita nel loop del client e il thread attende il risultato. Le GET di sola
+    lettura restano quelle sincrone del client.
+    """
+
+    def __init__(self, client: AsyncBitgetClient, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.loop = loop
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def place_order(self, **kwargs):
+        return self._run(self.client.place_order(**kwargs))
+
+    def place_tp_sl(self, **kwargs):
+        return self._run(self.client.place_tp_sl(**kwargs))
+
+    def order_exists(self, symbol, client_oid, plan=False):
+        return self.client.order_exists(symbol, client_oid, plan=plan)
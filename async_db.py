@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseService:
+    """
+    DatabaseService usato dall'event loop del server ASGI. Con il BatchWriter attivo le
+    scritture vengono solo accodate (nessuna attesa del commit), tranne l'INSERT di un alert
+    con impronta; le altre scritture e ogni lettura vengono eseguite nel thread pool del loop,
+    che intanto serve altri segnali.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def writer(self):
+        return getattr(self.db, "writer", None)
+
+    async def _write(self, method, *args, **kwargs):
+        if self.writer is not None:
+            return method(*args, **kwargs)
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def _read(self, method, *args, **kwargs):
+        return await asyncio.to_thread(method, *args, **kwargs)
+
+    async def log_incoming_request(self, signal_id, request_text, response_text, fingerprint=None, ticker=None):
+        call = partial(self.db.log_incoming_request, signal_id=signal_id, request_text=request_text,
+                       response_text=response_text, fingerprint=fingerprint, ticker=ticker)
+        if fingerprint:
+            # INSERT sincrono anche in modalità batch (prenotazione dell'alert tra i worker): fuori dal loop
+            return await asyncio.to_thread(call)
+        return await self._write(call)
+
+    async def update_request_response(self, request_id, response_text, signal_id=None):
+        return await self._write(self.db.update_request_response, request_id, response_text, signal_id=signal_id)
+
+    async def update_request_trace(self, signal_id, trace):
+        return await self._write(self.db.update_request_trace, signal_id, trace)
+
+    async def get_request_by_signal(self, signal_id):
+        return await self._read(self.db.get_request_by_signal, signal_id)
+
+    async def get_api_calls(self, signal_id):
+        return await self._read(self.db.get_api_calls, signal_id)
+
+    async def find_signals(self, ticker=None, since=None, until=None, before_id=None, limit=50):
+        return await self._read(self.db.find_signals, ticker, since, until, before_id, limit)
+
+    async def flush(self, timeout: float = 5.0):
+        """Attende che le scritture accodate siano sul DB (chiusura del server)."""
+        if self.writer is not None:
+            await asyncio.to_thread(self.writer.flush, timeout)
+
+    def last_signal(self):
+        # Snapshot in memoria: nessun accesso al DB
+        return self.db.last_signal()
@@ -0,0 +1,92 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from contracts import PositionPlan
+from signal_parser import SignalBlock, parse_signal_blocks
+
+# Alert con più blocchi LONG/SHORT SIGNAL eseguiti insieme (un webhook per candela invece di uno per symbol)
+BASKET_ORDERS = os.getenv("BASKET_ORDERS", "true").lower() == "true"
+BASKET_MAX_LEGS = int(os.getenv("BASKET_MAX_LEGS", 50))
+TP_NAMES = ("tp1", "tp2", "tp3")
+
+
+@dataclass
+class BasketLeg:
+    """Un blocco dell'alert basket pronto per l'esecuzione: ingresso, TP parziali e SL."""
+    index: int
+    symbol: str
+    side: str                     # "buy" | "sell"
+    size: float
+    stop_loss: float
+    take_profits: Dict[str, Tuple[float, int]] = field(default_factory=dict)  # "tp1" -> (prezzo, %)
+    entry: Optional[float] = None
+    plan: Optional[PositionPlan] = None  # gambe arrotondate e validate prima dell'invio
+
+    @property
+    def key(self) -> str:
+        """Chiave del risultato aggregato e prefisso dei clientOid della gamba."""
+        return f"b{self.index}"
+
+
+def basket_leg(index: int, block: SignalBlock) -> BasketLeg:
+    if not block.symbol:
+        raise ValueError(f"Blocco {index + 1} senza symbol")
+    return BasketLeg(
+        index=index,
+        symbol=block.symbol.replace(".P", ""),
+        side="buy" if block.direction == "LONG" else "sell",
+        size=abs(float(block.size)),
+        stop_loss=float(block.stop_loss),
+        take_profits={name: (float(getattr(block, name)), int(getattr(block, f"{name}_qty"))) for name in TP_NAMES},
+        entry=float(block.entry),
+    )
+
+
+def parse_basket(text: str, order_type: Optional[str] = None) -> List[BasketLeg]:
+    """
+    Blocchi dell'alert in un solo passaggio. Un alert è un basket solo con almeno due blocchi:
+    con un blocco solo (o BASKET_ORDERS=false) resta sul percorso del singolo ordine.
+    I blocchi aprono posizioni: un alert CLOSE non è mai un basket.
+    """
+    if not BASKET_ORDERS or not text or order_type == "CLOSE":
+        return []
+    blocks = parse_signal_blocks(text)
+    if len(blocks) < 2:
+        return []
+    if len(blocks) > BASKET_MAX_LEGS:
+        raise ValueError(f"Basket con {len(blocks)} blocchi: massimo {BASKET_MAX_LEGS}")
+    return [basket_leg(index, block) for index, block in enumerate(blocks)]
+
+
+def leg_failed(result: Any) -> bool:
+    """Una gamba del basket è fallita se una sua chiamata Bitget non ha restituito 00000."""
+    if not isinstance(result, dict):
+        return True
+    if result.get("status") in ("error", "rejected", "invalid") or "error" in result or result.get("failed"):
+        return True  # "failed": esito aggregato (es. segnale replicato su più account) con parti fallite
+    calls = [result.get("leverage"), result.get("order"), result.get("stopLoss")]
+    calls.extend((result.get("takeProfit") or {}).values())
+    return any(isinstance(call, dict) and ("error" in call or call.get("code", "00000") != "00000")
+               for call in calls if call is not None)
+
+
+def aggregate(signal_id: str, legs: List[BasketLeg], results: List[Any]) -> dict:
+    """Risultato del basket per symbol (chiave symbol, o symbol#n se il symbol compare più volte)."""
+    counts: Dict[str, int] = {}
+    for leg in legs:
+        counts[leg.symbol] = counts.get(leg.symbol, 0) + 1
+    by_symbol = {}
+    failed = []
+    for leg, result in zip(legs, results):
+        key = leg.symbol if counts[leg.symbol] == 1 else f"{leg.symbol}#{leg.index + 1}"
+        by_symbol[key] = result
+        if leg_failed(result):
+            failed.append(key)
+    return {
+        "status": "basket",
+        "signal_id": signal_id,
+        "legs": len(legs),
+        "failed": failed,
+        "results": by_symbol,
+    }
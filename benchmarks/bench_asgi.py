@@ -0,0 +1,185 @@
+"""
+Server sincrono (app.py, Flask) contro server ASGI (asgi_app.py) sullo stesso simulatore Bitget.
+
+Ogni server è un solo worker: app.py è servito da werkzeug con un pool di --threads thread,
+come un worker gunicorn gthread; asgi_app.py da uvicorn con un solo event loop. Un burst di
+--count alert OPEN, distribuiti su --symbols symbol, viene inviato con --concurrency richieste
+in volo. Riporta throughput, p50/p99 e segnali eseguiti in parallelo dal worker (legge di
+Little: throughput × latenza di un segnale isolato), con DB in memoria e rate limiter del
+client disattivato; --pool-size è il limite di connessioni verso Bitget di entrambi i client.
+
+    python benchmarks/bench_asgi.py --count 400 --concurrency 100 --latency-ms 50
+    python benchmarks/bench_asgi.py --threads 16 --symbols 20 --json
+
+Richiede aiohttp e uvicorn. Tutto gira in un solo processo (simulatore compreso): i valori
+assoluti sono indicativi, conta il rapporto tra i due server.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitget_simulator import BitgetSimulator  # noqa: E402
+from memory_db import InMemoryDatabaseService  # noqa: E402
+
+ALERT_TEMPLATE = (
+    "Segnale su {symbol}.P\n"
+    "Ora: 2024-01-01T00:00:{n:05d}Z\n"
+    "Prezzo chiusura: 100\n"
+    "Azione: buy\n"
+    "Commento: OPEN\n"
+    "id trade {server}-{n}\n"
+    "size: 3\n"
+    "Message: OPEN LONG | Entry: 100 | SL: 95 | TP: 110 | Size: 3"
+)
+
+
+def configure(simulator: BitgetSimulator, pool_size: int):
+    """Ambiente comune ai due server, prima di importarli."""
+    os.environ["BITGET_GLOBAL_RATE"] = "0"  # letto all'import di rate_limiter
+    from rate_limiter import DEFAULT_LIMITS
+    os.environ.update({
+        "BITGET_BASE_URL": simulator.base_url,
+        "BITGET_WARMUP": "false",
+        "BITGET_POOL_SIZE": str(pool_size),
+        "BITGET_RATE_LIMITS": json.dumps({path: 1_000_000 for path in DEFAULT_LIMITS}),
+        "DB_BATCH_WRITES": "false",
+        "ASYNC_ORDERS": "false",
+        "ORDER_OUTBOX": "false",
+        # Symbol sintetici: regole di default, nessun contratto caricato dal simulatore
+        "CONTRACTS_REFRESH_SECONDS": "0",
+        "CONTRACTS_CACHE_PATH": "",
+        "POSITION_RECONCILE_SECONDS": "0",
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": ":memory:",
+    })
+    for name in ("API_KEY", "SECRET", "PASSPHRASE"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_sync(threads: int, db) -> str:
+    """app.py su werkzeug con al massimo `threads` richieste servite insieme (worker gthread)."""
+    import logging
+    import services
+    from werkzeug.serving import make_server
+    services.set_db(db)
+    import app
+    services.wait_ready(30)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gthread")
+    server.process_request = lambda request, address: pool.submit(server.process_request_thread, request, address)
+    threading.Thread(target=server.serve_forever, name="sync-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def serve_asgi(db) -> str:
+    """asgi_app.py su uvicorn, un solo event loop in un thread dedicato."""
+    import uvicorn
+    import asgi_app
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app.create_app(db=db), host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False, lifespan="on"))
+    threading.Thread(target=server.run, name="asgi-app", daemon=True).start()
+    deadline = time.monotonic() + 30
+    while not server.started and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def burst(url: str, server: str, count: int, concurrency: int, symbols: int) -> dict:
+    """Invia `count` alert con al più `concurrency` richieste in volo; latenze in ms."""
+    import aiohttp
+    latencies, statuses = [], Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async def send(n):
+            text = ALERT_TEMPLATE.format(symbol=f"S{n % symbols:03d}USDT", n=n, server=server)
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url + "/order", json={"text": text}) as response:
+                        await response.read()
+                        status = response.status
+                except aiohttp.ClientError as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+
+        # Riscaldamento (connessioni, leva in cache per tutti i symbol), poi segnali isolati
+        await asyncio.gather(*(send(-1 - n) for n in range(symbols)))
+        latencies.clear()
+        for n in range(symbols):
+            await send(-1 - symbols - n)
+        isolated = statistics.median(latencies)
+        latencies.clear()
+        statuses.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(send(n) for n in range(count)))
+        duration = time.perf_counter() - start
+
+    latencies.sort()
+    throughput = count / duration
+    return {
+        "throughput": round(throughput, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+        "isolated_ms": round(isolated, 1),
+        "concurrent_signals": round(throughput * isolated / 1000, 1),
+        "statuses": {str(status): n for status, n in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100, help="richieste in volo verso il worker")
+    parser.add_argument("--threads", type=int, default=8, help="thread del worker sincrono (gunicorn --threads)")
+    parser.add_argument("--symbols", type=int, default=50, help="symbol distinti (una corsia ciascuno)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="latenza del simulatore Bitget")
+    parser.add_argument("--pool-size", type=int, default=100, help="connessioni verso Bitget (BITGET_POOL_SIZE)")
+    parser.add_argument("--json", action="store_true", help="report in JSON")
+    args = parser.parse_args()
+
+    simulator = BitgetSimulator(latency_ms=args.latency_ms, jitter_ms=0).start()
+    try:
+        configure(simulator, args.pool_size)
+        urls = {"sync": serve_sync(args.threads, InMemoryDatabaseService()),
+                "asgi": serve_asgi(InMemoryDatabaseService())}
+        report = {name: asyncio.run(burst(url, name, args.count, args.concurrency, args.symbols))
+                  for name, url in urls.items()}
+    finally:
+        simulator.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.count} alert, {args.concurrency} in volo, {args.symbols} symbol, "
+          f"simulatore {args.latency_ms:.0f} ms, worker sincrono con {args.threads} thread")
+    print(f"{'server':>6} {'alert/s':>9} {'p50':>10} {'p99':>10} {'isolato':>10} {'in parallelo':>13}  status")
+    for name, row in report.items():
+        print(f"{name:>6} {row['throughput']:>9.1f} {row['p50_ms']:>8.1f}ms {row['p99_ms']:>8.1f}ms "
+              f"{row['isolated_ms']:>8.1f}ms {row['concurrent_signals']:>13.1f}  {row['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark delle scritture di log per segnale: modalità sincrona vs BatchWriter.
+
+Simula un segnale OPEN (1 insert request_log + 6 chiamate API + 1 update) contro un
+DB finto con latenza di commit configurabile e riporta commit per segnale e tempo
+speso sul percorso del webhook. L'insert porta l'impronta dell'alert, quindi anche
+in modalità batch è un commit sincrono (prenotazione dell'alert tra i worker).
+Prima verifica su SQLite che la risposta salvata solo per signal_id (id_request None,
+come con ASYNC_ORDERS) arrivi in request_log in entrambe le modalità.
+
+    python benchmarks/bench_db_writer.py --signals 200 --commit-ms 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from contextlib import contextmanager
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCursor:
+    lastrowid = 1
+    rowcount = 1
+
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, params=None):
+        self.db.statements += 1
+
+    def executemany(self, query, rows):
+        self.db.statements += len(rows)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        time.sleep(self.db.commit_latency)
+        self.db.commits += 1
+
+
+class FakeDatabase:
+    """Backend di storage finto che conta commit e statement."""
+    dialect = "mysql"
+    errors = (OSError,)
+
+    def __init__(self, commit_latency):
+        self.commit_latency = commit_latency
+        self.commits = 0
+        self.statements = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield FakeConnection(self)
+
+
+def simulate_signal(service, signal_id):
+    request_log = {"endpoint": "/api/v2/mix/order/place-order", "body": "{}", "headers": {}, "payload": {}}
+    response_log = {"response_status": 200, "response_body": "{}", "response_json": {"code": "00000"},
+                    "response_data": {"orderId": "1"}, "response_code": "00000", "response_msg": "success"}
+    service.log_incoming_request(signal_id=signal_id, request_text={"text": "..."}, response_text="null",
+                                 fingerprint=signal_id)
+    for _ in range(6):
+        service.log_outgoing_api(request_log, response_log, signal_id)
+    service.update_request_response(None, '{"status": "ok"}', signal_id=signal_id)
+
+
+def check_response_by_signal(storage, db_module):
+    """La response salvata con id_request None deve finire sulla riga del segnale."""
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.set_backend(storage.SQLiteBackend(os.path.join(tmp, "check.db")))
+        for batch in (False, True):
+            db_module._writer = None
+            service = db_module.DatabaseService(batch_writes=batch)
+            signal_id = f"check-{batch}"
+            service.log_incoming_request(signal_id=signal_id, request_text={"text": "..."}, response_text="null")
+            service.update_request_response(None, json.dumps({"status": "ok"}), signal_id=signal_id)
+            if service.writer:
+                service.writer.flush(timeout=10)
+            row = service.get_request_by_signal(signal_id)
+            assert row and json.loads(row["response"]) == {"status": "ok"}, f"response non salvata (batch={batch})"
+            if service.writer:
+                service.writer.close()
+    db_module._writer = None
+
+
+def run(db_module, fake_db, batch_writes, signals):
+    fake_db.commits = 0
+    service = db_module.DatabaseService(batch_writes=batch_writes)
+    latencies = []
+    with mock.patch("builtins.print"):
+        for i in range(signals):
+            start = time.perf_counter()
+            simulate_signal(service, f"sig-{i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+        if service.writer:
+            service.writer.flush(timeout=60)
+    latencies.sort()
+    return {
+        "commits_per_signal": fake_db.commits / signals,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signals", type=int, default=200)
+    parser.add_argument("--commit-ms", type=float, default=3.0)
+    args = parser.parse_args()
+
+    fake_db = FakeDatabase(args.commit_ms / 1000)
+    import storage
+    import db_module
+    check_response_by_signal(storage, db_module)
+    storage.set_backend(fake_db)
+
+    for label, batch in (("sync", False), ("batch", True)):
+        db_module._writer = None
+        result = run(db_module, fake_db, batch, args.signals)
+        print(f"{label:>6}: commits/segnale={result['commits_per_signal']:.3f} "
+              f"latenza webhook p50={result['p50_ms']:.3f} ms p99={result['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Verifica del riuso delle connessioni di PooledSession contro uno stub HTTP(S) locale.
+
+Avvia un ThreadingHTTPServer HTTP/1.1 (keep-alive) e controlla tramite PoolMetrics che:
+- il warmup apra al più --pool-size connessioni;
+- --requests POST concorrenti (--pool-size thread) non aprano altre connessioni;
+- gli errori di connessione vengano ritentati e contati (nessun server in ascolto).
+Poi confronta il tempo per richiesta con una connessione nuova per ogni POST.
+
+    python benchmarks/bench_http_pool.py --requests 200 --pool-size 4
+    python benchmarks/bench_http_pool.py --https --latency-ms 5
+
+--https genera un certificato autofirmato con la CLI openssl (handshake TLS incluso nel connect).
+"""
+import os
+import sys
+import ssl
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_pool import PooledSession  # noqa: E402
+
+RESPONSE = json.dumps({"code": "00000", "msg": "success", "data": {}}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # connessioni persistenti
+    latency = 0.0
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+def self_signed_cert(directory: str):
+    """Certificato e chiave per 127.0.0.1 (richiede la CLI openssl)."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+def start_stub(latency_ms: float, cert=None):
+    handler = type("Handler", (StubHandler,), {"latency": latency_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*cert)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, name="stub", daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_port}"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def check_reuse(base_url: str, pool_size: int, count: int, verify) -> dict:
+    """Warmup e POST concorrenti: il pool non apre mai più di `pool_size` connessioni."""
+    pool = PooledSession(base_url, pool_size=pool_size)
+    pool.session.verify = verify
+    pool.session.trust_env = False  # altrimenti REQUESTS_CA_BUNDLE sostituisce `verify`
+    warmed = pool.warmup(connections=pool_size)
+    assert warmed == pool_size, f"warmup: {warmed} connessioni su {pool_size}"
+    # Con uno stub istantaneo un touch può liberare la connessione prima che parta il successivo
+    opened = pool.metrics.snapshot()["connections_opened"]
+    assert 0 < opened <= pool_size, f"warmup: {opened} connessioni aperte, massimo {pool_size}"
+
+    def post(n):
+        response = pool.post(base_url + "/api/v2/mix/order/place-order", json={"n": n}, timeout=10)
+        assert response.json()["code"] == "00000"
+
+    with ThreadPoolExecutor(max_workers=pool_size) as executor:
+        list(executor.map(post, range(count)))
+
+    metrics = pool.metrics.snapshot()
+    assert metrics["connections_opened"] <= pool_size, \
+        f"{metrics['connections_opened']} connessioni aperte per {count} POST, massimo {pool_size}"
+    minimum = round(1 - pool_size / metrics["requests"], 4)  # snapshot() arrotonda a 4 decimali
+    assert metrics["reuse_rate"] >= minimum, f"riuso insufficiente: {metrics}"
+    assert metrics["errors"] == 0 and metrics["connect_errors"] == 0, f"errori: {metrics}"
+    return metrics
+
+
+def check_connect_retries(retries: int) -> dict:
+    """Nessun server in ascolto: il connect viene ritentato `retries` volte, poi l'errore arriva al chiamante."""
+    base_url = f"http://127.0.0.1:{free_port()}"
+    pool = PooledSession(base_url, pool_size=1, connect_retries=retries, backoff=0)
+    try:
+        pool.post(base_url + "/", json={}, timeout=2)
+    except requests.exceptions.ConnectionError:
+        pass
+    else:
+        raise AssertionError("POST riuscita senza server in ascolto")
+    metrics = pool.metrics.snapshot()
+    assert metrics["connect_errors"] == retries + 1, f"attesi {retries + 1} tentativi di connect: {metrics}"
+    assert metrics["connections_opened"] == 0 and metrics["errors"] == 1, f"metriche inattese: {metrics}"
+    return metrics
+
+
+def without_pool(base_url: str, count: int, verify) -> float:
+    """ms per POST con una connessione nuova ogni volta (una Session per richiesta)."""
+    start = time.perf_counter()
+    for n in range(count):
+        with requests.Session() as session:
+            session.trust_env = False
+            session.post(base_url + "/api/v2/mix/order/place-order", json={"n": n}, timeout=10, verify=verify)
+    return round((time.perf_counter() - start) / count * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latenza dello stub per risposta")
+    parser.add_argument("--retries", type=int, default=2, help="tentativi di connect (BITGET_CONNECT_RETRIES)")
+    parser.add_argument("--https", action="store_true", help="stub HTTPS con certificato autofirmato")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert = self_signed_cert(directory) if args.https else None
+        server, base_url = start_stub(args.latency_ms, cert)
+        verify = cert[0] if cert else True
+        try:
+            pooled = check_reuse(base_url, args.pool_size, args.requests, verify)
+            fresh_ms = without_pool(base_url, min(args.requests, 50), verify)
+        finally:
+            server.shutdown()
+    retries = check_connect_retries(args.retries)
+
+    print(f"{base_url.split(':')[0]}: {pooled['requests']} richieste, {pooled['connections_opened']} connessioni, "
+          f"riuso {pooled['reuse_rate']:.2%}, connect medio {pooled['avg_connect_ms']:.3f} ms")
+    print(f"per POST: pool {pooled['avg_request_ms']:.3f} ms, connessione nuova {fresh_ms:.3f} ms")
+    print(f"connect rifiutato: {retries['connect_errors']} tentativi ({args.retries} retry), errore al chiamante")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Microbenchmark del parser dei segnali.
+
+Misura i segnali al secondo del percorso dell'ordine (campi dell'alert, poi messaggio Pine
+Script) con signal_parser e con il codice originale: tests/baseline_order.py e
+tests/baseline_utils.py, copie identiche del primo commit (compresa la stampa di debug
+di parse_signal_string, qui su /dev/null). L'equivalenza tra i due è verificata da
+tests/test_signal_parser.py.
+
+    python benchmarks/bench_signal_parser.py --signals 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import baseline_order  # noqa: E402
+import baseline_utils  # noqa: E402
+from Order import parse_order_text  # noqa: E402
+from utils import parse_signal_string  # noqa: E402
+from test_signal_parser import sample_alert  # noqa: E402
+
+
+def bench(fn, texts) -> float:
+    """Segnali al secondo; stdout su /dev/null per la stampa di debug della baseline."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        return len(texts) / (time.perf_counter() - start)
+
+
+def baseline_pipeline(text):
+    order = baseline_order.parse_order_text(text)
+    return baseline_utils.parse_signal_string(order.message or "")
+
+
+def new_pipeline(text):
+    order = parse_order_text(text)
+    return parse_signal_string(order.message or "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signals", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [sample_alert(rng) for _ in range(args.signals)]
+    for label, fn in (("baseline", baseline_pipeline), ("single", new_pipeline)):
+        print(f"{label:>8}: {bench(fn, texts):,.0f} segnali/s")
+
+
+if __name__ == "__main__":
+    main()
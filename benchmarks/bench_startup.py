@@ -0,0 +1,127 @@
+"""
+Avvio a freddo del webhook: tempo di import di app.py, prima risposta di /ping e servizi pronti.
+
+Ogni misura parte da un interprete nuovo (come un worker gunicorn appena creato) contro il
+simulatore Bitget locale e SQLite in memoria. La modalità "eager" avvia i servizi prima
+dell'import, come faceva app.py con DB e client creati a livello di modulo; "lazy" è
+l'avvio in background di create_app. --db-delay-ms simula il tempo di connessione al DB.
+
+    python benchmarks/bench_startup.py --runs 5 --db-delay-ms 300
+    python benchmarks/bench_startup.py --import-budget-ms 250 --ping-budget-ms 300
+
+Esce con codice 1 se la mediana dell'import o della prima risposta di /ping (modalità lazy)
+supera il budget (default STARTUP_IMPORT_BUDGET_MS/STARTUP_PING_BUDGET_MS, 0 = nessuno).
+Gli stessi budget sono verificati da tests/test_startup.py.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bitget_simulator import BitgetSimulator  # noqa: E402
+
+# Budget dell'avvio lazy (mediana, ms): circa 2,5 volte i tempi attuali, per cogliere un import
+# che torna a creare DB o client o a caricare moduli pesanti
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 500))
+PING_BUDGET_MS = float(os.getenv("STARTUP_PING_BUDGET_MS", 600))
+
+# Eseguito in un interprete nuovo: i tempi partono dal primo import del processo
+CHILD = r"""
+import os, json, time
+start = time.perf_counter()
+import services
+if os.environ["BENCH_DB_DELAY_MS"] != "0":
+    create_db = services._create_db
+    def slow_db():
+        time.sleep(float(os.environ["BENCH_DB_DELAY_MS"]) / 1000)  # connessione al DB simulata
+        return create_db()
+    services._create_db = slow_db
+if os.environ["BENCH_MODE"] == "eager":
+    services.start(background=False)
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/ping")
+pinged = time.perf_counter()
+body = response.get_json()
+services.wait_ready(30)
+ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000, "ping_ms": (pinged - start) * 1000,
+    "ready_ms": (ready - start) * 1000, "ping_status": response.status_code,
+    "ready_at_ping": body.get("ready"),
+}))
+"""
+
+
+def run_child(mode: str, base_url: str, db_delay_ms: float) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BENCH_MODE": mode,
+        "BENCH_DB_DELAY_MS": str(db_delay_ms),
+        "BITGET_BASE_URL": base_url,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": ":memory:",
+        "OUTBOX_PATH": ":memory:",
+        "CONTRACTS_CACHE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+    })
+    for name in ("API_KEY", "SECRET", "PASSPHRASE"):
+        env.setdefault(name, "bench")
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=120)
+    if output.returncode != 0:
+        raise RuntimeError(f"Avvio ({mode}) non riuscito:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    return {key: round(statistics.median(run[key] for run in runs), 1) for key in ("import_ms", "ping_ms", "ready_ms")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="latenza del simulatore Bitget")
+    parser.add_argument("--db-delay-ms", type=float, default=200.0, help="connessione al DB simulata")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                        help="budget di import di app.py (0 = nessuno)")
+    parser.add_argument("--ping-budget-ms", type=float, default=PING_BUDGET_MS,
+                        help="budget della prima risposta di /ping (0 = nessuno)")
+    parser.add_argument("--json", action="store_true", help="report in JSON")
+    args = parser.parse_args()
+
+    simulator = BitgetSimulator(latency_ms=args.latency_ms, jitter_ms=0).start()
+    try:
+        report = {}
+        for mode in ("eager", "lazy"):
+            runs = [run_child(mode, simulator.base_url, args.db_delay_ms) for _ in range(args.runs)]
+            report[mode] = dict(summarize(runs), ready_at_ping=runs[-1]["ready_at_ping"])
+    finally:
+        simulator.stop()
+
+    failures = []
+    if args.import_budget_ms and report["lazy"]["import_ms"] > args.import_budget_ms:
+        failures.append(f"import di app.py {report['lazy']['import_ms']} ms > {args.import_budget_ms} ms")
+    if args.ping_budget_ms and report["lazy"]["ping_ms"] > args.ping_budget_ms:
+        failures.append(f"prima risposta di /ping {report['lazy']['ping_ms']} ms > {args.ping_budget_ms} ms")
+    report["budget_failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'modalità':>8} {'import':>10} {'/ping':>10} {'pronto':>10}  (mediana di {args.runs} avvii)")
+        for mode in ("eager", "lazy"):
+            row = report[mode]
+            print(f"{mode:>8} {row['import_ms']:>8.1f}ms {row['ping_ms']:>8.1f}ms {row['ready_ms']:>8.1f}ms")
+        for failure in failures:
+            print(f"❌ Budget superato: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
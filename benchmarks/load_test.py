@@ -0,0 +1,274 @@
+"""
+Load test end-to-end del webhook contro il simulatore Bitget locale.
+
+Avvia BitgetSimulator, carica app.py con InMemoryDatabaseService al posto di MySQL,
+serve l'app su una porta locale e invia alert TradingView a POST /order a un rate
+costante (open loop: la latenza è misurata dall'istante di invio pianificato).
+Riporta throughput, p50/p90/p99, status HTTP e gambe fallite.
+
+    python benchmarks/load_test.py --count 500 --rate 50 --latency-ms 30 --error-rate 0.01
+    python benchmarks/load_test.py --alerts alerts.jsonl --rate 20 --async --json
+
+--alerts accetta un file JSONL: una riga per alert con il campo "text" (corpo del webhook)
+oppure "request" (export di request_log). Con --url gli alert vengono inviati a un server
+già avviato e le gambe fallite sono lette dalle risposte HTTP (solo modalità sincrona).
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitget_simulator import BitgetSimulator  # noqa: E402
+from memory_db import InMemoryDatabaseService  # noqa: E402
+
+SYMBOLS = ("BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT")
+TRADE_ID = re.compile(r"(id trade\s+)(.+)")
+
+ALERT_TEMPLATE = (
+    "Segnale su {symbol}.P\n"
+    "Ora: 2024-01-01T00:00:{n:05d}Z\n"
+    "Prezzo chiusura: 100\n"
+    "Azione: {action}\n"
+    "Commento: {comment}\n"
+    "id trade {n}\n"
+    "size: 3\n"
+    "Message: {comment} {direction} | Entry: 100 | SL: 95 | TP: 110 | Size: 3"
+)
+
+
+def synthetic_alerts(count: int, close_ratio: float):
+    """Alert OPEN (e una quota di CLOSE) distribuiti su più symbol."""
+    close_every = int(1 / close_ratio) if close_ratio > 0 else 0
+    for n in range(count):
+        closing = close_every and n % close_every == close_every - 1
+        yield ALERT_TEMPLATE.format(symbol=SYMBOLS[n % len(SYMBOLS)], n=n, action="buy",
+                                    comment="CLOSE" if closing else "OPEN", direction="LONG")
+
+
+def recorded_alerts(path: str, count: int, keep_ids: bool):
+    """Alert registrati, ripetuti ciclicamente fino a `count`; il trade id viene reso unico."""
+    texts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "text" not in record and "request" in record:
+                record = record["request"]
+                record = json.loads(record) if isinstance(record, str) else record
+            texts.append(record["text"])
+    if not texts:
+        raise SystemExit(f"Nessun alert in {path}")
+    for n in range(count):
+        text = texts[n % len(texts)]
+        # Senza trade id diversi la deduplicazione scarterebbe le ripetizioni
+        yield text if keep_ids else TRADE_ID.sub(lambda m: f"{m.group(1)}{m.group(2).strip()}-{n}", text, count=1)
+
+
+def failed_legs(result) -> Counter:
+    """Gambe di un risultato OPEN con errore o code Bitget diverso da 00000."""
+    failures = Counter()
+    if not isinstance(result, dict):
+        return failures
+    if result.get("status") in ("error", "invalid"):
+        failures["signal"] += 1  # ordine rifiutato dalla validazione locale o eccezione nel piano
+        return failures
+    legs = {name: result.get(name) for name in ("leverage", "order", "stopLoss") if name in result}
+    legs.update(result.get("takeProfit") or {})
+    for name, leg in legs.items():
+        if not isinstance(leg, dict) or "error" in leg or (leg.get("code") and leg.get("code") != "00000"):
+            failures[name] += 1
+    return failures
+
+
+def start_app(simulator: BitgetSimulator, async_orders: bool, db_latency_ms: float, client_limits: bool):
+    """Importa app.py contro simulatore e DB in memoria e lo serve su una porta locale."""
+    if not client_limits:
+        # Rate limiter del client disattivato: misura il percorso dell'ordine, non i limiti Bitget
+        os.environ["BITGET_GLOBAL_RATE"] = "0"  # letto all'import di rate_limiter
+        from rate_limiter import DEFAULT_LIMITS
+        os.environ["BITGET_RATE_LIMITS"] = json.dumps({path: 1_000_000 for path in DEFAULT_LIMITS})
+    os.environ.update({
+        "BITGET_BASE_URL": simulator.base_url,
+        "BITGET_WARMUP": "false",
+        "DB_BATCH_WRITES": "false",
+        "ASYNC_ORDERS": "true" if async_orders else "false",
+    })
+    for name in ("API_KEY", "SECRET", "PASSPHRASE"):
+        os.environ.setdefault(name, "load-test")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Il DB dell'app viene sostituito da InMemoryDatabaseService: nessun MySQL all'avvio
+    os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", ":memory:")
+    os.environ.setdefault("OUTBOX_PATH", ":memory:")
+    os.environ.setdefault("CONTRACTS_CACHE_PATH", "")  # contratti letti dal simulatore, nessun file su disco
+
+    memory_db = InMemoryDatabaseService(db_latency_ms)
+    import services
+    services.set_db(memory_db)  # prima dell'import di app.py: client e deduplica nascono già su questo DB
+    import app
+    services.wait_ready(30)
+
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+    return server, memory_db, f"http://127.0.0.1:{server.server_port}"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def fire(url: str, alerts, rate: float, concurrency: int):
+    """Invia gli alert a rate costante; restituisce (latenze ms, status, corpi JSON, durata)."""
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    latencies, statuses, bodies = [], Counter(), []
+    lock = threading.Lock()
+
+    def send(text, scheduled):
+        body = None
+        try:
+            response = session.post(url + "/order", json={"text": text}, timeout=60)
+            status = response.status_code
+            body = response.json()
+        except requests.RequestException as e:
+            status = type(e).__name__
+        except ValueError:
+            pass  # es. pagina HTML di un 500
+        elapsed = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] += 1
+            bodies.append(body)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for n, text in enumerate(alerts):
+            scheduled = start + n / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, text, scheduled)
+    return latencies, statuses, bodies, time.perf_counter() - start
+
+
+def wait_for_results(memory_db: InMemoryDatabaseService, expected: int, timeout: float):
+    """Modalità asincrona: attende che i worker abbiano salvato tutte le risposte."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done = [r for r in memory_db.responses() if r not in (None, "null")]
+        if len(done) >= expected:
+            return done
+        time.sleep(0.05)
+    return [r for r in memory_db.responses() if r not in (None, "null")]
+
+
+def wait_for_outbox(timeout: float):
+    """Attende che l'outbox dell'app abbia ritentato tutte le gambe in sospeso."""
+    import services
+    worker = services.outbox_worker()
+    if worker is None:
+        return None
+    deadline = time.monotonic() + timeout
+    while worker.outbox.stats().get("pending") and time.monotonic() < deadline:
+        time.sleep(0.2)
+    return worker.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="alert da inviare")
+    parser.add_argument("--rate", type=float, default=20.0, help="alert al secondo")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--alerts", help="file JSONL di alert registrati (default: alert sintetici)")
+    parser.add_argument("--keep-ids", action="store_true", help="non rendere unici i trade id registrati")
+    parser.add_argument("--close-ratio", type=float, default=0.0, help="quota di alert CLOSE sintetici")
+    parser.add_argument("--async", dest="async_orders", action="store_true", help="ASYNC_ORDERS=true")
+    parser.add_argument("--url", help="server già avviato (niente simulatore né DB in memoria)")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="richieste eseguite dal simulatore senza risposta (timeout lato client)")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--no-client-limits", action="store_true",
+                        help="disattiva il rate limiter del client (limiti Bitget per UID)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="report in JSON (per la CI)")
+    args = parser.parse_args()
+
+    if args.alerts:
+        alerts = recorded_alerts(args.alerts, args.count, args.keep_ids)
+    else:
+        alerts = synthetic_alerts(args.count, args.close_ratio)
+
+    simulator = memory_db = server = None
+    url = args.url
+    if not url:
+        simulator = BitgetSimulator(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                                    seed=args.seed, drop_rate=args.drop_rate).start()
+        server, memory_db, url = start_app(simulator, args.async_orders, args.db_latency_ms,
+                                              not args.no_client_limits)
+
+    latencies, statuses, bodies, duration = fire(url, alerts, args.rate, args.concurrency)
+
+    if memory_db is not None:
+        results = wait_for_results(memory_db, args.count, timeout=120) if args.async_orders else memory_db.responses()
+    else:
+        results = bodies
+    failures = Counter()
+    for result in results:
+        failures.update(failed_legs(result))
+
+    report = {
+        "sent": args.count,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(args.count / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "status": {str(k): v for k, v in statuses.items()},
+        "leg_failures": dict(failures),
+        "completed": len(results),
+    }
+    if simulator is not None:
+        report["outbox"] = wait_for_outbox(timeout=120)
+        report["exchange"] = dict(simulator.stats(), unprotected_entries=len(simulator.unprotected_entries()))
+        server.shutdown()
+        simulator.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"alert inviati: {report['sent']} in {report['duration_s']} s "
+          f"({report['throughput_rps']} alert/s, completati {report['completed']})")
+    print("latenza webhook: " + " ".join(f"{k}={v} ms" for k, v in report["latency_ms"].items()))
+    print(f"status HTTP: {report['status']}")
+    print(f"gambe fallite: {report['leg_failures'] or 'nessuna'}")
+    if report.get("outbox"):
+        print(f"outbox: {report['outbox']}")
+    if "exchange" in report:
+        print(f"simulatore: {report['exchange']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,212 +1,515 @@
-import time
-import hmac
-import hashlib
-import base64
-import json
+import logging
 import requests
 import os
+import time
+from urllib.parse import urlencode
 from datetime import datetime
-from dotenv import load_dotenv
 from db_module import DatabaseService  # ✅ nuovo import
+from http_pool import PooledSession
+from state_cache import ExchangeStateCache
+from contracts import ContractCache
+from position_book import PositionBook, PositionStream, WS_PRIVATE_URL, hold_side_of
+from request_signer import RequestSigner, serialize_payload
+from rate_limiter import EndpointRateLimiter, PRIORITY_ENTRY, PRIORITY_PLAN, retry_after
+from logging_setup import LazyJson
+from metrics import measure, BITGET_REQUEST_SECONDS
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-BASE_URL = "https://api.bitget.com"
+BASE_URL = os.getenv("BITGET_BASE_URL", "https://api.bitget.com")
+WARMUP_PATH = "/api/v2/public/time"
 PRODUCT_TYPE = "USDT-FUTURES"
 MARGIN_MODE = "isolated"
 ORDER_TYPE = "market"
 ENVIRONMENT = os.getenv("ENVIRONMENT", "demo")
+RATE_LIMIT_RETRIES = int(os.getenv("BITGET_RATE_LIMIT_RETRIES", 3))
+NO_POSITION_CODE = "22002"  # close-positions senza posizioni aperte
+ORDER_NOT_FOUND_CODE = "40109"  # order/detail per un clientOid mai ricevuto
+
+
+def _outcome(response_data) -> str:
+    """Esito di una chiamata per le metriche: ok, api_error, network_error o error."""
+    if not isinstance(response_data, dict):
+        return "error"
+    if response_data.get("error") == "RequestException":
+        return "network_error"
+    if "error" in response_data:
+        return "error"
+    return "ok" if response_data.get("code") == "00000" else "api_error"
+
+
+def _json_body(response):
+    """Corpo JSON della risposta, letto una sola volta per rate limit ed esito (None se non è JSON)."""
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def _http_result(status, data, text="") -> dict:
+    """
+    Esito di una risposta HTTP sotto 500. Bitget rifiuta gli ordini (margine insufficiente, trigger
+    o size non validi) con un 4xx e il code nel corpo JSON: il code reale arriva ad api_requests e
+    all'outbox, che ritenta solo i RETRYABLE_CODES. Un 4xx senza JSON (es. da un proxy) usa il code HTTP.
+    """
+    if isinstance(data, dict) and (status < 400 or data.get("code") is not None):
+        return data
+    if status < 400:
+        raise ValueError(f"Risposta non JSON da Bitget (HTTP {status})")
+    return {"code": str(status), "msg": (text or "")[:200] or f"HTTP {status}", "data": None}
+
+
+def _leg_error(code, msg) -> dict:
+    return {"code": code or "ERROR", "msg": msg, "data": None}
+
+
+def split_pos_tpsl(payload, response_data):
+    """(payload, risultato) per le gambe profit e loss di place-pos-tpsl."""
+    legs = {
+        "profit": {key: payload[key] for key in payload if not key.startswith("stopLoss")},
+        "loss": {key: payload[key] for key in payload if not key.startswith("stopSurplus")},
+    }
+    if not isinstance(response_data, dict) or response_data.get("code") != "00000":
+        return [(legs["profit"], response_data), (legs["loss"], response_data)]
+    items = [item for item in response_data.get("data") or [] if isinstance(item, dict)]
+    oids = {"profit": payload.get("stopSurplusClientOid"), "loss": payload.get("stopLossClientOid")}
+    results = []
+    for position, (name, leg_payload) in enumerate(legs.items()):
+        item = next((i for i in items if oids[name] and i.get("clientOid") == oids[name]), None)
+        if item is None and not any(oids.values()) and position < len(items):
+            item = items[position]  # senza clientOid Bitget restituisce prima il TP, poi lo SL
+        result = {"code": "00000", "msg": "success", "data": item} if item else \
+            _leg_error("ERROR", "Gamba assente dalla risposta place-pos-tpsl")
+        results.append((leg_payload, result))
+    return results
+
+
+# --- Payload delle chiamate operative: condivisi da BitgetClient e AsyncBitgetClient ---
+
+SET_LEVERAGE_PATH = "/api/v2/mix/account/set-leverage"
+PLACE_ORDER_PATH = "/api/v2/mix/order/place-order"
+PLACE_TPSL_PATH = "/api/v2/mix/order/place-tpsl-order"
+PLACE_POS_TPSL_PATH = "/api/v2/mix/order/place-pos-tpsl"
+CLOSE_POSITIONS_PATH = "/api/v2/mix/order/close-positions"
+CANCEL_PLAN_PATH = "/api/v2/mix/order/cancel-plan-order"
+
+
+def leverage_payload(symbol, margin_coin, leverage, side):
+    return {
+        "symbol": symbol,
+        "marginCoin": margin_coin,
+        "leverage": str(leverage),
+        "holdSide": hold_side_of(side),
+        "productType": PRODUCT_TYPE
+    }
+
+
+def order_payload(symbol, margin_coin, quantity, side, trade_side, client_oid=None):
+    payload = {
+        "symbol": symbol,
+        "productType": PRODUCT_TYPE,
+        "marginMode": MARGIN_MODE,
+        "marginCoin": margin_coin,
+        "size": quantity,
+        "side": side,
+        "tradeside": trade_side,
+        "orderType": ORDER_TYPE,
+        "force": "gtc"
+    }
+    if client_oid:
+        payload["clientOid"] = client_oid
+    return payload
+
+
+def tpsl_payload(symbol, margin_coin, quantity, side, trigger_price, plan_type, client_oid=None):
+    payload = {
+        "symbol": symbol,
+        "productType": PRODUCT_TYPE,
+        "marginCoin": margin_coin,
+        "planType": plan_type,
+        "triggerPrice": trigger_price,
+        "holdSide": hold_side_of(side),
+        "size": quantity
+    }
+    if client_oid:
+        payload["clientOid"] = client_oid
+    return payload
+
+
+def pos_tpsl_payload(symbol, margin_coin, side, tp_price, sl_price, tp_client_oid=None, sl_client_oid=None):
+    payload = {
+        "symbol": symbol,
+        "productType": PRODUCT_TYPE,
+        "marginCoin": margin_coin,
+        "holdSide": hold_side_of(side),
+        "stopSurplusTriggerPrice": tp_price,
+        "stopSurplusTriggerType": "fill_price",
+        "stopLossTriggerPrice": sl_price,
+        "stopLossTriggerType": "fill_price"
+    }
+    if tp_client_oid:
+        payload["stopSurplusClientOid"] = tp_client_oid
+    if sl_client_oid:
+        payload["stopLossClientOid"] = sl_client_oid
+    return payload
+
+
+def pos_tpsl_fallbacks(response, results, tp, sl):
+    """
+    Gambe di place-pos-tpsl da reinviare con place-tpsl-order: quelle rifiutate o assenti
+    dalla risposta, con size nota. `tp`/`sl`: (size, prezzo, clientOid).
+    Con un errore di rete l'esito è incerto: niente nuovo invio (lo farebbe il chiamante col clientOid).
+    """
+    if isinstance(response, dict) and "error" in response:
+        return []
+    legs = {"profit": tp + ("profit_plan",), "loss": sl + ("loss_plan",)}
+    return [(name, size, price, plan_type, oid) for name, (size, price, oid, plan_type) in legs.items()
+            if results[name].get("code") != "00000" and size]
+
+
+def close_positions_payload(symbol):
+    return {
+        "symbol": symbol,
+        "productType": PRODUCT_TYPE
+    }
+
+
+def cancel_plan_payload(symbol, margin_coin):
+    return {
+        "symbol": symbol,
+        "productType": PRODUCT_TYPE,
+        "marginCoin": margin_coin,
+        "planType": "profit_loss"
+    }
+
+
+class BitgetClientBase:
+    """
+    Stato e logica comuni ai client sincrono e asincrono: credenziali e firma, cache della leva,
+    rate limiter, contratti, position book e log delle chiamate in api_requests. Le sottoclassi
+    cambiano solo il trasporto delle POST; le GET di sola lettura (riconciliazione, outbox)
+    restano sul pool sincrono e girano nei thread di background.
+    """
+
+    def __init__(self, db_service=None, account=None, contracts=None):
+        # Credenziali dell'account (accounts.Account) o, senza account, quelle di API_KEY/SECRET/PASSPHRASE
+        self.account = account.name if account else None
+        self.api_key = account.api_key if account else os.getenv("API_KEY")
+        self.api_secret = account.secret if account else os.getenv("SECRET")
+        self.passphrase = account.passphrase if account else os.getenv("PASSPHRASE")
+        self._signer = None
+        self._signer_credentials = None
+        self.db_service = db_service or DatabaseService()  # ✅ sostituisce RequestLogApiServer
+        self.http = PooledSession(BASE_URL)  # connessioni persistenti verso Bitget
+        self.state_cache = ExchangeStateCache()  # leva già impostata per (symbol, holdSide, marginMode)
+        self.rate_limiter = EndpointRateLimiter()  # token bucket per endpoint, condiviso tra thread
+        # Passo size/tick prezzo per la validazione locale: metadati pubblici, condivisi tra gli account
+        self.contracts = contracts or ContractCache(self.http, PRODUCT_TYPE)
+        self.positions = PositionBook(self.get_positions)  # posizioni aperte (vedi POSITION_SKIP_FLAT_CLOSE)
 
+    def warmup(self, background=True):
+        """Apre in anticipo le connessioni del pool verso Bitget."""
+        if background:
+            return self.http.warmup_async(WARMUP_PATH)
+        return self.http.warmup(WARMUP_PATH)
 
-class BitgetClient:
-    def __init__(self):
-        self.api_key = os.getenv("API_KEY")
-        self.api_secret = os.getenv("SECRET")
-        self.passphrase = os.getenv("PASSPHRASE")
-        self.db_service = DatabaseService()  # ✅ sostituisce RequestLogApiServer
+    def pool_metrics(self):
+        return self.http.metrics.snapshot()
+
+    @property
+    def signer(self):
+        """Firma precalcolata, ricreata solo se cambiano le credenziali."""
+        credentials = (self.api_key, self.api_secret, self.passphrase)
+        if self._signer is None or self._signer_credentials != credentials:
+            self._signer = RequestSigner(self.api_key, self.api_secret, self.passphrase, ENVIRONMENT == "demo")
+            self._signer_credentials = credentials
+        return self._signer
 
     def _get_signature(self, timestamp, method, path, body=""):
-        message = f"{timestamp}{method}{path}{body}"
-        signature = hmac.new(
-            self.api_secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(signature).decode()
-
-    def _validate_response(self, response_data):
+        if isinstance(body, str):
+            body = body.encode()
+        return self.signer.sign(timestamp, method, path, body)
+
+    def _validate_response(self, response_data, signal_id=None):
+        log_fields = {"signal_id": signal_id}
         if not isinstance(response_data, dict):
-            print("❌ Risposta non valida (non è un dizionario)")
+            logger.error("❌ Risposta non valida (non è un dizionario)", extra=log_fields)
             return False
 
         code = response_data.get("code")
         msg = response_data.get("msg")
         data = response_data.get("data")
 
-        print("=======================================")
-        print("response json:", json.dumps(response_data, indent=2))
-        print("response data:", data)
-        print("response code:", code)
-        print("response msg:", msg)
+        logger.debug("response json: %s", LazyJson(response_data), extra=log_fields)
         if code != "00000":
-            print(f"❌ Errore Bitget: code={code}, msg={msg}")
+            logger.error("❌ Errore Bitget: code=%s, msg=%s", code, msg, extra=log_fields)
             return False
 
         if not data:
-            print("⚠️ Nessun dato restituito, ordine forse non accettato")
+            logger.warning("⚠️ Nessun dato restituito, ordine forse non accettato", extra=log_fields)
             return False
 
-        print("✅ Accepted Request:", data)
-        print("****************************************")
+        logger.info("✅ Accepted Request: %s", LazyJson(data, indent=None), extra=log_fields)
         return True
 
     def _get_headers(self, method, path, body):
-        timestamp = str(int(time.time() * 1000))
-        sign = self._get_signature(timestamp, method, path, body)
-        headers = {
-            "ACCESS-KEY": self.api_key,
-            "ACCESS-SIGN": sign,
-            "ACCESS-TIMESTAMP": timestamp,
-            "ACCESS-PASSPHRASE": self.passphrase,
-            "Content-Type": "application/json",
-            "locale": "en-US",
-            "paptrading": "1"
+        if isinstance(body, str):
+            body = body.encode()
+        return self.signer.headers(method, path, body)
+
+    def _complete(self, path, payload, status, response_data, request_log, started, queue_delay,
+                  signal_id=None, split=None):
+        """Risposta HTTP ricevuta: log in api_requests (una riga per gamba delle API batch) e cache."""
+        response_log = {
+            "response_status": status,
+            "response_json": response_data,
+            "response_data": response_data.get("data"),
+            "response_code": response_data.get("code"),
+            "response_msg": response_data.get("msg")
         }
-        if ENVIRONMENT == "demo":
-            headers["X-CHANNEL-API-CODE"] = "default"
-        return headers
 
-    def _post(self, path, payload, signal_id=None):
-        """Effettua una POST verso Bitget e salva log nel DB."""
-        body = json.dumps(payload)
-        headers = self._get_headers("POST", path, body)
+        # ✅ nuovo logging tramite DatabaseService
+        legs = split(payload, response_data) if split else None
+        self._log_call(request_log, response_log, started, queue_delay, signal_id, legs)
 
-        try:
-            response = requests.post(BASE_URL + path, headers=headers, json=payload, timeout=10)
-            response.raise_for_status()
-            response_data = response.json()
-
-            request_log = {
-                "timestamp": str(datetime.now()),
-                "endpoint": path,
-                "body": body,
-                "headers": headers,
-                "payload": payload
-            }
-
-            response_log = {
-                "response_status": response.status_code,
-                "response_body": response.text,
-                "response_json": response_data,
-                "response_data": response_data.get("data"),
-                "response_code": response_data.get("code"),
-                "response_msg": response_data.get("msg")
-            }
-
-            # ✅ nuovo logging tramite DatabaseService
+        self._validate_response(response_data, signal_id)
+        # Una risposta di errore rende incerto lo stato memorizzato per il symbol
+        if response_data.get("code") != "00000":
+            self.state_cache.invalidate(payload.get("symbol"))
+            self.positions.invalidate(payload.get("symbol"))
+        return response_data
+
+    def _fail(self, path, payload, kind, error, request_log, started, queue_delay, signal_id=None):
+        """Chiamata senza risposta valida (kind: RequestException o UnexpectedError): esito incerto."""
+        if kind == "RequestException":
+            logger.error("❌ Errore di rete verso Bitget su %s: %s", path, error, extra={"signal_id": signal_id})
+        else:
+            logger.error("❌ Errore inatteso nella chiamata a %s", path, exc_info=error,
+                         extra={"signal_id": signal_id})
+        error_log = {
+            "response_status": kind,
+            "response_body": str(error),
+            "response_code": "ERROR",
+            "response_msg": str(error)
+        }
+        self._log_call(request_log, error_log, started, queue_delay, signal_id)
+        self.state_cache.invalidate(payload.get("symbol"))
+        self.positions.invalidate(payload.get("symbol"))
+        return {"error": kind, "message": str(error)}
+
+    def _get(self, path, params, ok_codes=()):
+        """
+        GET firmata di sola lettura (posizioni, stato degli ordini): misurata ma non salvata
+        in api_requests. Solleva ValueError per i code diversi da 00000 e da `ok_codes`.
+        """
+        query = urlencode(params)
+        endpoint = path.rsplit("/", 1)[-1]
+        with measure(BITGET_REQUEST_SECONDS, f"bitget.{endpoint}", endpoint=endpoint) as labels:
+            labels["outcome"] = "error"
+            self.rate_limiter.acquire(path, PRIORITY_PLAN)
+            headers = self.signer.headers("GET", f"{path}?{query}")
+            response = self.http.get(f"{BASE_URL}{path}?{query}", headers=headers, timeout=10)
+            if response.status_code >= 500:
+                response.raise_for_status()
+            response_data = _http_result(response.status_code, _json_body(response), response.text)
+            if response_data.get("code") != "00000":
+                labels["outcome"] = "api_error"
+                if response_data.get("code") not in ok_codes:
+                    raise ValueError(f"code={response_data.get('code')} msg={response_data.get('msg')}")
+            else:
+                labels["outcome"] = "ok"
+        return response_data
+
+    def _log_call(self, request_log, response_log, started, queue_delay, signal_id=None, legs=None):
+        """Salva la chiamata in api_requests con latenza HTTP (ultimo tentativo) e attesa nel rate limiter."""
+        request_log["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        request_log["queue_delay_ms"] = round(queue_delay * 1000, 3)
+        request_log["account"] = self.account
+        self._write_call(request_log, response_log, signal_id, legs)
+
+    def _write_call(self, request_log, response_log, signal_id=None, legs=None):
+        if not legs:
             self.db_service.log_outgoing_api(request_log, response_log, signal_id)
+            return
+        # Una riga per gamba: order_id e code restano indicizzati per singolo ordine
+        for leg_payload, leg_result in legs:
+            self.db_service.log_outgoing_api(dict(request_log, payload=leg_payload), {
+                "response_status": response_log["response_status"],
+                "response_json": leg_result,
+                "response_data": leg_result.get("data"),
+                "response_code": leg_result.get("code"),
+                "response_msg": leg_result.get("msg")
+            }, signal_id)
+
+    def _cached_leverage(self, payload):
+        """Risposta memorizzata se la stessa leva è già stata confermata da Bitget (chiamata saltata)."""
+        cached = self.state_cache.lookup((payload["symbol"], payload["holdSide"], MARGIN_MODE), payload["leverage"])
+        return dict(cached, cached=True) if cached is not None else None
+
+    def _store_leverage(self, payload, response):
+        if isinstance(response, dict) and response.get("code") == "00000":
+            self.state_cache.store((payload["symbol"], payload["holdSide"], MARGIN_MODE), payload["leverage"],
+                                   response)
+
+    def _flat_close(self, symbol, signal_id=None):
+        """Risultato del CLOSE se il salto è attivo e il position book sa che il symbol è flat, altrimenti None."""
+        if not self.positions.skip_close(symbol):
+            return None
+        logger.info("✅ Nessuna posizione aperta su %s: CLOSE senza chiamate a Bitget", symbol,
+                    extra={"signal_id": signal_id})
+        return {"status": "flat"}
+
+    def _close_failed(self, symbol, response, signal_id=None):
+        """Errore di close-positions (None se chiusa o già flat: in quel caso aggiorna il book)."""
+        code = response.get("code") if isinstance(response, dict) else None
+        if code not in ("00000", NO_POSITION_CODE):
+            logger.error("❌ Chiusura delle posizioni su %s non riuscita", symbol, extra={"signal_id": signal_id})
+            return {"status": "error", "close": response}
+        self.positions.mark_closed(symbol)
+        if code == NO_POSITION_CODE:
+            logger.info("✅ Nessuna posizione aperta da chiudere", extra={"signal_id": signal_id})
+        return None
+
+    def get_positions(self, margin_coin="USDT"):
+        """Posizioni aperte sull'account (usato dalla riconciliazione del position book)."""
+        response = self._get("/api/v2/mix/position/all-position",
+                             {"productType": PRODUCT_TYPE, "marginCoin": margin_coin})
+        return response.get("data") or []
+
+    def order_exists(self, symbol, client_oid, plan=False):
+        """True se Bitget conosce il clientOid (ordine o TP/SL in attesa); usato dall'outbox all'avvio."""
+        if plan:
+            response = self._get("/api/v2/mix/order/orders-plan-pending",
+                                 {"symbol": symbol, "productType": PRODUCT_TYPE, "planType": "profit_loss"})
+            orders = (response.get("data") or {}).get("entrustedList") or []
+            return any(order.get("clientOid") == client_oid for order in orders)
+        response = self._get("/api/v2/mix/order/detail",
+                             {"symbol": symbol, "productType": PRODUCT_TYPE, "clientOid": client_oid},
+                             ok_codes=(ORDER_NOT_FOUND_CODE,))
+        return response.get("code") == "00000" and bool(response.get("data"))
 
-            self._validate_response(response_data)
-            return response_data
+    def position_stream(self, connect=None):
+        """Stream privato delle posizioni collegato al book (connect sostituibile con uno stub)."""
+        return PositionStream(self.positions, self.signer, WS_PRIVATE_URL, connect, PRODUCT_TYPE)
+
+
+class BitgetClient(BitgetClientBase):
+    """Client sincrono (requests): una chiamata occupa il thread chiamante fino alla risposta."""
+
+    def _post(self, path, payload, signal_id=None, priority=PRIORITY_ENTRY, split=None):
+        """POST verso Bitget misurata per endpoint ed esito (bitget_request_seconds e traccia del segnale)."""
+        endpoint = path.rsplit("/", 1)[-1]
+        with measure(BITGET_REQUEST_SECONDS, f"bitget.{endpoint}", endpoint=endpoint) as labels:
+            response_data = self._send(path, payload, signal_id, priority, split)
+            labels["outcome"] = _outcome(response_data)
+        return response_data
+
+    def _send(self, path, payload, signal_id=None, priority=PRIORITY_ENTRY, split=None):
+        """
+        Effettua una POST verso Bitget e salva log nel DB.
+        La chiamata attende il proprio turno nel rate limiter dell'endpoint; su un 429
+        il bucket viene messo in pausa e la richiesta (rifiutata, quindi non eseguita) ritentata.
+        Errori di connessione, timeout e 5xx diventano {"error": "RequestException"}; un 4xx
+        restituisce il corpo di Bitget con il suo code.
+        Per le API batch `split(payload, risposta)` restituisce (payload, esito) di ogni gamba,
+        salvate in api_requests come righe distinte.
+        """
+        # Gli stessi byte vengono firmati e inviati
+        body_bytes = serialize_payload(payload)
+        queue_delay = self.rate_limiter.acquire(path, priority)
+        headers = self.signer.headers("POST", path, body_bytes)
+        # Gli header firmati non vengono salvati: il log contiene solo payload e risposta
+        request_log = {"timestamp": str(datetime.now()), "endpoint": path, "payload": payload}
+        started = time.perf_counter()
+
+        try:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                started = time.perf_counter()
+                response = self.http.post(BASE_URL + path, headers=headers, data=body_bytes, timeout=10)
+                response_data = _json_body(response)
+                limited, wait = retry_after(response, response_data)
+                if not limited or attempt == RATE_LIMIT_RETRIES:
+                    break
+                logger.warning("⚠️ Rate limit Bitget su %s, nuovo tentativo tra %ss", path, wait,
+                               extra={"signal_id": signal_id})
+                self.rate_limiter.penalize(path, wait)
+                queue_delay += self.rate_limiter.acquire(path, priority)
+                headers = self.signer.headers("POST", path, body_bytes)
+            # Solo un 5xx è un errore del server (esito incerto); un 4xx porta il code del rifiuto
+            if response.status_code >= 500:
+                response.raise_for_status()
+            response_data = _http_result(response.status_code, response_data, response.text)
+            return self._complete(path, payload, response.status_code, response_data, request_log, started,
+                                  queue_delay, signal_id, split)
 
         except requests.exceptions.RequestException as e:
-            error_log = {
-                "response_status": "RequestException",
-                "response_body": str(e),
-                "response_json": "",
-                "response_data": "",
-                "response_code": "ERROR",
-                "response_msg": str(e)
-            }
-
-            request_log = {
-                "timestamp": str(datetime.now()),
-                "endpoint": path,
-                "body": body,
-                "headers": headers,
-                "payload": payload
-            }
-
-            self.db_service.log_outgoing_api(request_log, error_log, signal_id)
-            return {"error": "RequestException", "message": str(e)}
+            return self._fail(path, payload, "RequestException", e, request_log, started, queue_delay, signal_id)
 
         except Exception as e:
-            error_log = {
-                "response_status": "UnexpectedError",
-                "response_body": str(e),
-                "response_json": "",
-                "response_data": "",
-                "response_code": "ERROR",
-                "response_msg": str(e)
-            }
-
-            request_log = {
-                "timestamp": str(datetime.now()),
-                "endpoint": path,
-                "body": body,
-                "headers": headers,
-                "payload": payload
-            }
-
-            self.db_service.log_outgoing_api(request_log, error_log, signal_id)
-            return {"error": "UnexpectedError", "message": str(e)}
+            return self._fail(path, payload, "UnexpectedError", e, request_log, started, queue_delay, signal_id)
 
     # --- Metodi operativi (restano invariati tranne l'aggiunta di signal_id opzionale) ---
 
     def set_leverage(self, symbol, margin_coin, leverage, side, signal_id=None):
-        path = "/api/v2/mix/account/set-leverage"
-        payload = {
-            "symbol": symbol,
-            "marginCoin": margin_coin,
-            "leverage": str(leverage),
-            "holdSide": "long" if side == "buy" else "short",
-            "productType": PRODUCT_TYPE
-        }
-        return self._post(path, payload, signal_id)
-
-    def place_order(self, symbol, margin_coin, quantity, side, trade_side, signal_id=None):
-        path = "/api/v2/mix/order/place-order"
-        payload = {
-            "symbol": symbol,
-            "productType": PRODUCT_TYPE,
-            "marginMode": MARGIN_MODE,
-            "marginCoin": margin_coin,
-            "size": quantity,
-            "side": side,
-            "tradeside": trade_side,
-            "orderType": ORDER_TYPE,
-            "force": "gtc"
-        }
-        return self._post(path, payload, signal_id)
-
-    def place_tp_sl(self, symbol, margin_coin, quantity, side, trigger_price, plan_type, signal_id=None):
-        path = "/api/v2/mix/order/place-tpsl-order"
-        payload = {
-            "symbol": symbol,
-            "productType": PRODUCT_TYPE,
-            "marginCoin": margin_coin,
-            "planType": plan_type,
-            "triggerPrice": trigger_price,
-            "holdSide": "long" if side == "buy" else "short",
-            "size": quantity
-        }
-        return self._post(path, payload, signal_id)
-
-    
-    def close_all_positions(self, symbol):
-        # 1. Recupera tutte le posizioni aperte
-        path = "/api/v2/mix/order/close-positions"
-        payload = {
-            "symbol": symbol,
-            "productType": PRODUCT_TYPE
-        }
-        response = self._post(path, payload)
+        payload = leverage_payload(symbol, margin_coin, leverage, side)
+        # Se la stessa leva è già stata confermata da Bitget la chiamata viene saltata
+        cached = self._cached_leverage(payload)
+        if cached is not None:
+            return cached
+        response = self._post(SET_LEVERAGE_PATH, payload, signal_id)
+        self._store_leverage(payload, response)
+        return response
 
-        if not response or "data" not in response:
-            print("❌ Nessuna posizione trovata o errore nella richiesta")
-            return
+    def place_order(self, symbol, margin_coin, quantity, side, trade_side, signal_id=None, client_oid=None):
+        payload = order_payload(symbol, margin_coin, quantity, side, trade_side, client_oid)
+        response = self._post(PLACE_ORDER_PATH, payload, signal_id)
+        if isinstance(response, dict) and response.get("code") == "00000":
+            self.positions.apply_fill(symbol, side, trade_side, quantity)
+        return response
 
-        positions = response["data"]
-        if not positions:
-            print("✅ Nessuna posizione aperta da chiudere")
-            return
+    def place_tp_sl(self, symbol, margin_coin, quantity, side, trigger_price, plan_type, signal_id=None,
+                    client_oid=None):
+        payload = tpsl_payload(symbol, margin_coin, quantity, side, trigger_price, plan_type, client_oid)
+        # Le gambe TP/SL cedono il passo agli ordini di ingresso quando il limite è saturo
+        return self._post(PLACE_TPSL_PATH, payload, signal_id, priority=PRIORITY_PLAN)
+
+    def place_pos_tpsl(self, symbol, margin_coin, side, tp_price, sl_price, signal_id=None,
+                       tp_client_oid=None, sl_client_oid=None, tp_size=None, sl_size=None):
+        """
+        TP e SL di posizione in una sola richiesta (place-pos-tpsl): il TP chiude la posizione residua.
+        Restituisce {"profit": risultato, "loss": risultato}. Se Bitget rifiuta la richiesta o una
+        gamba manca dalla risposta, le gambe mancanti (con size nota) vengono inviate con place-tpsl-order.
+        """
+        payload = pos_tpsl_payload(symbol, margin_coin, side, tp_price, sl_price, tp_client_oid, sl_client_oid)
+        response = self._post(PLACE_POS_TPSL_PATH, payload, signal_id, priority=PRIORITY_PLAN, split=split_pos_tpsl)
+        (_, profit), (_, loss) = split_pos_tpsl(payload, response)
+        results = {"profit": profit, "loss": loss}
+        for name, size, price, plan_type, oid in pos_tpsl_fallbacks(response, results,
+                                                                    (tp_size, tp_price, tp_client_oid),
+                                                                    (sl_size, sl_price, sl_client_oid)):
+            logger.warning("⚠️ place-pos-tpsl non riuscito per la gamba %s, invio con place-tpsl-order", name,
+                           extra={"signal_id": signal_id})
+            results[name] = self.place_tp_sl(symbol, margin_coin, size, side, price, plan_type, signal_id,
+                                             client_oid=oid)
+        return results
+
+    def cancel_plan_orders(self, symbol, margin_coin="USDT", signal_id=None):
+        """Cancella tutti gli ordini TP/SL (planType profit_loss) rimasti sul symbol."""
+        return self._post(CANCEL_PLAN_PATH, cancel_plan_payload(symbol, margin_coin), signal_id,
+                          priority=PRIORITY_PLAN)
+
+    def close_all_positions(self, symbol, signal_id=None):
+        """
+        Chiude le posizioni del symbol e, nello stesso passo, cancella i TP/SL rimasti.
+        Se il position book sa che il symbol è flat non parte nessuna chiamata.
+        """
+        flat = self._flat_close(symbol, signal_id)
+        if flat is not None:
+            return flat
+        # Prima la chiusura (priorità di ingresso), poi i TP/SL: la posizione non resta mai senza SL
+        response = self._post(CLOSE_POSITIONS_PATH, close_positions_payload(symbol), signal_id)
+        failed = self._close_failed(symbol, response, signal_id)
+        if failed is not None:
+            return failed
+        cancelled = self.cancel_plan_orders(symbol, signal_id=signal_id)
+        return {"status": "closed", "close": response, "cancelPlans": cancelled}
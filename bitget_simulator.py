@@ -0,0 +1,417 @@
+"""
+Simulatore locale degli endpoint Bitget usati da BitgetClient, per load test senza toccare l'exchange.
+
+Espone set-leverage, place-order, place-tpsl-order, place-pos-tpsl,
+close-positions, cancel-plan-order, all-position (più /api/v2/public/time per il warmup
+e /api/v2/mix/market/contracts) con latenza, errori applicativi e 429 configurabili. I clientOid ripetuti vengono
+rifiutati come fa Bitget. Con drop_rate la connessione si chiude senza risposta,
+con la richiesta eseguita o no (timeout durante un picco di latenza: esito incerto per il client). stream_connect sostituisce il WebSocket privato delle posizioni
+(PositionStream) con uno stub che invia uno snapshot a ogni variazione.
+
+    python bitget_simulator.py --port 8081 --latency-ms 30 --error-rate 0.01 --rate-limit-rate 0.02
+    BITGET_BASE_URL=http://127.0.0.1:8081 gunicorn app:app
+"""
+import json
+import time
+import queue
+import random
+import sys
+import argparse
+import threading
+import itertools
+from collections import Counter
+from urllib.parse import parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+SIGNED_HEADERS = ("ACCESS-KEY", "ACCESS-SIGN", "ACCESS-TIMESTAMP", "ACCESS-PASSPHRASE")
+
+# Contratti esposti da /contracts nel formato Bitget (pricePlace/priceEndStep/volumePlace/sizeMultiplier)
+CONTRACTS = [
+    {"symbol": "BTCUSDT", "pricePlace": "1", "priceEndStep": "1", "volumePlace": "4",
+     "sizeMultiplier": "0.0001", "minTradeNum": "0.0001"},
+    {"symbol": "ETHUSDT", "pricePlace": "2", "priceEndStep": "1", "volumePlace": "2",
+     "sizeMultiplier": "0.01", "minTradeNum": "0.01"},
+    {"symbol": "SOLUSDT", "pricePlace": "3", "priceEndStep": "1", "volumePlace": "1",
+     "sizeMultiplier": "0.1", "minTradeNum": "0.1"},
+    {"symbol": "XRPUSDT", "pricePlace": "4", "priceEndStep": "1", "volumePlace": "0",
+     "sizeMultiplier": "1", "minTradeNum": "1"},
+    {"symbol": "DOGEUSDT", "pricePlace": "5", "priceEndStep": "1", "volumePlace": "0",
+     "sizeMultiplier": "1", "minTradeNum": "1"},
+]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un client che termina con connessioni keep-alive aperte non è un errore del simulatore
+        if isinstance(sys.exc_info()[1], ConnectionResetError):
+            return
+        super().handle_error(request, client_address)
+
+
+class BitgetSimulator:
+    """Server HTTP in un thread di background; start() restituisce il simulatore, base_url il suo indirizzo."""
+
+    def __init__(self, latency_ms: float = 20.0, jitter_ms: float = 5.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 0.2, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0, drop_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._order_ids = itertools.count(1)
+        self._client_oids = set()
+        self.positions = {}  # (symbol, holdSide) -> size
+        self.plan_orders = {}  # symbol -> TP/SL aperti ({"orderId", "clientOid"})
+        self.orders = {}  # clientOid -> orderId degli ordini di ingresso
+        self.dropped = 0
+        self._streams = []
+        self.requests = Counter()
+        self.errors = 0
+        self.rate_limited = 0
+        self.duplicates = 0
+        self._server = None
+        self._thread = None
+
+    # --- ciclo di vita ---
+
+    def start(self) -> "BitgetSimulator":
+        simulator = self
+
+        class Handler(_Handler):
+            sim = simulator
+
+        self._server = _Server((self.host, self.port), Handler)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bitget-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # --- comportamento dell'exchange ---
+
+    def _sleep(self):
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def handle(self, path: str, payload: dict):
+        """
+        Restituisce (status HTTP, corpo JSON, header extra) per una richiesta firmata;
+        status None: richiesta eseguita ma connessione chiusa senza risposta.
+        """
+        self._sleep()
+        with self._lock:
+            self.requests[path.split("?", 1)[0]] += 1
+        if "?" in path:
+            return self._query(path)
+        if self._roll(self.rate_limit_rate):
+            with self._lock:
+                self.rate_limited += 1
+            return 429, {"code": "429", "msg": "Too Many Requests"}, {"Retry-After": str(self.retry_after)}
+        if self._roll(self.error_rate):
+            with self._lock:
+                self.errors += 1
+            return 400, {"code": "40762", "msg": "The order amount exceeds the balance"}, {}
+
+        handler = {
+            "/api/v2/mix/account/set-leverage": self._set_leverage,
+            "/api/v2/mix/order/place-order": self._place_order,
+            "/api/v2/mix/order/place-tpsl-order": self._place_tpsl_order,
+            "/api/v2/mix/order/place-pos-tpsl": self._place_pos_tpsl,
+            "/api/v2/mix/order/close-positions": self._close_positions,
+            "/api/v2/mix/order/cancel-plan-order": self._cancel_plan_order,
+        }.get(path)
+        if handler is None:
+            return 404, {"code": "40404", "msg": "Request URL NOT FOUND"}, {}
+        # Una richiesta senza risposta può essere stata eseguita o persa prima dell'exchange
+        if self._roll(self.drop_rate):
+            with self._lock:
+                self.dropped += 1
+            return None, handler(payload) if self._roll(0.5) else None, {}
+        body = handler(payload)
+        # Come Bitget: i rifiuti (clientOid duplicato, nessuna posizione...) arrivano con HTTP 400
+        return (200 if body["code"] == "00000" else 400), body, {}
+
+    def _query(self, path: str):
+        """GET firmate: posizioni aperte, dettaglio ordine per clientOid, TP/SL in attesa."""
+        route, _, query = path.partition("?")
+        params = dict(parse_qsl(query))
+        if route == "/api/v2/mix/position/all-position":
+            return 200, self._ok(self.position_list()), {}
+        if route == "/api/v2/mix/order/detail":
+            with self._lock:
+                order_id = self.orders.get(params.get("clientOid"))
+            if order_id is None:
+                return 400, {"code": "40109", "msg": "The data of the order cannot be found", "data": None}, {}
+            return 200, self._ok({"orderId": order_id, "clientOid": params["clientOid"],
+                                  "symbol": params.get("symbol"), "state": "filled"}), {}
+        if route == "/api/v2/mix/order/orders-plan-pending":
+            with self._lock:
+                pending = list(self.plan_orders.get(params.get("symbol"), []))
+            return 200, self._ok({"entrustedList": pending}), {}
+        return 404, {"code": "40404", "msg": "Request URL NOT FOUND"}, {}
+
+    def _ok(self, data) -> dict:
+        return {"code": "00000", "msg": "success", "requestTime": int(time.time() * 1000), "data": data}
+
+    def _new_order(self, payload: dict):
+        """orderId per un nuovo ordine, o None se il clientOid è già stato usato."""
+        client_oid = payload.get("clientOid")
+        with self._lock:
+            if client_oid:
+                if client_oid in self._client_oids:
+                    self.duplicates += 1
+                    return None
+                self._client_oids.add(client_oid)
+            return str(next(self._order_ids))
+
+    def _set_leverage(self, payload: dict) -> dict:
+        return self._ok({
+            "symbol": payload.get("symbol"),
+            "marginCoin": payload.get("marginCoin"),
+            "longLeverage": payload.get("leverage"),
+            "shortLeverage": payload.get("leverage"),
+            "marginMode": "isolated",
+        })
+
+    def _place_order(self, payload: dict) -> dict:
+        order_id = self._new_order(payload)
+        if order_id is None:
+            return {"code": "40786", "msg": "Duplicate clientOid", "data": None}
+        hold_side = "long" if payload.get("side") == "buy" else "short"
+        key = (payload.get("symbol"), hold_side)
+        with self._lock:
+            self.positions[key] = self.positions.get(key, 0.0) + float(payload.get("size") or 0)
+            if payload.get("clientOid"):
+                self.orders[payload["clientOid"]] = order_id
+        self._push_positions()
+        return self._ok({"orderId": order_id, "clientOid": payload.get("clientOid") or order_id})
+
+    def _place_pos_tpsl(self, payload: dict) -> dict:
+        data = []
+        for key in ("stopSurplus", "stopLoss"):
+            if not payload.get(f"{key}TriggerPrice"):
+                continue
+            client_oid = payload.get(f"{key}ClientOid")
+            order_id = self._new_order({"clientOid": client_oid})
+            if order_id is None:
+                return {"code": "40786", "msg": "Duplicate clientOid", "data": None}
+            data.append({"orderId": order_id, "clientOid": client_oid or order_id})
+            self._add_plan(payload.get("symbol"), order_id, client_oid)
+        return self._ok(data)
+
+    def _add_plan(self, symbol: str, order_id: str, client_oid: Optional[str]):
+        with self._lock:
+            self.plan_orders.setdefault(symbol, []).append({"orderId": order_id, "clientOid": client_oid or order_id})
+
+    def _place_tpsl_order(self, payload: dict) -> dict:
+        order_id = self._new_order(payload)
+        if order_id is None:
+            return {"code": "40786", "msg": "Duplicate clientOid", "data": None}
+        self._add_plan(payload.get("symbol"), order_id, payload.get("clientOid"))
+        return self._ok({"orderId": order_id, "clientOid": payload.get("clientOid") or order_id})
+
+    def _close_positions(self, payload: dict) -> dict:
+        symbol = payload.get("symbol")
+        with self._lock:
+            closed = [key for key in self.positions if key[0] == symbol]
+            for key in closed:
+                del self.positions[key]
+        if not closed:
+            return {"code": "22002", "msg": "No position to close", "data": None}
+        self._push_positions()
+        return self._ok({
+            "successList": [{"orderId": str(next(self._order_ids)), "symbol": symbol} for _ in closed],
+            "failureList": [],
+        })
+
+    def _cancel_plan_order(self, payload: dict) -> dict:
+        with self._lock:
+            cancelled = self.plan_orders.pop(payload.get("symbol"), [])
+        if not cancelled:
+            return {"code": "22001", "msg": "No order to cancel", "data": None}
+        return self._ok({"successList": cancelled,
+                         "failureList": []})
+
+    def unprotected_entries(self) -> list:
+        """clientOid degli ingressi eseguiti senza uno SL in attesa (clientOid "<...>-o" -> "<...>-sl")."""
+        with self._lock:
+            stops = {plan["clientOid"] for plans in self.plan_orders.values() for plan in plans}
+            return [oid for oid in self.orders if oid.endswith("-o") and oid[:-2] + "-sl" not in stops]
+
+    def position_list(self) -> list:
+        with self._lock:
+            return [{"symbol": symbol, "instId": symbol, "holdSide": side, "marginCoin": "USDT", "total": str(size)}
+                    for (symbol, side), size in self.positions.items()]
+
+    # --- stream privato delle posizioni ---
+
+    def stream_connect(self, url: str = "", timeout: float = 1.0) -> "_StreamStub":
+        """Stesso contratto di position_book.websocket_connect: send/recv/close."""
+        stream = _StreamStub(self, timeout)
+        with self._lock:
+            self._streams.append(stream)
+        return stream
+
+    def _push_positions(self):
+        with self._lock:
+            streams = [stream for stream in self._streams if stream.subscribed]
+        if streams:
+            message = json.dumps({"action": "snapshot", "arg": {"instType": "USDT-FUTURES", "channel": "positions",
+                                                                "instId": "default"}, "data": self.position_list()})
+            for stream in streams:
+                stream.inbox.put(message)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "open_positions": len(self.positions),
+            }
+
+
+class _StreamStub:
+    """WebSocket privato finto: risponde a login, subscribe e ping come Bitget."""
+
+    def __init__(self, sim: BitgetSimulator, timeout: float):
+        self.sim = sim
+        self.timeout = timeout
+        self.inbox = queue.Queue()
+        self.subscribed = False
+
+    def send(self, message: str):
+        if message == "ping":
+            self.inbox.put("pong")
+            return
+        data = json.loads(message)
+        if data.get("op") == "login":
+            self.inbox.put(json.dumps({"event": "login", "code": 0}))
+        elif data.get("op") == "subscribe":
+            self.subscribed = True
+            self.inbox.put(json.dumps({"event": "subscribe", "arg": data["args"][0]}))
+            self.sim._push_positions()
+
+    def recv(self) -> Optional[str]:
+        try:
+            return self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.sim._lock:
+            if self in self.sim._streams:
+                self.sim._streams.remove(self)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, come l'exchange reale
+    # Header e corpo in un'unica scrittura senza Nagle: evita i 40 ms del delayed ACK
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+    sim: BitgetSimulator = None
+
+    def _reply(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.startswith("/api/v2/public/time"):
+            self._reply(200, self.sim._ok({"serverTime": str(int(time.time() * 1000))}))
+        elif self.path.startswith("/api/v2/mix/market/contracts"):
+            self._reply(200, self.sim._ok(CONTRACTS))
+        elif self.path.startswith(("/api/v2/mix/position/", "/api/v2/mix/order/")):
+            if any(not self.headers.get(name) for name in SIGNED_HEADERS):
+                self._reply(401, {"code": "40037", "msg": "Apikey does not exist"})
+                return
+            status, body, headers = self.sim.handle(self.path, {})
+            self._reply(status, body, headers)
+        else:
+            self._reply(404, {"code": "40404", "msg": "Request URL NOT FOUND"})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if any(not self.headers.get(name) for name in SIGNED_HEADERS):
+            self._reply(401, {"code": "40037", "msg": "Apikey does not exist"})
+            return
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self._reply(400, {"code": "40017", "msg": "Parameter verification failed"})
+            return
+        status, body, headers = self.sim.handle(self.path, payload)
+        if status is None:
+            self.close_connection = True  # nessuna risposta: il client va in errore di rete
+            return
+        self._reply(status, body, headers)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="richieste eseguite senza risposta")
+    args = parser.parse_args()
+
+    simulator = BitgetSimulator(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                                args.retry_after, args.seed, args.host, args.port, args.drop_rate).start()
+    print(f"Simulatore Bitget in ascolto su {simulator.base_url} (Ctrl+C per terminare)")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(simulator.stats()))
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
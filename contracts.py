@@ -0,0 +1,280 @@
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, InvalidOperation
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTRACTS_PATH = "/api/v2/mix/market/contracts"
+CONTRACTS_CACHE_PATH = os.getenv("CONTRACTS_CACHE_PATH", "contracts_cache.json")
+CONTRACTS_REFRESH_SECONDS = float(os.getenv("CONTRACTS_REFRESH_SECONDS", 3600))
+# Senza metadati (exchange irraggiungibile e nessun file) gli ordini partono senza validazione locale
+CONTRACTS_REQUIRED = os.getenv("CONTRACTS_REQUIRED", "false").lower() == "true"
+
+
+class OrderValidationError(ValueError):
+    """Gamba non valida per le regole del contratto: scartata prima di chiamare Bitget."""
+
+
+def _decimal(value) -> Decimal:
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        raise OrderValidationError(f"Valore numerico non valido: {value!r}")
+
+
+def _format(value: Decimal) -> str:
+    # Nessuna notazione esponenziale nei payload (es. 1E+1 -> "10")
+    return format(value.normalize(), "f")
+
+
+@dataclass(frozen=True)
+class ContractSpec:
+    """Regole di un contratto Bitget: passo della size, tick del prezzo, quantità minima."""
+    symbol: str
+    size_step: Decimal
+    price_tick: Decimal
+    min_qty: Decimal
+
+    @classmethod
+    def from_bitget(cls, item: dict) -> "ContractSpec":
+        price_place = int(item.get("pricePlace") or 0)
+        price_end_step = _decimal(item.get("priceEndStep") or 1)
+        volume_place = int(item.get("volumePlace") or 0)
+        size_step = _decimal(item.get("sizeMultiplier") or Decimal(1).scaleb(-volume_place))
+        return cls(
+            symbol=item["symbol"],
+            size_step=size_step,
+            price_tick=price_end_step.scaleb(-price_place),
+            min_qty=_decimal(item.get("minTradeNum") or size_step),
+        )
+
+    def as_dict(self) -> dict:
+        return {"symbol": self.symbol, "size_step": str(self.size_step), "price_tick": str(self.price_tick),
+                "min_qty": str(self.min_qty)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ContractSpec":
+        return cls(data["symbol"], Decimal(data["size_step"]), Decimal(data["price_tick"]), Decimal(data["min_qty"]))
+
+    def round_size(self, size) -> Decimal:
+        """Size arrotondata per difetto al passo del contratto (mai oltre la quantità richiesta)."""
+        size = _decimal(size)
+        return (size / self.size_step).to_integral_value(ROUND_DOWN) * self.size_step
+
+    def round_price(self, price) -> Decimal:
+        price = _decimal(price)
+        return (price / self.price_tick).to_integral_value(ROUND_HALF_UP) * self.price_tick
+
+    def check_size(self, size: Decimal, leg: str = "order"):
+        if size < self.min_qty:
+            raise OrderValidationError(
+                f"{self.symbol}: size {_format(size)} della gamba {leg} sotto il minimo {_format(self.min_qty)}")
+
+    def check_price(self, price: Decimal, leg: str):
+        if price <= 0:
+            raise OrderValidationError(f"{self.symbol}: prezzo non valido per la gamba {leg}")
+
+
+def split_quantity(total: Decimal, step: Decimal, percentages: Sequence[Tuple[str, float]]) -> Dict[str, Decimal]:
+    """
+    Ripartisce `total` (multiplo di `step`) secondo le percentuali con il metodo dei resti maggiori:
+    ogni quota è un multiplo di step e la somma coincide esattamente con total.
+    """
+    units = int((total / step).to_integral_value(ROUND_DOWN))
+    weight = sum(Decimal(str(pct)) for _, pct in percentages)
+    if weight <= 0:
+        raise OrderValidationError("Percentuali dei TP non valide")
+    exact = [(name, Decimal(units) * Decimal(str(pct)) / weight) for name, pct in percentages]
+    shares = {name: int(value.to_integral_value(ROUND_DOWN)) for name, value in exact}
+    remaining = units - sum(shares.values())
+    # A parità di resto vince il TP che viene prima (ordine di `percentages`)
+    by_remainder = sorted(exact, key=lambda item: item[1] - int(item[1].to_integral_value(ROUND_DOWN)),
+                          reverse=True)
+    for name, _ in by_remainder[:remaining]:
+        shares[name] += 1
+    return {name: shares[name] * step for name, _ in percentages}
+
+
+def default_spec(symbol: str, size) -> ContractSpec:
+    """Regole minime quando i metadati non sono disponibili: passo pari ai decimali della size ricevuta."""
+    exponent = _decimal(size).normalize().as_tuple().exponent
+    step = Decimal(1).scaleb(min(0, exponent))
+    return ContractSpec(symbol, step, Decimal(0), step)
+
+
+class ContractCache:
+    """
+    Metadati dei contratti USDT-FUTURES letti dall'endpoint pubblico /contracts.
+    Il file su disco rende immediato un avvio a freddo; un thread in background
+    ricarica i dati ogni CONTRACTS_REFRESH_SECONDS senza bloccare gli ordini.
+    """
+
+    def __init__(self, http, product_type: str = "USDT-FUTURES", path: Optional[str] = CONTRACTS_CACHE_PATH,
+                 refresh_seconds: float = CONTRACTS_REFRESH_SECONDS):
+        self.http = http
+        self.product_type = product_type
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self._specs: Dict[str, ContractSpec] = {}
+        self.loaded_at = 0.0  # time.time() dell'ultimo caricamento dall'exchange (anche via file)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.load_file()
+
+    # --- lettura ---
+
+    def get(self, symbol: str) -> Optional[ContractSpec]:
+        return self._specs.get(symbol)
+
+    def __len__(self):
+        return len(self._specs)
+
+    def spec_for(self, symbol: str, size) -> ContractSpec:
+        """Regole del symbol; solleva OrderValidationError se il contratto non esiste su Bitget."""
+        spec = self._specs.get(symbol)
+        if spec is not None:
+            return spec
+        if self._specs:
+            raise OrderValidationError(f"Contratto {symbol} non negoziabile su Bitget ({self.product_type})")
+        if CONTRACTS_REQUIRED:
+            raise OrderValidationError("Metadati dei contratti non disponibili")
+        return default_spec(symbol, size)
+
+    # --- caricamento ---
+
+    def load_file(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            specs = {item["symbol"]: ContractSpec.from_dict(item) for item in data["contracts"]}
+        except (OSError, ValueError, KeyError, InvalidOperation) as e:
+            logger.warning("⚠️ Cache dei contratti su disco non leggibile (%s): %s", self.path, e)
+            return False
+        with self._lock:
+            self._specs = specs
+            self.loaded_at = float(data.get("loaded_at", 0))
+        return True
+
+    def _save_file(self, specs: Dict[str, ContractSpec], loaded_at: float):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"loaded_at": loaded_at, "product_type": self.product_type,
+                           "contracts": [spec.as_dict() for spec in specs.values()]}, f)
+            os.replace(tmp, self.path)  # i lettori non vedono mai un file scritto a metà
+        except OSError as e:
+            logger.warning("⚠️ Impossibile salvare la cache dei contratti su %s: %s", self.path, e)
+
+    def refresh(self, timeout: float = 10) -> bool:
+        """Ricarica i contratti da Bitget; in caso di errore restano i dati precedenti."""
+        try:
+            response = self.http.get(f"{self.http.base_url}{CONTRACTS_PATH}",
+                                     params={"productType": self.product_type}, timeout=timeout)
+            response.raise_for_status()
+            body = response.json()
+            if body.get("code") != "00000":
+                raise ValueError(f"code={body.get('code')} msg={body.get('msg')}")
+            specs = {}
+            for item in body.get("data") or []:
+                spec = ContractSpec.from_bitget(item)
+                specs[spec.symbol] = spec
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning("⚠️ Aggiornamento dei contratti Bitget non riuscito: %s", e)
+            return False
+        loaded_at = time.time()
+        with self._lock:
+            self._specs = specs
+            self.loaded_at = loaded_at
+            self.refreshes += 1
+        self._save_file(specs, loaded_at)
+        logger.info("✅ Contratti Bitget aggiornati: %s symbol", len(specs))
+        return True
+
+    def stale(self) -> bool:
+        return time.time() - self.loaded_at >= self.refresh_seconds
+
+    def start(self):
+        """Avvia il thread di aggiornamento (idempotente): ricarica subito se i dati sono vecchi."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="contracts-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.stale():
+                self.refresh()
+            # Dopo un errore si riprova entro un minuto, non al prossimo intervallo
+            wait = 60.0 if self.stale() else self.refresh_seconds - (time.time() - self.loaded_at)
+            self._stop.wait(max(1.0, wait))
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._specs),
+            "age_seconds": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+@dataclass
+class PositionPlan:
+    """Gambe di una posizione arrotondate e validate localmente, pronte per execute_position."""
+    symbol: str
+    side: str
+    trade_side: str
+    size: str
+    stop_loss: str
+    take_profits: Dict[str, Tuple[str, str]]  # "tp1" -> (size, prezzo)
+
+
+def plan_position(spec: ContractSpec, side: str, trade_side: str, size, stop_loss,
+                  take_profits: List[Tuple[str, float, float]]) -> PositionPlan:
+    """
+    Arrotonda size e prezzi alle regole del contratto, ripartisce la size tra i TP
+    (`take_profits`: nome, prezzo, percentuale) in modo esatto e verifica i minimi.
+    Un TP con quota sotto il minimo (es. 0%) non viene inviato: la sua quota passa al TP
+    successivo, o all'ultimo TP inviato, e l'ingresso parte comunque.
+    Solleva OrderValidationError senza alcuna chiamata all'exchange.
+    """
+    total = spec.round_size(abs(_decimal(size)))
+    spec.check_size(total)
+    sl_price = spec.round_price(stop_loss) if spec.price_tick else _decimal(stop_loss)
+    spec.check_price(sl_price, "stopLoss")
+
+    shares = split_quantity(total, spec.size_step, [(name, pct) for name, _, pct in take_profits])
+    sizes, carry = {}, Decimal(0)
+    for name, _, _ in take_profits:
+        carry += shares[name]
+        if carry >= spec.min_qty and carry > 0:
+            sizes[name], carry = carry, Decimal(0)
+    if carry > 0:
+        # Resto finale sotto il minimo: si somma all'ultimo TP inviato (o diventa l'unico TP)
+        name = list(sizes)[-1] if sizes else take_profits[-1][0]
+        sizes[name] = sizes.get(name, Decimal(0)) + carry
+    legs = {}
+    for name, price, _ in take_profits:
+        if name not in sizes:
+            continue
+        tp_price = spec.round_price(price) if spec.price_tick else _decimal(price)
+        spec.check_price(tp_price, name)
+        legs[name] = (_format(sizes[name]), _format(tp_price))
+    return PositionPlan(spec.symbol, side, trade_side, _format(total), _format(sl_price), legs)
@@ -1,75 +1,124 @@
 import os
+import logging
 import json
-import mysql.connector
-from mysql.connector import pooling, Error
-from contextlib import contextmanager
-from dotenv import load_dotenv
 from typing import Optional, Any
+import threading
+from datetime import datetime
+from db_writer import BatchWriter
+from storage import StorageBackend, get_backend
+from api_log import compact_row, decode
+from metrics import measured, DB_SECONDS, DB_ERRORS
+from signal_dedup import DuplicateSignal
 
-load_dotenv()
-
-
-class Database:
-    """Gestisce un pool di connessioni MySQL in modo centralizzato."""
-
-    def __init__(self):
-        self.config = {
-            "host": os.getenv("DB_HOST"),
-            "port": int(os.getenv("DB_PORT", 3306)),
-            "user": os.getenv("DB_USER"),
-            "password": os.getenv("DB_PASSWORD"),
-            "database": os.getenv("DB_NAME"),
-            "ssl_disabled": os.getenv("DB_SSL_DISABLED", "False").lower() == "true"
-        }
-
-        # 🔹 Creazione del pool di connessioni
-        self.pool = pooling.MySQLConnectionPool(
-            pool_name="mypool",
-            pool_size=10,
-            **self.config
-        )
-
-    @contextmanager
-    def get_connection(self):
-        """Restituisce una connessione dal pool e la chiude automaticamente."""
-        conn = None
-        try:
-            conn = self.pool.get_connection()
-            yield conn
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
-
+logger = logging.getLogger(__name__)
 
-db = Database()  # Istanziamo l'oggetto Globale Database
+BATCH_WRITES = os.getenv("DB_BATCH_WRITES", "true").lower() == "true"
 
 
 class RequestLogDAO:
     """DAO per la tabella request_log (richieste ricevute dal server)."""
 
-    def insert(self, request_text: Any, response_text: Any, signal_id: Optional[int] = None) -> int:
-        query = """
-            INSERT INTO request_log (request, response, signal_id)
-            VALUES (%s, %s, %s)
-        """
+    # L'indice univoco su fingerprint rende idempotente l'inserimento di un alert già registrato
+    # (es. da un altro worker): il duplicato non interrompe il batch e non inserisce righe (rowcount 0)
+    INSERT_QUERIES = {
+        "mysql": """
+            INSERT IGNORE INTO request_log (request, response, signal_id, fingerprint, ticker)
+            VALUES (%s, %s, %s, %s, %s)
+        """,
+        "sqlite": """
+            INSERT OR IGNORE INTO request_log (request, response, signal_id, fingerprint, ticker)
+            VALUES (%s, %s, %s, %s, %s)
+        """,
+    }
+
+    UPDATE_RESPONSE_BY_SIGNAL_QUERY = "UPDATE request_log SET response = %s WHERE signal_id = %s"
+    UPDATE_TRACE_BY_SIGNAL_QUERY = "UPDATE request_log SET trace = %s WHERE signal_id = %s"
+
+    RECENT_FINGERPRINTS_QUERIES = {
+        "mysql": """
+            SELECT fingerprint, signal_id, TIMESTAMPDIFF(SECOND, request_time, NOW()) AS age_seconds
+            FROM request_log
+            WHERE fingerprint IS NOT NULL
+              AND request_time >= NOW() - INTERVAL %s SECOND
+        """,
+        "sqlite": """
+            SELECT fingerprint, signal_id,
+                   (julianday('now', 'localtime') - julianday(request_time)) * 86400 AS age_seconds
+            FROM request_log
+            WHERE fingerprint IS NOT NULL
+              AND request_time >= datetime('now', 'localtime', '-' || %s || ' seconds')
+        """,
+    }
+
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self._backend = backend
+
+    @property
+    def backend(self) -> StorageBackend:
+        # Risolto al primo uso: costruire il DAO non apre connessioni
+        return self._backend or get_backend()
+
+    @staticmethod
+    def insert_params(request_text: Any, response_text: Any, signal_id: Optional[int] = None,
+                      fingerprint: Optional[str] = None, ticker: Optional[str] = None) -> tuple:
+        request_json = json.dumps(request_text) if isinstance(request_text, dict) else request_text
+        response_json = json.dumps(response_text) if isinstance(response_text, dict) else response_text
+        return request_json, response_json, signal_id, fingerprint, ticker
+
+    @staticmethod
+    def claim_key(params: tuple) -> Optional[str]:
+        """signal_id di una riga con impronta (parametri di insert_params): il primo INSERT vince."""
+        _, _, signal_id, fingerprint, _ = params
+        return signal_id if fingerprint else None
+
+    @staticmethod
+    def update_key(params: tuple) -> Any:
+        """signal_id di un UPDATE per signal_id (parametri di update_response_params/update_trace_params)."""
+        return params[-1]
 
-        with db.get_connection() as conn:
+    @staticmethod
+    def update_response_params(signal_id: Any, new_value: Any) -> tuple:
+        val = json.dumps(new_value) if isinstance(new_value, dict) else new_value
+        return val, signal_id
+
+    @staticmethod
+    def update_trace_params(signal_id: Any, trace: Any) -> tuple:
+        return json.dumps(trace) if isinstance(trace, dict) else trace, signal_id
+
+    def insert(self, request_text: Any, response_text: Any, signal_id: Optional[int] = None,
+               fingerprint: Optional[str] = None, ticker: Optional[str] = None) -> Optional[int]:
+        """id della riga inserita, None se l'INSERT è stato ignorato (riga già presente)."""
+        with self.backend.get_connection() as conn:
             cursor = conn.cursor()
-            request_json = json.dumps(request_text) if isinstance(request_text, dict) else request_text
-            response_json = json.dumps(response_text) if isinstance(response_text, dict) else response_text
-            cursor.execute(query, (request_json, response_json, signal_id))
+            cursor.execute(self.INSERT_QUERIES[self.backend.dialect],
+                           self.insert_params(request_text, response_text, signal_id, fingerprint, ticker))
             conn.commit()
-            return cursor.lastrowid
+            # Con un INSERT ignorato SQLite lascia in lastrowid l'id dell'inserimento precedente
+            return cursor.lastrowid if cursor.rowcount > 0 else None
 
     def update_field(self, id_request: int, field_name: str, new_value: Any) -> int:
         query = f"UPDATE request_log SET {field_name} = %s WHERE id_request = %s"
-        with db.get_connection() as conn:
+        with self.backend.get_connection() as conn:
             cursor = conn.cursor()
             val = json.dumps(new_value) if isinstance(new_value, dict) else new_value
             cursor.execute(query, (val, id_request))
             conn.commit()
             return cursor.rowcount
 
+    def update_response(self, signal_id: str, new_value: Any) -> int:
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.UPDATE_RESPONSE_BY_SIGNAL_QUERY, self.update_response_params(signal_id, new_value))
+            conn.commit()
+            return cursor.rowcount
+
+    def update_trace(self, signal_id: str, trace: Any) -> int:
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.UPDATE_TRACE_BY_SIGNAL_QUERY, self.update_trace_params(signal_id, trace))
+            conn.commit()
+            return cursor.rowcount
+
     def get_last_signal(self):
         """Restituisce l'ultimo signal_id e request_time dal DB."""
         query = """
@@ -78,114 +127,339 @@ class RequestLogDAO:
             ORDER BY id_request DESC 
             LIMIT 1
         """
-        with db.get_connection() as conn:
+        with self.backend.get_connection() as conn:
             cursor = conn.cursor(dictionary=True)
             cursor.execute(query)
             result = cursor.fetchone()
             return result
 
+    def get_by_signal_id(self, signal_id: str):
+        """Restituisce il record request_log associato al signal_id (il più recente)."""
+        query = """
+            SELECT id_request, signal_id, ticker, request_time, response
+            FROM request_log
+            WHERE signal_id = %s
+            ORDER BY id_request DESC
+            LIMIT 1
+        """
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, (signal_id,))
+            return cursor.fetchone()
+
+    def find_with_calls(self, ticker: Optional[str] = None, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, before_id: Optional[int] = None, limit: int = 50):
+        """
+        Segnali più recenti (paginazione keyset su id_request decrescente) con le chiamate API
+        collegate: una riga per chiamata, i segnali senza chiamate compaiono una volta.
+        Il filtro per ticker usa (ticker, id_request), l'intervallo di tempo (request_time).
+        """
+        conditions, params = [], []
+        if ticker:
+            conditions.append("ticker = %s")
+            params.append(ticker)
+        if since:
+            conditions.append("request_time >= %s")
+            params.append(since)
+        if until:
+            conditions.append("request_time < %s")
+            params.append(until)
+        if before_id:
+            conditions.append("id_request < %s")
+            params.append(before_id)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        query = f"""
+            SELECT r.id_request, r.signal_id, r.ticker, r.request_time, r.response,
+                   a.id AS api_id, a.endpoint, a.response_code, a.response_msg, a.order_id,
+                   a.latency_ms, a.queue_delay_ms
+            FROM (
+                SELECT id_request, signal_id, ticker, request_time, response
+                FROM request_log
+                {where}
+                ORDER BY id_request DESC
+                LIMIT %s
+            ) r
+            LEFT JOIN api_requests a ON a.signal_id = r.signal_id
+            ORDER BY r.id_request DESC, a.id
+        """
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, (*params, limit))
+            return cursor.fetchall()
+
+    def get_recent_fingerprints(self, max_age_seconds: float):
+        """Impronte degli alert ricevuti negli ultimi max_age_seconds (con la loro età in secondi)."""
+        query = self.RECENT_FINGERPRINTS_QUERIES[self.backend.dialect]
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, (int(max_age_seconds),))
+            return cursor.fetchall()
+
 
 class ApiRequestDAO:
     """DAO per la tabella api_requests (chiamate fatte dal server verso Bitget)."""
 
-    def insert(self, request_text: Any, response_text: Any, signal_id: Optional[int] = None) -> int:
-        # ✅ Normalizza input: assicuriamoci che siano stringhe
-        if isinstance(request_text, (dict, list)):
-            req = request_text
-        else:
-            try:
-                req = json.loads(request_text)
-            except (TypeError, json.JSONDecodeError):
-                req = {}
+    # Formato compatto (migrations/004): colonne indicizzate + record unico in data;
+    # account dell'exchange su cui è stata fatta la chiamata (migrations/006)
+    INSERT_QUERY = """
+        INSERT INTO api_requests (
+            endpoint, response_status, response_code, response_msg,
+            order_id, latency_ms, queue_delay_ms, signal_id, account, data, compressed
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
 
-        if isinstance(response_text, (dict, list)):
-            res = response_text
-        else:
-            try:
-                res = json.loads(response_text)
-            except (TypeError, json.JSONDecodeError):
-                res = {}
-
-        # 🔧 Estrai i campi previsti, con default stringa vuota
-        values = (
-            req.get("endpoint", ""),
-            json.dumps(req.get("body", ""), ensure_ascii=False),
-            json.dumps(req.get("headers", ""), ensure_ascii=False),
-            json.dumps(req.get("payload", ""), ensure_ascii=False),
-            res.get("response_status", ""),
-            json.dumps(res.get("response_body", ""), ensure_ascii=False),
-            json.dumps(res.get("response_json", ""), ensure_ascii=False),
-            json.dumps(res.get("response_data", ""), ensure_ascii=False),
-            res.get("response_code", ""),
-            res.get("response_msg", ""),
-            signal_id
-        )
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self._backend = backend
 
-        query = """
-            INSERT INTO api_requests (
-                endpoint, body, headers, payload,
-                response_status, response_body, response_json,
-                response_data, response_code, response_msg,
-                signal_id
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
+    @property
+    def backend(self) -> StorageBackend:
+        # Risolto al primo uso: costruire il DAO non apre connessioni
+        return self._backend or get_backend()
+
+    @staticmethod
+    def insert_params(request_log: Any, response_log: Any, signal_id: Optional[str] = None) -> tuple:
+        return compact_row(request_log, response_log, signal_id)
 
-        with db.get_connection() as conn:
+    def insert(self, request_log: Any, response_log: Any, signal_id: Optional[str] = None) -> int:
+        with self.backend.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(query, values)
+            cursor.execute(self.INSERT_QUERY, self.insert_params(request_log, response_log, signal_id))
             conn.commit()
             return cursor.lastrowid
 
+    def get_by_signal_id(self, signal_id: str):
+        """Chiamate API del segnale in ordine di invio (indice su signal_id)."""
+        query = """
+            SELECT id, request_time, endpoint, response_status, response_code, response_msg,
+                   order_id, latency_ms, queue_delay_ms, account, data, compressed
+            FROM api_requests
+            WHERE signal_id = %s
+            ORDER BY id
+        """
+        with self.backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, (signal_id,))
+            return cursor.fetchall()
+
+
+_writer: Optional[BatchWriter] = None
+_writer_lock = threading.Lock()
+
+
+def create_writer(backend: StorageBackend) -> BatchWriter:
+    return BatchWriter(backend, {
+        # Prima gli INSERT, poi gli UPDATE che si riferiscono a righe dello stesso batch
+        "request_log": (RequestLogDAO.INSERT_QUERIES[backend.dialect], RequestLogDAO.insert_params),
+        "api_requests": (ApiRequestDAO.INSERT_QUERY, ApiRequestDAO.insert_params),
+        "request_log_response": (RequestLogDAO.UPDATE_RESPONSE_BY_SIGNAL_QUERY,
+                                 RequestLogDAO.update_response_params),
+        "request_log_trace": (RequestLogDAO.UPDATE_TRACE_BY_SIGNAL_QUERY,
+                              RequestLogDAO.update_trace_params),
+    },
+        # Un alert già registrato da un altro worker non sovrascrive risposta e traccia dell'originale
+        claims={"request_log": RequestLogDAO.claim_key},
+        claimed={"request_log_response": RequestLogDAO.update_key,
+                 "request_log_trace": RequestLogDAO.update_key})
+
+
+def get_writer() -> BatchWriter:
+    """Restituisce lo scrittore in background condiviso da tutte le istanze di DatabaseService."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = create_writer(get_backend())
+    return _writer
+
+
 
 class DatabaseService:
     """Gestisce in modo centralizzato l’inserimento e aggiornamento nei DAO."""
 
-    def __init__(self):
-        self.request_log_dao = RequestLogDAO()
-        self.api_request_dao = ApiRequestDAO()
+    def __init__(self, batch_writes: Optional[bool] = None, backend: Optional[StorageBackend] = None):
+        self.request_log_dao = RequestLogDAO(backend)
+        self.api_request_dao = ApiRequestDAO(backend)
+        if batch_writes is None:
+            batch_writes = BATCH_WRITES
+        # Con batch_writes le scritture di log vengono accodate e scritte in background
+        if not batch_writes:
+            self.writer = None
+        else:
+            self.writer = create_writer(backend) if backend is not None else get_writer()
+        # Ultimo segnale ricevuto da questo processo: /ping risponde senza interrogare il DB
+        self._last_signal: Optional[dict] = None
+
+    @property
+    def backend(self) -> StorageBackend:
+        return self.request_log_dao.backend
 
-    def log_incoming_request(self, request_text, response_text, signal_id=None):
+    @measured(DB_SECONDS, "db.log_incoming_request", operation="log_incoming_request")
+    def log_incoming_request(self, request_text, response_text, signal_id=None, fingerprint=None, ticker=None):
+        """
+        Inserisce la richiesta ricevuta e restituisce il suo id.
+        Una richiesta con impronta viene inserita subito anche in modalità batch: l'INSERT IGNORE
+        sull'indice univoco è la prenotazione dell'alert tra i worker, e se la riga esiste già
+        (altro worker) solleva DuplicateSignal prima che l'ordine parta. Senza impronta, in
+        modalità batch, l'INSERT viene accodato e restituisce None (l'id non è ancora noto).
+        """
+        # Assegnazione di un nuovo dizionario: i lettori vedono sempre uno snapshot completo
+        self._last_signal = {"signal_id": signal_id, "request_time": datetime.now()}
+        if self.writer and not fingerprint:
+            self.writer.submit("request_log", request_text, response_text, signal_id, fingerprint, ticker)
+            return None
         try:
-            inserted_id = self.request_log_dao.insert(request_text, response_text, signal_id)
-            print(f"✅ Inserita richiesta in request_log (id={inserted_id}, signal_id={signal_id})")
-            return inserted_id
-        except Error as e:
-            print(f"❌ Errore DB durante l’inserimento in request_log: {e}")
+            inserted_id = self.request_log_dao.insert(request_text, response_text, signal_id, fingerprint, ticker)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="log_incoming_request")
+            if self.writer:
+                # DB non raggiungibile: la riga passa al BatchWriter, che la ritenta (o la riversa su file)
+                # e scarta risposta e traccia se al momento della scrittura l'impronta risulta già presente
+                logger.warning("⚠️ Prenotazione dell'impronta non riuscita, INSERT accodato: %s", e)
+                self.writer.submit("request_log", request_text, response_text, signal_id, fingerprint, ticker)
+            else:
+                logger.error("❌ Errore DB durante l’inserimento in request_log: %s", e)
             return None
+        if inserted_id is None and fingerprint:
+            raise DuplicateSignal(signal_id)
+        logger.debug("✅ Inserita richiesta in request_log (id=%s, signal_id=%s)", inserted_id, signal_id)
+        return inserted_id
 
-    def update_request_response(self, id_request: int, response_data: Any):
-        """Aggiorna la colonna 'response' nella tabella request_log per la richiesta specificata."""
+    @measured(DB_SECONDS, "db.update_request_response", operation="update_request_response")
+    def update_request_response(self, id_request: Optional[int], response_data: Any, signal_id=None):
+        """
+        Aggiorna la colonna 'response' nella tabella request_log per la richiesta specificata.
+        In modalità batch (o se id_request non è noto) la riga viene individuata tramite signal_id.
+        """
+        if self.writer and signal_id is not None:
+            self.writer.submit("request_log_response", signal_id, response_data)
+            return None
         try:
-            updated = self.request_log_dao.update_field(id_request, "response", response_data)
-            print(f"✅ Aggiornata response per request_log id={id_request} ({updated} record modificato)")
+            if id_request is None:
+                updated = self.request_log_dao.update_response(signal_id, response_data)
+            else:
+                updated = self.request_log_dao.update_field(id_request, "response", response_data)
+            logger.debug("✅ Aggiornata response per request_log id=%s signal_id=%s (%s record modificato)",
+                         id_request, signal_id, updated)
             return updated
-        except Error as e:
-            print(f"❌ Errore DB durante update_request_response: {e}")
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="update_request_response")
+            logger.error("❌ Errore DB durante update_request_response: %s", e)
             return None
 
-    def log_outgoing_api(self, request_text, response_text, signal_id=None):
-        if isinstance(request_text, (dict, list)):
-            request_text = json.dumps(request_text, ensure_ascii=False)
-
-        if isinstance(response_text, (dict, list)):
-            response_text = json.dumps(response_text, ensure_ascii=False)
+    @measured(DB_SECONDS, "db.update_request_trace", operation="update_request_trace")
+    def update_request_trace(self, signal_id: str, trace: Any):
+        """Salva la traccia (span con tempi) del segnale nella colonna 'trace' di request_log."""
+        if self.writer:
+            self.writer.submit("request_log_trace", signal_id, trace)
+            return None
+        try:
+            return self.request_log_dao.update_trace(signal_id, trace)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="update_request_trace")
+            logger.error("❌ Errore DB durante update_request_trace: %s", e)
+            return None
 
+    @measured(DB_SECONDS, "db.log_outgoing_api", operation="log_outgoing_api")
+    def log_outgoing_api(self, request_text, response_text, signal_id=None):
+        if self.writer:
+            # La serializzazione avviene nel thread di scrittura, fuori dal percorso dell'ordine
+            self.writer.submit("api_requests", request_text, response_text, signal_id)
+            return None
         try:
             inserted_id = self.api_request_dao.insert(request_text, response_text, signal_id)
-            print(f"✅ Inserita richiesta API (id={inserted_id}, signal_id={signal_id})")
+            logger.debug("✅ Inserita richiesta API (id=%s, signal_id=%s)", inserted_id, signal_id)
             return inserted_id
-        except Error as e:
-            print(f"❌ Errore DB durante l’inserimento in api_requests: {e}")
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="log_outgoing_api")
+            logger.error("❌ Errore DB durante l’inserimento in api_requests: %s", e)
             return None
 
+    def last_signal(self) -> Optional[dict]:
+        """Ultimo segnale ricevuto (signal_id, request_time) dalla memoria, senza accesso al DB."""
+        return self._last_signal
+
+    def load_last_signal(self) -> Optional[dict]:
+        """All'avvio inizializza lo snapshot con l'ultimo segnale salvato (se non ne è già arrivato uno)."""
+        result = self.get_last_request_info()
+        if result and self._last_signal is None:
+            self._last_signal = {"signal_id": result["signal_id"], "request_time": result["request_time"]}
+        return self._last_signal
+
+    @measured(DB_SECONDS, "db.get_last_request_info", operation="get_last_request_info")
     def get_last_request_info(self):
         """Restituisce l'ultimo signal_id e orario di richiesta dal DB."""
         try:
             result = self.request_log_dao.get_last_signal()
             if not result:
-                print("ℹ️ Nessun record trovato in request_log")
+                logger.info("ℹ️ Nessun record trovato in request_log")
                 return None
             return result
-        except Error as e:
-            print(f"❌ Errore durante get_last_request_info: {e}")
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="get_last_request_info")
+            logger.error("❌ Errore durante get_last_request_info: %s", e)
+            return None
+
+    @measured(DB_SECONDS, "db.get_request_by_signal", operation="get_request_by_signal")
+    def get_request_by_signal(self, signal_id: str):
+        """Restituisce il record request_log del segnale, o None se non presente."""
+        try:
+            return self.request_log_dao.get_by_signal_id(signal_id)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="get_request_by_signal")
+            logger.error("❌ Errore durante get_request_by_signal: %s", e)
             return None
+
+    @measured(DB_SECONDS, "db.find_signals", operation="find_signals")
+    def find_signals(self, ticker: Optional[str] = None, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, before_id: Optional[int] = None, limit: int = 50):
+        """
+        Pagina di segnali (dal più recente) con le chiamate API collegate.
+        Restituisce (segnali, cursore per la pagina successiva o None); None in caso di errore DB.
+        """
+        try:
+            rows = self.request_log_dao.find_with_calls(ticker, since, until, before_id, limit)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="find_signals")
+            logger.error("❌ Errore durante find_signals: %s", e)
+            return None
+        signals = {}
+        for row in rows:
+            signal = signals.get(row["id_request"])
+            if signal is None:
+                signal = signals[row["id_request"]] = {
+                    "id_request": row["id_request"],
+                    "signal_id": row["signal_id"],
+                    "ticker": row["ticker"],
+                    "request_time": row["request_time"],
+                    "response": row["response"],
+                    "calls": [],
+                }
+            if row["api_id"] is not None:
+                signal["calls"].append({key: row[key] for key in (
+                    "endpoint", "response_code", "response_msg", "order_id", "latency_ms", "queue_delay_ms")})
+        page = list(signals.values())
+        next_before = page[-1]["id_request"] if len(page) == limit else None
+        return page, next_before
+
+    @measured(DB_SECONDS, "db.get_api_calls", operation="get_api_calls")
+    def get_api_calls(self, signal_id: str):
+        """Chiamate API del segnale con il record compatto decodificato (payload e risposta)."""
+        try:
+            rows = self.api_request_dao.get_by_signal_id(signal_id)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="get_api_calls")
+            logger.error("❌ Errore durante get_api_calls: %s", e)
+            return None
+        for row in rows:
+            row["data"] = decode(row["data"], row.pop("compressed"))
+        return rows
+
+    @measured(DB_SECONDS, "db.get_recent_fingerprints", operation="get_recent_fingerprints")
+    def get_recent_fingerprints(self, max_age_seconds: float):
+        """Impronte recenti da request_log per ripopolare la cache di deduplicazione."""
+        try:
+            return self.request_log_dao.get_recent_fingerprints(max_age_seconds)
+        except self.backend.errors as e:
+            DB_ERRORS.inc(operation="get_recent_fingerprints")
+            logger.error("❌ Errore durante get_recent_fingerprints: %s", e)
+            return []
@@ -0,0 +1,220 @@
+import os
+import logging
+import json
+import base64
+import time
+import queue
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 50))
+FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", 0.5))
+SPILL_PATH = os.getenv("DB_SPILL_PATH", "db_spill.jsonl")
+LOST_CLAIMS_MAX = 10000  # chiavi di INSERT ignorati ricordate per scartarne gli UPDATE
+
+
+def _spill_value(value: Any) -> Any:
+    # I record compressi di api_requests sono bytes: nel file JSON vanno in base64
+    if isinstance(value, (bytes, bytearray)):
+        return {"$b64": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def _replay_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$b64" in value:
+        return base64.b64decode(value["$b64"])
+    return value
+
+
+class BatchWriter:
+    """
+    Scrittore in background per le tabelle di log.
+    Le righe vengono accodate senza toccare il DB e scritte da un thread dedicato
+    con INSERT multi-riga (executemany) e un solo commit per batch.
+    Il flush avviene al raggiungimento di batch_size righe o dopo flush_interval secondi,
+    e sempre allo shutdown. Se il database non è raggiungibile le righe vengono salvate
+    su file (spill) e reinserite al primo flush riuscito.
+    Gli INSERT dei kind in `claims` vengono eseguiti uno per riga: se uno viene ignorato
+    (riga già scritta da un altro processo) le righe dei kind in `claimed` con la stessa
+    chiave vengono scartate invece di modificare la riga altrui.
+    """
+
+    def __init__(self, database, statements: Dict[str, Tuple[str, Callable[..., tuple]]],
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 spill_path: Optional[str] = SPILL_PATH,
+                 claims: Optional[Dict[str, Callable[[tuple], Any]]] = None,
+                 claimed: Optional[Dict[str, Callable[[tuple], Any]]] = None):
+        self.database = database
+        # kind -> (query, funzione che costruisce i parametri); l'ordine definisce l'ordine di scrittura
+        self.statements = statements
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        # kind -> chiave della riga costruita (None: riga senza esclusività)
+        self.claims = claims or {}
+        self.claimed = claimed or {}
+        self._lost: "OrderedDict[Any, None]" = OrderedDict()
+
+        self.queue: "queue.Queue[Optional[Tuple[str, tuple]]]" = queue.Queue()
+        self.stats = {"rows": 0, "batches": 0, "commits": 0, "spilled": 0, "replayed": 0, "lost_claims": 0}
+        self._flush_lock = threading.Lock()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, kind: str, *args: Any):
+        """Accoda una riga; i parametri SQL vengono costruiti nel thread di scrittura."""
+        if kind not in self.statements:
+            raise ValueError(f"Tipo di scrittura sconosciuto: {kind}")
+        if self._closed:
+            # Dopo lo shutdown scriviamo in modo sincrono per non perdere la riga
+            self._write([(kind, args)])
+            return
+        with self._pending_cond:
+            self._pending += 1
+        self.queue.put((kind, args))
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                self._write(self._drain(batch))
+                return
+            batch.append(item)
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(self._drain(batch))
+                    return
+                batch.append(item)
+
+            self._write(batch)
+
+    def _drain(self, batch: List) -> List:
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if item is not None:
+                batch.append(item)
+
+    def _build(self, batch) -> Dict[str, List[tuple]]:
+        grouped: Dict[str, List[tuple]] = {kind: [] for kind in self.statements}
+        for kind, args in batch:
+            try:
+                _, build = self.statements[kind]
+                grouped[kind].append(tuple(build(*args)))
+            except Exception as e:
+                logger.error("❌ Riga di log scartata (%s): %s", kind, e)
+        return grouped
+
+    def _errors(self) -> tuple:
+        # Eccezioni del driver del backend (mysql.connector viene importato solo se serve)
+        return tuple(getattr(self.database, "errors", ())) + (OSError,)
+
+    def _execute(self, grouped: Dict[str, List[tuple]]):
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            for kind, rows in grouped.items():
+                if kind in self.claimed:
+                    rows = [row for row in rows if self.claimed[kind](row) not in self._lost]
+                if not rows:
+                    continue
+                if kind in self.claims:
+                    self._execute_claims(cursor, kind, rows)
+                else:
+                    cursor.executemany(self.statements[kind][0], rows)
+            conn.commit()
+        self.stats["commits"] += 1
+
+    def _execute_claims(self, cursor, kind: str, rows: List[tuple]):
+        query, key = self.statements[kind][0], self.claims[kind]
+        for row in rows:
+            cursor.execute(query, row)
+            if cursor.rowcount == 0 and key(row) is not None:
+                self._lost[key(row)] = None
+                self.stats["lost_claims"] += 1
+                while len(self._lost) > LOST_CLAIMS_MAX:
+                    self._lost.popitem(last=False)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self._write_batch(batch)
+        finally:
+            with self._pending_cond:
+                self._pending = max(0, self._pending - len(batch))
+                self._pending_cond.notify_all()
+
+    def _write_batch(self, batch):
+        grouped = self._build(batch)
+        with self._flush_lock:
+            try:
+                # Le righe salvate su file precedono quelle nuove (es. INSERT prima del relativo UPDATE)
+                self._replay_spill()
+                self._execute(grouped)
+                self.stats["batches"] += 1
+                self.stats["rows"] += sum(len(rows) for rows in grouped.values())
+            except self._errors() as e:
+                logger.error("❌ Errore DB durante il flush del batch, salvataggio su %s: %s", self.spill_path, e)
+                self._spill(grouped)
+
+    def _spill(self, grouped: Dict[str, List[tuple]]):
+        if not self.spill_path:
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for kind, rows in grouped.items():
+                for row in rows:
+                    params = [_spill_value(value) for value in row]
+                    f.write(json.dumps({"kind": kind, "params": params}, ensure_ascii=False, default=str) + "\n")
+                    self.stats["spilled"] += 1
+
+    def _replay_spill(self):
+        """Reinserisce le righe salvate su file durante un'indisponibilità del DB."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        grouped: Dict[str, List[tuple]] = {kind: [] for kind in self.statements}
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    params = tuple(_replay_value(value) for value in record["params"])
+                    grouped.setdefault(record["kind"], []).append(params)
+        # In caso di errore il file resta al suo posto e il batch corrente viene accodato allo spill
+        self._execute(grouped)
+        os.remove(self.spill_path)
+        self.stats["replayed"] += sum(len(rows) for rows in grouped.values())
+
+    def flush(self, timeout: float = 5.0):
+        """Attende che le righe accodate fino ad ora siano scritte."""
+        with self._pending_cond:
+            return self._pending_cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Svuota la coda e ferma il thread di scrittura (chiamato anche all'uscita)."""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        self._thread.join(timeout)
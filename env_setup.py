@@ -0,0 +1,9 @@
+"""
+Caricamento del file .env, una sola volta per processo.
+
+Va importato prima dei moduli che leggono variabili d'ambiente all'import
+(app.py lo importa per primo; storage.py per le CLI che non passano da app.py).
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
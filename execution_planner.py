@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import current_trace
+
+MAX_WORKERS = int(os.getenv("EXECUTION_MAX_WORKERS", 8))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Restituisce il thread pool condiviso per le chiamate verso l'exchange (creato al primo uso)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="leg")
+    return _executor
+
+
+class LegFailed(Exception):
+    """
+    Sollevata da una gamba con esito negativo (es. ordine rifiutato dall'exchange): il risultato
+    della gamba resta quello ricevuto, ma le gambe che ne dipendono vengono saltate.
+    """
+
+    def __init__(self, result: Any):
+        super().__init__(str(result))
+        self.result = result
+
+
+@dataclass
+class Leg:
+    """Singola chiamata verso l'exchange con le sue dipendenze."""
+    name: str
+    call: Callable[[], Any]
+    depends_on: Tuple[str, ...] = ()
+    result: Any = None
+    error: Optional[BaseException] = None
+    latency_ms: Optional[float] = None
+
+
+@dataclass
+class ExecutionResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+
+
+class ExecutionPlanner:
+    """
+    Esegue le gambe di un ordine rispettando le dipendenze.
+    Le gambe senza dipendenze in sospeso partono subito; la catena critica
+    (es. leva -> ingresso) viene eseguita nel thread chiamante, le gambe
+    indipendenti (TP/SL) vengono inviate in parallelo sul thread pool.
+    """
+
+    def __init__(self, executor: Optional[ThreadPoolExecutor] = None):
+        self.executor = executor
+        self.legs: Dict[str, Leg] = {}
+
+    def add(self, name: str, call: Callable[[], Any], depends_on=()) -> "ExecutionPlanner":
+        if name in self.legs:
+            raise ValueError(f"Gamba duplicata: {name}")
+        for dep in depends_on:
+            if dep not in self.legs:
+                raise ValueError(f"Dipendenza sconosciuta per {name}: {dep}")
+        self.legs[name] = Leg(name=name, call=call, depends_on=tuple(depends_on))
+        return self
+
+    def _run_leg(self, leg: Leg):
+        start = time.perf_counter()
+        try:
+            leg.result = leg.call()
+        except LegFailed as e:
+            leg.error, leg.result = e, e.result
+        except Exception as e:
+            leg.error = e
+            leg.result = {"error": type(e).__name__, "message": str(e)}
+        finally:
+            elapsed = time.perf_counter() - start
+            leg.latency_ms = round(elapsed * 1000, 3)
+            trace = current_trace()
+            if trace is not None:
+                trace.add(f"leg.{leg.name}", start, elapsed)
+        return leg
+
+    def _ready(self, done: set, started: set):
+        ready = []
+        for leg in self.legs.values():
+            if leg.name in started:
+                continue
+            if all(dep in done for dep in leg.depends_on):
+                ready.append(leg)
+        return ready
+
+    def _skip(self, leg: Leg, failed_dep: str):
+        leg.result = {"error": "Skipped", "message": f"Dipendenza fallita: {failed_dep}"}
+        leg.latency_ms = 0.0
+
+    def run(self) -> ExecutionResult:
+        executor = self.executor or get_executor()
+        done, started, failed = set(), set(), set()
+        pending = {}
+
+        while len(done) < len(self.legs):
+            ready = self._ready(done, started)
+
+            # Le gambe che dipendono da una gamba fallita non vengono inviate
+            runnable = []
+            for leg in ready:
+                failed_dep = next((d for d in leg.depends_on if d in failed), None)
+                started.add(leg.name)
+                if failed_dep:
+                    self._skip(leg, failed_dep)
+                    failed.add(leg.name)
+                    done.add(leg.name)
+                else:
+                    runnable.append(leg)
+
+            if not runnable and not pending:
+                continue
+
+            # Un'unica gamba pronta e nessuna in volo: la eseguiamo nel thread corrente
+            if len(runnable) == 1 and not pending:
+                leg = self._run_leg(runnable[0])
+                done.add(leg.name)
+                if leg.error is not None:
+                    failed.add(leg.name)
+                continue
+
+            # Ogni gamba parallela eredita il contesto del chiamante (es. signal_id per i log)
+            for leg in runnable:
+                pending[executor.submit(contextvars.copy_context().run, self._run_leg, leg)] = leg
+
+            completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                leg = pending.pop(future)
+                done.add(leg.name)
+                if leg.error is not None:
+                    failed.add(leg.name)
+
+        outcome = ExecutionResult()
+        for leg in self.legs.values():
+            outcome.results[leg.name] = leg.result
+            outcome.latency_ms[leg.name] = leg.latency_ms
+        return outcome
+
+
+class AsyncExecutionPlanner(ExecutionPlanner):
+    """
+    Stesse regole di ExecutionPlanner per gambe asincrone (call() restituisce una coroutine):
+    le gambe indipendenti girano come task dello stesso event loop, senza thread pool.
+    """
+
+    async def _run_leg(self, leg: Leg):
+        start = time.perf_counter()
+        try:
+            leg.result = await leg.call()
+        except LegFailed as e:
+            leg.error, leg.result = e, e.result
+        except Exception as e:
+            leg.error = e
+            leg.result = {"error": type(e).__name__, "message": str(e)}
+        finally:
+            elapsed = time.perf_counter() - start
+            leg.latency_ms = round(elapsed * 1000, 3)
+            trace = current_trace()
+            if trace is not None:
+                trace.add(f"leg.{leg.name}", start, elapsed)
+        return leg
+
+    async def run(self) -> ExecutionResult:
+        done, started, failed = set(), set(), set()
+        pending = {}
+
+        while len(done) < len(self.legs):
+            for leg in self._ready(done, started):
+                failed_dep = next((d for d in leg.depends_on if d in failed), None)
+                started.add(leg.name)
+                if failed_dep:
+                    self._skip(leg, failed_dep)
+                    failed.add(leg.name)
+                    done.add(leg.name)
+                else:
+                    # Ogni task copia il contesto corrente (signal_id, traccia del segnale)
+                    pending[asyncio.ensure_future(self._run_leg(leg))] = leg
+
+            if not pending:
+                continue
+
+            completed, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in completed:
+                leg = pending.pop(task)
+                done.add(leg.name)
+                if leg.error is not None:
+                    failed.add(leg.name)
+
+        outcome = ExecutionResult()
+        for leg in self.legs.values():
+            outcome.results[leg.name] = leg.result
+            outcome.latency_ms[leg.name] = leg.latency_ms
+        return outcome
@@ -0,0 +1,164 @@
+import os
+import logging
+import socket
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("BITGET_POOL_SIZE", 10))
+CONNECT_RETRIES = int(os.getenv("BITGET_CONNECT_RETRIES", 3))
+RETRY_BACKOFF = float(os.getenv("BITGET_RETRY_BACKOFF", 0.2))
+KEEPALIVE_IDLE = int(os.getenv("BITGET_KEEPALIVE_IDLE", 30))
+
+
+class PoolMetrics:
+    """Contatori del pool HTTP: connessioni aperte, riuso, tempi di connessione e di richiesta."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.connect_time = 0.0
+        self.request_time = 0.0
+        self.errors = 0
+        self.connect_errors = 0
+
+    def record_connect(self, elapsed: float, error: bool = False):
+        with self._lock:
+            if error:
+                self.connect_errors += 1
+                return
+            self.connections += 1
+            self.connect_time += elapsed
+
+    def record_request(self, elapsed: float, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.request_time += elapsed
+            if error:
+                self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            reused = max(0, self.requests - self.connections)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+                "avg_connect_ms": round(self.connect_time / self.connections * 1000, 3) if self.connections else 0.0,
+                "avg_request_ms": round(self.request_time / self.requests * 1000, 3) if self.requests else 0.0,
+                "errors": self.errors,
+                "connect_errors": self.connect_errors,
+            }
+
+
+def _metered_pool_classes(metrics: PoolMetrics) -> dict:
+    """Classi di pool urllib3 le cui connessioni registrano il tempo di connect (TCP + TLS)."""
+
+    def timed_connect(base):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                base.connect(self)
+            except Exception:
+                metrics.record_connect(time.perf_counter() - start, error=True)
+                raise
+            metrics.record_connect(time.perf_counter() - start)
+        return connect
+
+    metered_http = type("MeteredHTTPConnection", (HTTPConnection,), {"connect": timed_connect(HTTPConnection)})
+    metered_https = type("MeteredHTTPSConnection", (HTTPSConnection,), {"connect": timed_connect(HTTPSConnection)})
+    return {
+        "http": type("MeteredHTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": metered_http}),
+        "https": type("MeteredHTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": metered_https}),
+    }
+
+
+def _keepalive_socket_options() -> list:
+    options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Opzioni TCP keep-alive disponibili solo su alcune piattaforme (es. Linux)
+    for name, value in (("TCP_KEEPIDLE", KEEPALIVE_IDLE), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class MeteredHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter con keep-alive TCP, retry sui soli errori di connessione e metriche."""
+
+    def __init__(self, metrics: PoolMetrics, pool_size: int = POOL_SIZE,
+                 connect_retries: int = CONNECT_RETRIES, backoff: float = RETRY_BACKOFF):
+        self.metrics = metrics
+        # Solo errori di connessione: una POST già inviata non va mai ripetuta (ordine doppio)
+        retry = Retry(total=connect_retries, connect=connect_retries, read=0, status=0, other=0,
+                      backoff_factor=backoff, raise_on_status=False)
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", _keepalive_socket_options())
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _metered_pool_classes(self.metrics)
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        error = False
+        try:
+            return super().send(request, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.metrics.record_request(time.perf_counter() - start, error)
+
+
+class PooledSession:
+    """Sessione HTTP condivisa tra thread con pool di connessioni persistenti verso un host."""
+
+    def __init__(self, base_url: str, pool_size: int = POOL_SIZE,
+                 connect_retries: int = CONNECT_RETRIES, backoff: float = RETRY_BACKOFF):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.metrics = PoolMetrics()
+        self.session = requests.Session()
+        adapter = MeteredHTTPAdapter(self.metrics, pool_size, connect_retries, backoff)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def warmup(self, path: str = "/", connections: int = None, timeout: float = 5):
+        """
+        Apre in anticipo fino a `connections` connessioni (handshake TCP+TLS) e le lascia nel pool,
+        così il primo segnale dopo un deploy non paga il costo della connessione.
+        """
+        connections = min(connections or self.pool_size, self.pool_size)
+
+        def touch(_):
+            try:
+                self.session.get(self.base_url + path, timeout=timeout).close()
+                return True
+            except requests.exceptions.RequestException as e:
+                logger.warning("⚠️ Warmup della connessione fallito: %s", e)
+                return False
+
+        # Richieste concorrenti: ognuna occupa una connessione diversa del pool
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            return sum(executor.map(touch, range(connections)))
+
+    def warmup_async(self, path: str = "/", connections: int = None):
+        thread = threading.Thread(target=self.warmup, args=(path, connections), name="http-warmup", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,101 @@
+import os
+import time
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+LANE_MAX_DEPTH = int(os.getenv("LANE_MAX_DEPTH", 20))
+
+
+class LaneFull(Exception):
+    """La coda del symbol ha raggiunto la profondità massima (backpressure)."""
+
+
+class _Lane:
+    __slots__ = ("jobs", "active", "processed", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.jobs = deque()
+        self.active = False
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class KeyedExecutor:
+    """
+    Executor con una corsia per chiave (es. symbol).
+    I job della stessa chiave vengono eseguiti uno alla volta nell'ordine di invio;
+    chiavi diverse procedono in parallelo sui thread del pool. Ogni corsia ha una
+    profondità massima oltre la quale submit solleva LaneFull.
+    """
+
+    def __init__(self, workers: int, max_depth: int = LANE_MAX_DEPTH, thread_name_prefix: str = "lane"):
+        self.max_depth = max_depth
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = _Lane()
+            # Il job in esecuzione conta nella profondità della corsia
+            if len(lane.jobs) + lane.active >= self.max_depth:
+                self.rejected += 1
+                raise LaneFull(f"Coda piena per {key} ({self.max_depth} job)")
+            # Il job gira nel contesto del chiamante (es. signal_id per i log)
+            lane.jobs.append((future, contextvars.copy_context(), fn, args, kwargs, time.monotonic()))
+            schedule = not lane.active
+            lane.active = True
+        if schedule:
+            self._pool.submit(self._drain, key)
+        return future
+
+    def _drain(self, key: Hashable):
+        with self._lock:
+            lane = self._lanes[key]
+            future, context, fn, args, kwargs, enqueued_at = lane.jobs.popleft()
+            wait = time.monotonic() - enqueued_at
+            lane.wait_total += wait
+            lane.wait_max = max(lane.wait_max, wait)
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(context.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        with self._lock:
+            lane.processed += 1
+            if lane.jobs:
+                reschedule = True
+            else:
+                lane.active = False
+                reschedule = False
+        # Un job alla volta per corsia: il successivo torna in coda al pool per equità tra symbol
+        if reschedule:
+            self._pool.submit(self._drain, key)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            lanes = {}
+            for key, lane in self._lanes.items():
+                oldest = lane.jobs[0][5] if lane.jobs else None
+                lanes[str(key)] = {
+                    "depth": len(lane.jobs) + lane.active,
+                    "lag_ms": round((now - oldest) * 1000, 3) if oldest is not None else 0.0,
+                    "processed": lane.processed,
+                    "avg_wait_ms": round(lane.wait_total / lane.processed * 1000, 3) if lane.processed else 0.0,
+                    "max_wait_ms": round(lane.wait_max * 1000, 3),
+                }
+            return {"max_depth": self.max_depth, "rejected": self.rejected, "lanes": lanes}
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
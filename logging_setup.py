@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+
+# signal_id del segnale in lavorazione nel thread (o nel contesto) corrente
+current_signal_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("signal_id", default=None)
+
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+@contextmanager
+def signal_context(signal_id: Optional[str]):
+    """Associa signal_id a tutte le righe di log emesse nel blocco."""
+    token = current_signal_id.set(signal_id)
+    try:
+        yield
+    finally:
+        current_signal_id.reset(token)
+
+
+class LazyJson:
+    """
+    Argomento di log serializzato solo quando la riga viene davvero formattata:
+    con il livello disattivato json.dumps non viene mai eseguito.
+    """
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj: Any, indent: Optional[int] = 2):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        try:
+            return json.dumps(self.obj, indent=self.indent, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            return repr(self.obj)
+
+
+# Attributi standard di LogRecord: tutto il resto arriva da extra= e finisce nel JSON
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "signal_id", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per record: ts, level, logger, signal_id, msg e i campi passati con extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "signal_id": getattr(record, "signal_id", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato leggibile per lo sviluppo locale (LOG_FORMAT=text)."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(signal_id)s] %(name)s: %(message)s")
+
+
+class SignalQueueHandler(QueueHandler):
+    """
+    Nel thread chiamante legge solo il signal_id dal contesto e accoda il record:
+    formattazione e scrittura su stdout avvengono nel thread del QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare formatterebbe il messaggio qui, sul percorso dell'ordine
+        if getattr(record, "signal_id", None) is None:
+            record.signal_id = current_signal_id.get()
+        return record
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> QueueListener:
+    """Installa sul root logger l'handler a coda con output JSON (una sola volta per processo)."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(SignalQueueHandler(log_queue))
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
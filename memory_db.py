@@ -0,0 +1,148 @@
+import json
+import time
+import threading
+import itertools
+from datetime import datetime
+from typing import Any, List, Optional
+
+from signal_dedup import DuplicateSignal
+
+
+class InMemoryDatabaseService:
+    """
+    Sostituto in memoria di DatabaseService (stessi metodi) con le tabelle request_log
+    e api_requests come liste di dizionari. Pensato per load test e simulazioni:
+    nessuna dipendenza da MySQL, latenza di scrittura opzionale per emulare il commit.
+    """
+
+    def __init__(self, write_latency_ms: float = 0.0):
+        self.write_latency = write_latency_ms / 1000
+        self.request_log: List[dict] = []
+        self.api_requests: List[dict] = []
+        self._by_signal = {}
+        self._fingerprints = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._last_signal = None
+        self.writer = None
+
+    def _write(self):
+        if self.write_latency:
+            time.sleep(self.write_latency)
+
+    def log_incoming_request(self, request_text, response_text, signal_id=None, fingerprint=None, ticker=None):
+        self._last_signal = {"signal_id": signal_id, "request_time": datetime.now()}
+        self._write()
+        with self._lock:
+            if fingerprint:
+                if fingerprint in self._fingerprints:
+                    raise DuplicateSignal(signal_id)  # come l'indice univoco di request_log
+                self._fingerprints.add(fingerprint)
+            row = {
+                "id_request": next(self._ids),
+                "request_time": datetime.now(),
+                "request": json.dumps(request_text) if isinstance(request_text, dict) else request_text,
+                "response": response_text,
+                "signal_id": signal_id,
+                "fingerprint": fingerprint,
+                "ticker": ticker,
+                "trace": None,
+            }
+            self.request_log.append(row)
+            if signal_id is not None:
+                self._by_signal[signal_id] = row
+            return row["id_request"]
+
+    def update_request_response(self, id_request: Optional[int], response_data: Any, signal_id=None):
+        self._write()
+        with self._lock:
+            row = self._by_signal.get(signal_id)
+            if row is None and id_request is not None:
+                row = next((r for r in self.request_log if r["id_request"] == id_request), None)
+            if row is None:
+                return 0
+            row["response"] = json.dumps(response_data) if isinstance(response_data, dict) else response_data
+            return 1
+
+    def update_request_trace(self, signal_id: str, trace: Any):
+        with self._lock:
+            row = self._by_signal.get(signal_id)
+            if row is not None:
+                row["trace"] = trace
+            return int(row is not None)
+
+    def log_outgoing_api(self, request_text, response_text, signal_id=None):
+        self._write()
+        with self._lock:
+            row = {
+                "id": len(self.api_requests) + 1,
+                "request_time": datetime.now(),
+                "signal_id": signal_id,
+                "endpoint": request_text.get("endpoint") if isinstance(request_text, dict) else None,
+                "request": request_text,
+                "response": response_text,
+            }
+            self.api_requests.append(row)
+            return row["id"]
+
+    def last_signal(self):
+        return self._last_signal
+
+    def load_last_signal(self):
+        if self._last_signal is None:
+            self._last_signal = self.get_last_request_info()
+        return self._last_signal
+
+    def get_last_request_info(self):
+        with self._lock:
+            if not self.request_log:
+                return None
+            row = self.request_log[-1]
+            return {"signal_id": row["signal_id"], "request_time": row["request_time"]}
+
+    def get_request_by_signal(self, signal_id: str):
+        with self._lock:
+            row = self._by_signal.get(signal_id)
+            return dict(row) if row else None
+
+    def find_signals(self, ticker=None, since=None, until=None, before_id=None, limit=50):
+        with self._lock:
+            rows = [row for row in reversed(self.request_log)
+                    if (not ticker or row["ticker"] == ticker)
+                    and (since is None or row["request_time"] >= since)
+                    and (until is None or row["request_time"] < until)
+                    and (not before_id or row["id_request"] < before_id)][:limit]
+            calls = {}
+            for call in self.api_requests:
+                calls.setdefault(call["signal_id"], []).append({"endpoint": call["endpoint"]})
+        page = [{"id_request": row["id_request"], "signal_id": row["signal_id"], "ticker": row["ticker"],
+                 "request_time": row["request_time"], "response": row["response"],
+                 "calls": calls.get(row["signal_id"], [])} for row in rows]
+        return page, page[-1]["id_request"] if len(page) == limit else None
+
+    def get_api_calls(self, signal_id: str):
+        with self._lock:
+            return [dict(call) for call in self.api_requests if call["signal_id"] == signal_id]
+
+    def get_recent_fingerprints(self, max_age_seconds: float):
+        now = datetime.now()
+        with self._lock:
+            rows = []
+            for row in self.request_log:
+                age = (now - row["request_time"]).total_seconds()
+                if row["fingerprint"] and age <= max_age_seconds:
+                    rows.append({"fingerprint": row["fingerprint"], "signal_id": row["signal_id"],
+                                 "age_seconds": age})
+            return rows
+
+    def responses(self) -> List[Any]:
+        """Risposte salvate in request_log, decodificate dal JSON quando possibile."""
+        with self._lock:
+            raw = [row["response"] for row in self.request_log]
+        decoded = []
+        for value in raw:
+            try:
+                decoded.append(json.loads(value) if isinstance(value, str) else value)
+            except ValueError:
+                decoded.append(value)
+        return decoded
@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Salvataggio della traccia per segnale in request_log.trace (migrations/003)
+TRACE_SIGNALS = os.getenv("METRICS_TRACE_SIGNALS", "false").lower() == "true"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _label_str(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            lines.append(f"{self.name}{self._label_str(key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Istogramma a bucket fissi: observe costa una bisect e due incrementi sotto lock,
+    i cumulativi vengono calcolati solo quando /metrics viene letto.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # etichette -> [conteggi per bucket (+Inf), somma]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Tutte le metriche del processo nel formato testuale di Prometheus."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Traccia per segnale ---
+
+class SignalTrace:
+    """Span (nome, inizio, durata in ms) di un singolo segnale, relativi alla ricezione del webhook."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.signal_id: Optional[str] = None
+        self.order_type: Optional[str] = None
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, name: str, start: float, elapsed: float):
+        # list.append è atomico: le gambe parallele scrivono senza lock
+        self.spans.append((name, round((start - self.started) * 1000, 3), round(elapsed * 1000, 3)))
+
+    def end_of(self, name: str) -> Optional[float]:
+        """Secondi dalla ricezione alla fine dello span `name` (None se non registrato)."""
+        for span_name, start_ms, elapsed_ms in self.spans:
+            if span_name == name:
+                return (start_ms + elapsed_ms) / 1000
+        return None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(self.elapsed() * 1000, 3),
+            "spans": [{"name": name, "start_ms": start, "ms": ms} for name, start, ms in self.spans],
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[SignalTrace]] = contextvars.ContextVar("signal_trace", default=None)
+
+
+def current_trace() -> Optional[SignalTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: SignalTrace):
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def measure(histogram: Histogram, span: Optional[str] = None, **labels):
+    """
+    Misura il blocco su `histogram` e, se c'è una traccia attiva, lo registra come span.
+    Il dizionario delle etichette viene restituito per impostare l'esito dentro il blocco.
+    """
+    start = time.perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        labels.setdefault("outcome", "exception")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        trace = _current_trace.get()
+        if trace is not None and span:
+            trace.add(span, start, elapsed)
+
+
+def measured(histogram: Histogram, span: Optional[str] = None, **labels):
+    """Decoratore: misura ogni chiamata della funzione con `measure`."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with measure(histogram, span, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- Metriche del percorso dell'ordine ---
+
+WEBHOOK_SECONDS = Histogram(
+    "webhook_request_seconds", "Durata di POST /order per tipo di ordine e status HTTP",
+    ("order_type", "status"))
+ORDER_PARSE_SECONDS = Histogram(
+    "order_parse_seconds", "Parsing dell'alert TradingView (process_order_request)",
+    ("order_type",), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+ALERT_TO_ENTRY_SECONDS = Histogram(
+    "alert_to_entry_seconds", "Dalla ricezione del webhook alla risposta Bitget dell'ordine di ingresso",
+    ("outcome",))
+BITGET_REQUEST_SECONDS = Histogram(
+    "bitget_request_seconds", "Chiamate BitgetClient._post (attesa del rate limiter inclusa)",
+    ("endpoint", "outcome"))
+DB_SECONDS = Histogram(
+    "db_operation_seconds", "Metodi di DatabaseService (in modalità batch solo l'accodamento)",
+    ("operation",))
+DB_ERRORS = Counter("db_errors_total", "Errori DB gestiti da DatabaseService", ("operation",))
@@ -0,0 +1,149 @@
+"""
+Converte le righe esistenti di api_requests nel formato compatto (migrations/004).
+
+Su MySQL va applicato prima migrations/004 (SQLite aggiunge le colonne alla connessione).
+Per ogni riga con le colonne storiche (body, headers, payload, response_*) calcola le colonne
+indicizzate (response_code, order_id) e il record unico `data` {payload, response} con i segreti
+mascherati, poi svuota le colonne storiche: gli header firmati non restano nel DB.
+La conversione procede per id a blocchi ed è ripetibile (salta le righe con data già valorizzato).
+
+    python migrate_api_requests.py --dry-run
+    python migrate_api_requests.py --batch-size 1000
+    python migrate_api_requests.py --drop-legacy      # dopo la conversione, rimuove le colonne storiche
+
+Su MySQL lo spazio su disco viene restituito solo dopo OPTIMIZE TABLE api_requests.
+"""
+import json
+import time
+import argparse
+from typing import Any
+
+from api_log import compact_row
+from storage import StorageBackend, get_backend
+
+LEGACY_COLUMNS = ("body", "headers", "payload", "response_body", "response_json", "response_data")
+
+SELECT_QUERY = f"""
+    SELECT id, endpoint, response_status, response_code, response_msg, queue_delay_ms,
+           {", ".join(LEGACY_COLUMNS)}
+    FROM api_requests
+    WHERE id > %s AND data IS NULL
+    ORDER BY id
+    LIMIT %s
+"""
+
+UPDATE_QUERY = f"""
+    UPDATE api_requests
+    SET endpoint = %s, response_status = %s, response_code = %s, response_msg = %s,
+        order_id = %s, data = %s, compressed = %s,
+        {", ".join(f"{column} = NULL" for column in LEGACY_COLUMNS)}
+    WHERE id = %s
+"""
+
+
+def _loads(value: Any) -> Any:
+    """Le colonne storiche sono JSON di stringhe JSON (json.dumps applicato due volte)."""
+    for _ in range(2):
+        if not isinstance(value, (str, bytes)):
+            break
+        try:
+            value = json.loads(value)
+        except ValueError:
+            break
+    return value
+
+
+def _legacy_size(row: dict) -> int:
+    return sum(len(row[column]) for column in LEGACY_COLUMNS if isinstance(row.get(column), (str, bytes)))
+
+
+def convert_row(row: dict) -> tuple:
+    """Parametri di UPDATE_QUERY per una riga in formato storico."""
+    request_log = {
+        "endpoint": row["endpoint"],
+        "payload": _loads(row["payload"]) or _loads(row["body"]),
+        "queue_delay_ms": row.get("queue_delay_ms"),
+    }
+    response_log = {
+        "response_status": row["response_status"],
+        "response_body": _loads(row["response_body"]),
+        "response_json": _loads(row["response_json"]),
+        "response_data": _loads(row["response_data"]),
+        "response_code": row["response_code"],
+        "response_msg": row["response_msg"],
+    }
+    endpoint, status, code, msg, order_id, _, _, _, _, data, compressed = compact_row(request_log, response_log)
+    return endpoint, status, code, msg, order_id, data, compressed, row["id"]
+
+
+def has_legacy_columns(backend: StorageBackend) -> bool:
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT body FROM api_requests WHERE 1 = 0")
+            cursor.fetchall()
+            return True
+        except backend.errors:
+            return False
+
+
+def migrate(backend: StorageBackend, batch_size: int = 500, dry_run: bool = False) -> dict:
+    stats = {"rows": 0, "legacy_bytes": 0, "compact_bytes": 0, "compressed": 0}
+    last_id = 0
+    while True:
+        with backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(SELECT_QUERY, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            params = [convert_row(row) for row in rows]
+            if not dry_run:
+                conn.cursor().executemany(UPDATE_QUERY, params)
+                conn.commit()
+        last_id = rows[-1]["id"]
+        stats["rows"] += len(rows)
+        stats["legacy_bytes"] += sum(_legacy_size(row) for row in rows)
+        stats["compact_bytes"] += sum(len(p[5]) for p in params)
+        stats["compressed"] += sum(p[6] for p in params)
+    return stats
+
+
+def drop_legacy_columns(backend: StorageBackend):
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        if backend.dialect == "mysql":
+            cursor.execute("ALTER TABLE api_requests " + ", ".join(f"DROP COLUMN {c}" for c in LEGACY_COLUMNS))
+        else:
+            for column in LEGACY_COLUMNS:
+                cursor.execute(f"ALTER TABLE api_requests DROP COLUMN {column}")
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="calcola i risparmi senza scrivere")
+    parser.add_argument("--drop-legacy", action="store_true", help="rimuove le colonne storiche a fine conversione")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    if not has_legacy_columns(backend):
+        print("api_requests è già nel formato compatto: niente da convertire")
+        return
+
+    start = time.perf_counter()
+    stats = migrate(backend, args.batch_size, args.dry_run)
+    ratio = stats["compact_bytes"] / stats["legacy_bytes"] if stats["legacy_bytes"] else 0.0
+    print(f"righe {'da convertire' if args.dry_run else 'convertite'}: {stats['rows']} "
+          f"in {time.perf_counter() - start:.1f} s (compresse: {stats['compressed']})")
+    print(f"colonne storiche: {stats['legacy_bytes']} byte -> record compatto: {stats['compact_bytes']} byte "
+          f"({ratio:.1%})")
+
+    if args.drop_legacy and not args.dry_run:
+        drop_legacy_columns(backend)
+        print(f"colonne rimosse: {', '.join(LEGACY_COLUMNS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+-- Tempo passato in coda nel rate limiter del client prima dell'invio a Bitget
+ALTER TABLE api_requests
+    ADD COLUMN queue_delay_ms DECIMAL(12, 3) NULL AFTER signal_id;
@@ -0,0 +1,4 @@
+-- Impronta dell'alert TradingView (trade_id, ticker, time, action) per la deduplicazione
+ALTER TABLE request_log
+    ADD COLUMN fingerprint CHAR(64) NULL AFTER signal_id,
+    ADD UNIQUE INDEX uq_request_log_fingerprint (fingerprint);
@@ -0,0 +1,2 @@
+-- Traccia per segnale (span con tempi in ms), scritta solo con METRICS_TRACE_SIGNALS=true
+ALTER TABLE request_log ADD COLUMN trace JSON NULL AFTER response;
@@ -0,0 +1,23 @@
+-- api_requests compatta: colonne indicizzate (endpoint, code, orderId, latenza) e un solo record
+-- {payload, response} in `data`, compresso con zlib oltre API_LOG_COMPRESS_MIN_BYTES.
+-- Gli header firmati non vengono più salvati. Le righe esistenti si convertono con
+--     python migrate_api_requests.py
+-- che con --drop-legacy rimuove le colonne body, headers, payload, response_body, response_json, response_data.
+ALTER TABLE api_requests
+    MODIFY COLUMN body LONGTEXT NULL,
+    MODIFY COLUMN headers LONGTEXT NULL,
+    MODIFY COLUMN payload LONGTEXT NULL,
+    MODIFY COLUMN response_body LONGTEXT NULL,
+    MODIFY COLUMN response_json LONGTEXT NULL,
+    MODIFY COLUMN response_data LONGTEXT NULL,
+    MODIFY COLUMN endpoint VARCHAR(128) NULL,
+    MODIFY COLUMN response_status VARCHAR(32) NULL,
+    MODIFY COLUMN response_code VARCHAR(16) NULL,
+    MODIFY COLUMN response_msg VARCHAR(255) NULL,
+    ADD COLUMN order_id VARCHAR(64) NULL AFTER response_msg,
+    ADD COLUMN latency_ms DECIMAL(12, 3) NULL AFTER order_id,
+    ADD COLUMN data MEDIUMBLOB NULL,
+    ADD COLUMN compressed TINYINT(1) NOT NULL DEFAULT 0,
+    ADD INDEX idx_api_requests_endpoint (endpoint),
+    ADD INDEX idx_api_requests_code (response_code),
+    ADD INDEX idx_api_requests_order_id (order_id);
@@ -0,0 +1,11 @@
+-- Symbol del segnale e indici per le letture di /signals (filtro per ticker, intervallo di tempo,
+-- paginazione keyset su id_request) e per il join request_log -> api_requests su signal_id.
+-- Le righe precedenti restano con ticker NULL: compaiono solo nelle ricerche senza filtro ticker.
+ALTER TABLE request_log
+    ADD COLUMN ticker VARCHAR(32) NULL AFTER signal_id,
+    ADD INDEX idx_request_log_ticker (ticker, id_request),
+    ADD INDEX idx_request_log_time (request_time),
+    ADD INDEX idx_request_log_signal_id (signal_id);
+
+ALTER TABLE api_requests
+    ADD INDEX idx_api_requests_signal_id (signal_id, id);
@@ -0,0 +1,6 @@
+-- Account dell'exchange su cui è stata fatta la chiamata (ACCOUNTS con più account: lo stesso
+-- segnale viene replicato e le chiamate di tutti gli account condividono il signal_id).
+-- Le righe precedenti restano con account NULL.
+ALTER TABLE api_requests
+    ADD COLUMN account VARCHAR(64) NULL AFTER signal_id,
+    ADD INDEX idx_api_requests_account (account, id);
@@ -0,0 +1,315 @@
+import os
+import inspect
+import logging
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, Optional
+
+from utils import parse_signal_string
+from Order import Order
+from basket import BasketLeg, leg_failed
+from contracts import PositionPlan, OrderValidationError, plan_position
+from execution_planner import LegFailed
+from order_outbox import DUPLICATE_CODES, RetryableLegError, retryable
+from signal_dedup import client_oid
+from metrics import current_trace, ALERT_TO_ENTRY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LEVERAGE = "20"
+# Ultimo TP e SL in una sola richiesta place-pos-tpsl (meno round trip e budget di rate limit).
+# Disattivato di default: il TP di posizione chiude tutta la posizione residua, non la sola quota
+# dell'ultimo TP, e sostituisce il TP/SL di posizione di un segnale precedente sullo stesso symbol.
+# Gli ingressi non passano da batch-place-order, di proposito: accetta un solo symbol per richiesta,
+# quindi non serve né i blocchi di un basket (un symbol ciascuno) né gli account (una richiesta per account)
+BATCH_ORDERS = os.getenv("BITGET_BATCH_ORDERS", "false").lower() == "true"
+
+# Piano e gambe di una posizione, comuni al server Flask (app.py) e a quello ASGI (asgi_app.py):
+# cambia solo il client (sincrono o asyncio) e il planner che esegue le gambe.
+
+
+def plan_order(order: Order, contracts, msg: Optional[dict] = None, scale: float = 1.0) -> PositionPlan:
+    """
+    Gambe di un ordine OPEN: TP multipli con qty_distribution oppure TP singolo.
+    Size e prezzi sono arrotondati alle regole del contratto e la size è ripartita
+    tra i TP senza eccedenze; solleva ValueError (o OrderValidationError) senza
+    alcuna chiamata a Bitget se il messaggio o le quantità non sono validi.
+    `msg` è il messaggio già parsificato (replay), altrimenti viene letto da order.message;
+    `scale` moltiplica la size dell'alert (dimensionamento per account).
+    """
+    symbol = order.ticker.replace(".P", "")
+    if msg is None:
+        msg = parse_signal_string(order.message or "")
+    if order.size is None:
+        raise ValueError("Size dell'ordine mancante")
+
+    # -----------------------------
+    # TP multipli con qty_distribution
+    # -----------------------------
+    if "qty_distribution" in msg and all(k in msg for k in ["tp1", "tp2", "tp3", "stop_loss"]):
+        distribution = msg["qty_distribution"]
+        missing = [tp for tp in ("TP1", "TP2", "TP3") if tp not in distribution]
+        if missing:
+            raise OrderValidationError(f"Percentuale mancante per {', '.join(missing)}")
+        take_profits = [(tp, msg[tp], distribution[tp.upper()]) for tp in ("tp1", "tp2", "tp3")]
+
+    # -----------------------------
+    # TP singolo
+    # -----------------------------
+    elif "tp" in msg and "stop_loss" in msg:
+        take_profits = [("tp", msg["tp"], 100)]
+
+    else:
+        # Messaggio non valido
+        raise ValueError("Il messaggio del segnale non contiene TP/SL validi")
+
+    size = order.size * scale
+    spec = contracts.spec_for(symbol, size)
+    return plan_position(spec, order.action, order.order_type.lower(), size, msg["stop_loss"], take_profits)
+
+
+def plan_basket_leg(leg: BasketLeg, contracts, scale: float = 1.0) -> PositionPlan:
+    """Gambe di un blocco dell'alert basket, arrotondate e validate come plan_order."""
+    size = leg.size * scale
+    spec = contracts.spec_for(leg.symbol, size)
+    take_profits = [(name, price, pct) for name, (price, pct) in leg.take_profits.items()]
+    return plan_position(spec, leg.side, "open", size, leg.stop_loss, take_profits)
+
+
+def plan_job(order: Order, contracts, scale: float = 1.0) -> Optional[PositionPlan]:
+    """Piano di un account: gambe dell'ordine OPEN con la size scalata, None per un CLOSE."""
+    return plan_order(order, contracts, scale=scale) if order.order_type == "OPEN" else None
+
+
+def _entry_call(call, outbox):
+    """
+    Ingresso che ferma TP e SL se non va a buon fine (code diverso da 00000 o errore): altrimenti
+    partirebbero su una posizione mai aperta. Solo un errore transitorio, con l'outbox attivo,
+    accoda l'ingresso e le sue gambe per un nuovo tentativo.
+    """
+    def check(result):
+        if outbox is not None and retryable(result):
+            raise RetryableLegError(result)  # TP/SL non partono: li invia l'outbox dopo l'ingresso
+        code = result.get("code") if isinstance(result, dict) else None
+        if code != "00000" and code not in DUPLICATE_CODES:  # clientOid già usato: ingresso già eseguito
+            raise LegFailed(result)
+        return result
+
+    if inspect.iscoroutinefunction(call.func):
+        async def place_entry():
+            return check(await call())
+    else:
+        def place_entry():
+            return check(call())
+    return place_entry
+
+
+class PositionLegs:
+    """
+    Gambe di una posizione (leva -> ordine principale -> TP/SL in parallelo) aggiunte a un
+    ExecutionPlanner o AsyncExecutionPlanner. I clientOid sono derivati dal signal_id (con
+    oid_prefix per i blocchi di un basket); `entry` e `protective` sono le chiamate che
+    l'outbox può ripetere, con lo stesso clientOid. `leg_prefix` distingue nel planner le
+    gambe di account diversi dello stesso segnale.
+    """
+
+    def __init__(self, client, outbox, symbol, margin_coin, side, trade_side, qty, take_profit_legs, sl_price,
+                 signal_id, oid_prefix="", batch_orders=BATCH_ORDERS, leg_prefix=""):
+        self.client = client
+        self.leg_prefix = leg_prefix
+        self.outbox = outbox
+        self.take_profit_legs = take_profit_legs
+        self.signal_id = signal_id
+        self.oid_prefix = oid_prefix
+
+        def oid(leg):
+            return client_oid(signal_id, oid_prefix + leg)
+
+        # Chiamate ripetibili dall'outbox: ingresso e ogni gamba TP/SL come ordine tpsl singolo
+        self.entry = {"symbol": symbol, "margin_coin": margin_coin, "quantity": str(qty), "side": side,
+                      "trade_side": trade_side, "client_oid": oid("o")}
+        self.protective = {
+            name: {"symbol": symbol, "margin_coin": margin_coin, "quantity": tp_qty, "side": side,
+                   "trigger_price": tp_price, "plan_type": "profit_plan", "client_oid": oid(name)}
+            for name, (tp_qty, tp_price) in take_profit_legs.items()
+        }
+        self.protective["stopLoss"] = {"symbol": symbol, "margin_coin": margin_coin, "quantity": str(qty),
+                                       "side": side, "trigger_price": sl_price, "plan_type": "loss_plan",
+                                       "client_oid": oid("sl")}
+        self.symbol, self.margin_coin, self.side = symbol, margin_coin, side
+        self.qty, self.sl_price = str(qty), sl_price
+        # Con le API batch l'ultimo TP e lo SL diventano TP/SL di posizione in una sola richiesta;
+        # i TP intermedi (parziali) restano ordini tpsl separati
+        self.position_tp = list(take_profit_legs)[-1] if batch_orders else None
+
+    def add_to(self, planner):
+        client, signal_id = self.client, self.signal_id
+
+        def leg(name):
+            return self.leg_prefix + name
+        planner.add(leg("leverage"), partial(client.set_leverage, self.symbol, self.margin_coin, LEVERAGE, self.side,
+                                             signal_id))
+        planner.add(leg("order"), _entry_call(partial(client.place_order, signal_id=signal_id, **self.entry),
+                                              self.outbox),
+                    depends_on=(leg("leverage"),))
+        for name in self.take_profit_legs:
+            if name == self.position_tp:
+                continue
+            planner.add(leg(name), partial(client.place_tp_sl, signal_id=signal_id, **self.protective[name]),
+                        depends_on=(leg("order"),))
+        if self.position_tp:
+            tp_qty, tp_price = self.take_profit_legs[self.position_tp]
+            planner.add(leg("positionTpSl"), partial(client.place_pos_tpsl, self.symbol, self.margin_coin, self.side,
+                                                     tp_price, self.sl_price, signal_id,
+                                                     tp_client_oid=self.protective[self.position_tp]["client_oid"],
+                                                     sl_client_oid=self.protective["stopLoss"]["client_oid"],
+                                                     tp_size=tp_qty, sl_size=self.qty),
+                        depends_on=(leg("order"),))
+        else:
+            planner.add(leg("stopLoss"), partial(client.place_tp_sl, signal_id=signal_id,
+                                                 **self.protective["stopLoss"]),
+                        depends_on=(leg("order"),))
+        return planner
+
+    def results(self, outcome) -> dict:
+        """Risultato per gamba del piano eseguito; le gambe con esito incerto passano all'outbox."""
+        # Solo le gambe di questa posizione, senza il prefisso dell'account
+        names = {self.leg_prefix + name: name for name in ("leverage", "order", "positionTpSl", "stopLoss",
+                                                           *self.take_profit_legs)}
+        results = {names[name]: result for name, result in outcome.results.items() if name in names}
+        latency_ms = {names[name]: ms for name, ms in outcome.latency_ms.items() if name in names}
+        # SLO: dalla ricezione del webhook alla risposta dell'ordine di ingresso (non per i basket
+        # né per gli account secondari)
+        trace = current_trace()
+        entry_at = trace.end_of("leg.order") if trace and not self.oid_prefix else None
+        if entry_at is not None:
+            entry_result = results["order"]
+            ALERT_TO_ENTRY_SECONDS.observe(
+                entry_at, outcome="ok" if isinstance(entry_result, dict) and entry_result.get("code") == "00000"
+                else "error")
+
+        if self.position_tp:
+            # Risultato per gamba anche per la richiesta combinata (stesso formato del percorso senza batch)
+            combined = results.pop("positionTpSl")
+            if not isinstance(combined, dict) or "profit" not in combined:
+                combined = {"profit": combined, "loss": combined}  # eccezione nella gamba
+            results[self.position_tp] = combined["profit"]
+            results["stopLoss"] = combined["loss"]
+
+        if self.outbox is not None:
+            queue_failed_legs(self.outbox, results, self.signal_id, self.entry, self.protective)
+
+        return {
+            "leverage": results["leverage"],
+            "order": results["order"],
+            "takeProfit": {name: results[name] for name in self.take_profit_legs},
+            "stopLoss": results["stopLoss"],
+            "latency_ms": latency_ms
+        }
+
+
+def queue_failed_legs(outbox, results, signal_id, entry, protective):
+    """Accoda all'outbox le gambe con esito incerto; il loro risultato indica il nuovo tentativo."""
+    queued = []
+    if isinstance(results["order"], dict) and results["order"].get("error") == "RetryableLegError":
+        outbox.add(signal_id, "place_order", entry)
+        queued.append("order")
+        for name, kwargs in protective.items():
+            outbox.add(signal_id, "place_tp_sl", kwargs, after=entry["client_oid"])
+            queued.append(name)
+    else:
+        for name, kwargs in protective.items():
+            if retryable(results[name]):
+                outbox.add(signal_id, "place_tp_sl", kwargs)
+                queued.append(name)
+    for name in queued:
+        results[name] = dict(results[name], outbox="queued")
+    if queued:
+        logger.warning("⚠️ Gambe in outbox per un nuovo tentativo: %s", ", ".join(queued))
+
+
+# --- Stesso segnale su più account (ACCOUNTS) ---
+
+@dataclass
+class AccountOrder:
+    """
+    Ordine replicato sugli account, eseguito come un solo job nella corsia del symbol: piano
+    dimensionato per account (None per un CLOSE) e account esclusi dalla validazione locale.
+    """
+    symbol: str
+    plans: Dict[str, Optional[PositionPlan]]
+    invalid: Dict[str, dict] = field(default_factory=dict)
+    oid_prefix: str = ""  # blocco di un basket
+
+
+def plan_accounts(registry, symbol: str, plan: Callable[[float], Optional[PositionPlan]],
+                  oid_prefix: str = "") -> AccountOrder:
+    """
+    Piano di ogni account con plan(size_scale). Un account su cui l'ordine non è valido
+    (es. size scalata sotto il minimo) viene escluso; se non è valido su nessun account
+    solleva ValueError con il motivo del primo.
+    """
+    plans, invalid = {}, {}
+    for account in registry:
+        try:
+            plans[account.name] = plan(account.size_scale)
+        except ValueError as e:
+            invalid[account.name] = {"status": "invalid", "message": str(e)}
+    if not plans:
+        raise ValueError(next(iter(invalid.values()))["message"])
+    return AccountOrder(symbol, plans, invalid, oid_prefix)
+
+
+class AccountFanOut:
+    """
+    Gambe di tutti gli account in un unico ExecutionPlanner (o AsyncExecutionPlanner): le
+    catene leva -> ingresso dei diversi account partono insieme, ciascuna con il client
+    dell'account (pool di connessioni e rate limiter propri), quindi l'ultimo account
+    termina circa quando terminerebbe un account solo.
+    """
+
+    def __init__(self, registry, job: AccountOrder, signal_id: str, batch_orders: bool = BATCH_ORDERS):
+        self.order = [account.name for account in registry]
+        self.invalid = job.invalid
+        self.signal_id = signal_id
+        self.positions = {}  # account -> PositionLegs
+        self.closes = {}  # account -> (gamba, chiamata)
+        for name, plan in job.plans.items():
+            client, prefix = registry.client(name), registry.leg_prefix(name)
+            if plan is None:
+                self.closes[name] = (prefix + "close", partial(client.close_all_positions, job.symbol, signal_id))
+                continue
+            self.positions[name] = PositionLegs(client, registry.outbox(name), plan.symbol, "USDT", plan.side,
+                                                plan.trade_side, plan.size, plan.take_profits, plan.stop_loss,
+                                                signal_id, prefix + job.oid_prefix, batch_orders, leg_prefix=prefix)
+
+    def add_to(self, planner):
+        for legs in self.positions.values():
+            legs.add_to(planner)
+        for leg, call in self.closes.values():
+            planner.add(leg, call)
+        return planner
+
+    def results(self, outcome) -> dict:
+        """Esito per account, nell'ordine di ACCOUNTS, con gli account falliti elencati in `failed`."""
+        by_account = dict(self.invalid)
+        for name, legs in self.positions.items():
+            by_account[name] = legs.results(outcome)
+        for name, (leg, _) in self.closes.items():
+            result = outcome.results[leg]
+            by_account[name] = dict(result, signal_id=self.signal_id) if isinstance(result, dict) else result
+        results = {name: by_account[name] for name in self.order if name in by_account}
+        failed = [name for name, result in results.items() if leg_failed(result)]
+        # Una riga per account, con il signal_id condiviso del segnale
+        for name in results:
+            if name in failed:
+                logger.warning("⚠️ Segnale non eseguito sull'account %s", name, extra={"account": name})
+            else:
+                logger.info("✅ Segnale eseguito sull'account %s", name, extra={"account": name})
+        return {
+            "status": "accounts",
+            "signal_id": self.signal_id,
+            "accounts": len(results),
+            "failed": failed,
+            "results": results,
+        }
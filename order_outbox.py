@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from typing import Any, List, Optional
+
+from logging_setup import signal_context
+
+logger = logging.getLogger(__name__)
+
+# Gambe fallite per errori transitori ritentate in background da un outbox SQLite locale
+ORDER_OUTBOX = os.getenv("ORDER_OUTBOX", "true").lower() == "true"
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "order_outbox.db")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 1.0))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 60.0))
+# Un ingresso a mercato ritentato troppo tardi aprirebbe la posizione a un prezzo diverso dal segnale
+OUTBOX_ENTRY_TTL = float(os.getenv("OUTBOX_ENTRY_TTL", 30.0))
+
+# Codici Bitget transitori (timeout e sistema occupato): la richiesta può essere ripetuta
+RETRYABLE_CODES = frozenset({"40010", "40015", "429"})
+# clientOid già usato: il tentativo precedente era arrivato all'exchange
+DUPLICATE_CODES = frozenset({"40786"})
+# Metodi di BitgetClient che l'outbox può richiamare (ognuno con clientOid idempotente)
+METHODS = ("place_order", "place_tp_sl")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_oid TEXT NOT NULL UNIQUE,
+    signal_id TEXT,
+    method TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    after TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt);
+CREATE INDEX IF NOT EXISTS idx_outbox_after ON outbox (after);
+"""
+
+
+def account_outbox_path(account: str, path: str = OUTBOX_PATH) -> str:
+    """File dell'outbox di un account secondario, accanto a quello dell'account principale."""
+    if path == ":memory:":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{account}{ext}"
+
+
+class RetryableLegError(Exception):
+    """Gamba fallita per un errore transitorio: le gambe che ne dipendono non vengono inviate."""
+
+    def __init__(self, result: Any):
+        super().__init__(result.get("message") or result.get("msg") if isinstance(result, dict) else result)
+        self.result = result
+
+
+def retryable(result: Any) -> bool:
+    """
+    Errore di rete o HTTP 5xx (esito incerto) o code Bitget transitorio (429 esauriti compreso).
+    I rifiuti di Bitget (4xx con code, es. margine insufficiente) non vengono ripetuti.
+    """
+    if not isinstance(result, dict):
+        return False
+    if result.get("error") in ("RequestException", "UnexpectedError"):
+        return True
+    return result.get("code") in RETRYABLE_CODES
+
+
+def backoff(attempts: int) -> float:
+    """Attesa prima del tentativo successivo: backoff esponenziale con jitter pieno."""
+    return random.uniform(0, min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** attempts))
+
+
+class OrderOutbox:
+    """
+    Gambe in attesa di un nuovo tentativo, salvate in un file SQLite (sopravvivono al riavvio).
+    Una gamba con `after` parte solo dopo che la gamba con quel clientOid è andata a buon fine
+    (es. TP/SL dopo l'ingresso); se l'ingresso scade o fallisce le gambe dipendenti vengono annullate.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def add(self, signal_id: Optional[str], method: str, kwargs: dict, after: Optional[str] = None,
+            delay: Optional[float] = None) -> bool:
+        """Accoda una chiamata; False se il clientOid è già nell'outbox."""
+        if method not in METHODS:
+            raise ValueError(f"Metodo non ammesso nell'outbox: {method}")
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (client_oid, signal_id, method, kwargs, after, next_attempt, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kwargs["client_oid"], signal_id, method, json.dumps(kwargs), after,
+                 now + (backoff(0) if delay is None else delay), now))
+        self.wakeup.set()
+        return cursor.rowcount == 1
+
+    def due(self, limit: int = 20) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT o.* FROM outbox o LEFT JOIN outbox d ON d.client_oid = o.after"
+                " WHERE o.status = 'pending' AND o.next_attempt <= ? AND (o.after IS NULL OR d.status = 'done')"
+                " ORDER BY o.id LIMIT ?", (time.time(), limit)).fetchall()
+
+    def pending(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM outbox WHERE status = 'pending' ORDER BY id").fetchall()
+
+    def next_due_in(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def mark_done(self, client_oid: str):
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = 'done', last_error = NULL WHERE client_oid = ?",
+                               (client_oid,))
+        self.wakeup.set()  # le gambe dipendenti diventano eseguibili
+
+    def mark_retry(self, client_oid: str, attempts: int, error: str):
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE client_oid = ?",
+                               (attempts, time.time() + backoff(attempts), error[:500], client_oid))
+
+    def mark_failed(self, client_oid: str, attempts: int, error: str, status: str = "failed"):
+        """Gamba abbandonata (failed o expired) insieme alle gambe che dipendevano da lei."""
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE client_oid = ?",
+                               (status, attempts, error[:500], client_oid))
+            self._conn.execute("UPDATE outbox SET status = 'cancelled', last_error = ?"
+                               " WHERE after = ? AND status = 'pending'", (f"{status}: {client_oid}", client_oid))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class OutboxWorker:
+    """
+    Thread che ritenta le gambe dell'outbox con lo stesso clientOid: un tentativo arrivato
+    all'exchange nonostante il timeout viene rifiutato come duplicato e conta come riuscito.
+    All'avvio riconcilia le gambe rimaste in sospeso cercando il loro clientOid su Bitget.
+    """
+
+    def __init__(self, outbox: OrderOutbox, client):
+        self.outbox = outbox
+        self.client = client
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.retried = 0
+        self.recovered = 0
+        self.reconciled = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="order-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.outbox.wakeup.set()
+
+    def _run(self):
+        try:
+            self.reconcile()
+        except Exception:
+            logger.exception("❌ Riconciliazione dell'outbox all'avvio non riuscita")
+        while not self._stop.is_set():
+            self.outbox.wakeup.clear()
+            for item in self.outbox.due():
+                if self._stop.is_set():
+                    return
+                self.process(item)
+            wait = self.outbox.next_due_in()
+            self.outbox.wakeup.wait(1.0 if wait is None else min(wait, 1.0))
+
+    def reconcile(self):
+        """Gambe in sospeso già presenti su Bitget (es. processo terminato dopo l'invio): segnate come riuscite."""
+        for item in self.outbox.pending():
+            kwargs = json.loads(item["kwargs"])
+            try:
+                found = self.client.order_exists(kwargs["symbol"], item["client_oid"],
+                                                 plan=item["method"] == "place_tp_sl")
+            except Exception as e:
+                logger.warning("⚠️ Stato di %s non verificabile: %s", item["client_oid"], e,
+                               extra={"signal_id": item["signal_id"]})
+                continue
+            if found:
+                self.reconciled += 1
+                logger.info("✅ %s già presente su Bitget, rimosso dall'outbox", item["client_oid"],
+                            extra={"signal_id": item["signal_id"]})
+                self.outbox.mark_done(item["client_oid"])
+
+    def process(self, item: sqlite3.Row):
+        client_oid, attempts = item["client_oid"], item["attempts"] + 1
+        with signal_context(item["signal_id"]):
+            if item["method"] == "place_order" and time.time() - item["created_at"] > OUTBOX_ENTRY_TTL:
+                logger.error("❌ Ingresso %s non eseguito entro %ss: abbandonato", client_oid, OUTBOX_ENTRY_TTL)
+                self.outbox.mark_failed(client_oid, attempts - 1, "entry expired", status="expired")
+                return
+            self.retried += 1
+            result = getattr(self.client, item["method"])(signal_id=item["signal_id"], **json.loads(item["kwargs"]))
+            code = result.get("code") if isinstance(result, dict) else None
+            if code == "00000" or code in DUPLICATE_CODES:
+                self.recovered += 1
+                logger.info("✅ Gamba %s eseguita al tentativo %s", client_oid, attempts)
+                self.outbox.mark_done(client_oid)
+            elif retryable(result) and attempts < OUTBOX_MAX_ATTEMPTS:
+                self.outbox.mark_retry(client_oid, attempts, json.dumps(result, default=str))
+            else:
+                logger.error("❌ Gamba %s abbandonata dopo %s tentativi: %s", client_oid, attempts, result)
+                self.outbox.mark_failed(client_oid, attempts, json.dumps(result, default=str))
+
+    def stats(self) -> dict:
+        return dict(self.outbox.stats(), retried=self.retried, recovered=self.recovered, reconciled=self.reconciled)
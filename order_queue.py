@@ -0,0 +1,287 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from keyed_executor import KeyedExecutor, LaneFull, LANE_MAX_DEPTH
+
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", 8))
+STATUS_HISTORY = 1000
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["OrderDispatcher", "AsyncOrderDispatcher", "LaneFull"]
+
+
+class _SignalStatus:
+    """Stato degli ultimi STATUS_HISTORY segnali accodati (queued, running, done, error, rejected)."""
+
+    def _init_status(self):
+        self._status = OrderedDict()  # signal_id -> stato, solo gli ultimi STATUS_HISTORY
+        self._status_lock = threading.Lock()
+
+    def _set_status(self, signal_id: str, status: str):
+        with self._status_lock:
+            self._status[signal_id] = status
+            self._status.move_to_end(signal_id)
+            while len(self._status) > STATUS_HISTORY:
+                self._status.popitem(last=False)
+
+    def status(self, signal_id: str) -> Optional[str]:
+        with self._status_lock:
+            return self._status.get(signal_id)
+
+
+def _error_result(signal_id: str, e: Exception) -> dict:
+    logger.exception("❌ Errore durante l'esecuzione del segnale %s: %s", signal_id, e, extra={"signal_id": signal_id})
+    return {"status": "error", "signal_id": signal_id, "error": type(e).__name__, "message": str(e)}
+
+
+class OrderDispatcher(_SignalStatus):
+    """
+    Esegue gli ordini ricevuti dal webhook su un KeyedExecutor con una corsia per symbol:
+    un OPEN e un successivo CLOSE sullo stesso ticker vengono eseguiti nell'ordine di arrivo,
+    mentre symbol diversi procedono in parallelo. Se la corsia è piena viene sollevato LaneFull.
+    """
+
+    def __init__(self, handler: Callable[[Any, str], Any], workers: int = ORDER_WORKERS,
+                 max_depth: int = LANE_MAX_DEPTH, on_done: Optional[Callable[[str, Any], None]] = None):
+        self.handler = handler
+        self.on_done = on_done
+        self.executor = KeyedExecutor(workers, max_depth, thread_name_prefix="order-worker")
+        self._init_status()
+
+    def execute(self, symbol: str, order: Any, signal_id: str):
+        """Esegue l'ordine nella corsia del symbol e attende il risultato (modalità sincrona)."""
+        return self.executor.submit(symbol, self.handler, order, signal_id).result()
+
+    def submit(self, symbol: str, order: Any, signal_id: str):
+        """Accoda l'ordine nella corsia del symbol; il risultato viene passato a on_done."""
+        self._set_status(signal_id, "queued")
+        try:
+            self.executor.submit(symbol, self._run, order, signal_id)
+        except LaneFull:
+            self._set_status(signal_id, "rejected")
+            raise
+
+    def _call(self, order: Any, signal_id: str):
+        try:
+            return self.handler(order, signal_id)
+        except Exception as e:
+            return _error_result(signal_id, e)
+
+    def _submit_group(self, jobs: List[Tuple[str, Any]], signal_id: str) -> List[Future]:
+        futures = []
+        for symbol, order in jobs:
+            try:
+                futures.append(self.executor.submit(symbol, self._call, order, signal_id))
+            except LaneFull as e:
+                # Una corsia piena rifiuta solo la sua gamba, non l'intero gruppo
+                rejected = Future()
+                rejected.set_result({"status": "rejected", "signal_id": signal_id, "message": str(e)})
+                futures.append(rejected)
+        return futures
+
+    def execute_group(self, jobs: List[Tuple[str, Any]], signal_id: str) -> List[Any]:
+        """
+        Esegue più ordini dello stesso segnale (es. basket) ciascuno nella corsia del proprio symbol,
+        in parallelo, e attende tutti i risultati (nell'ordine di `jobs`).
+        """
+        return [future.result() for future in self._submit_group(jobs, signal_id)]
+
+    def submit_group(self, jobs: List[Tuple[str, Any]], signal_id: str,
+                     aggregate: Optional[Callable[[List[Any]], Any]] = None):
+        """
+        Versione asincrona di execute_group: nessun thread resta in attesa, on_done riceve
+        aggregate(risultati) quando termina l'ultima gamba.
+        """
+        self._set_status(signal_id, "queued")
+        futures = self._submit_group(jobs, signal_id)
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        context = contextvars.copy_context()
+
+        def finish():
+            results = [future.result() for future in futures]
+            result = aggregate(results) if aggregate else results
+            try:
+                if self.on_done:
+                    self.on_done(signal_id, result)
+            finally:
+                self._set_status(signal_id, "done")
+
+        def on_leg_done(_):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                context.run(finish)
+
+        for future in futures:
+            future.add_done_callback(on_leg_done)
+
+    def _run(self, order: Any, signal_id: str):
+        self._set_status(signal_id, "running")
+        try:
+            result = self.handler(order, signal_id)
+            status = "done"
+        except Exception as e:
+            result = _error_result(signal_id, e)
+            status = "error"
+        try:
+            if self.on_done:
+                self.on_done(signal_id, result)
+        finally:
+            self._set_status(signal_id, status)
+        return result
+
+    def stats(self) -> dict:
+        return self.executor.stats()
+
+
+class _AsyncLane:
+    __slots__ = ("lock", "depth", "processed", "wait_total", "wait_max", "oldest")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # FIFO: i task acquisiscono il lock nell'ordine di invio
+        self.depth = 0
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.oldest = []  # istanti di accodamento dei job in corsia
+
+
+class AsyncOrderDispatcher(_SignalStatus):
+    """
+    OrderDispatcher per l'event loop del server ASGI: stesse corsie per symbol (ordine di
+    arrivo sullo stesso ticker, LaneFull oltre max_depth) e stessi stati per /signal, ma
+    ogni ordine è un task asyncio invece di un job del pool di thread. handler e on_done
+    sono coroutine.
+    """
+
+    def __init__(self, handler: Callable[[Any, str], Any], max_depth: int = LANE_MAX_DEPTH,
+                 on_done: Optional[Callable[[str, Any], Any]] = None):
+        self.handler = handler
+        self.on_done = on_done
+        self.max_depth = max_depth
+        self.rejected = 0
+        self._lanes = {}
+        self._tasks = set()  # riferimenti ai task in volo (il loop ne tiene solo di deboli)
+        self._init_status()
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        # Il task copia il contesto del chiamante (signal_id per i log, traccia del segnale)
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _schedule(self, symbol: str, fn: Callable, *args) -> asyncio.Task:
+        lane = self._lanes.get(symbol)
+        if lane is None:
+            lane = self._lanes[symbol] = _AsyncLane()
+        if lane.depth >= self.max_depth:
+            self.rejected += 1
+            raise LaneFull(f"Coda piena per {symbol} ({self.max_depth} job)")
+        lane.depth += 1
+        enqueued_at = time.monotonic()
+        lane.oldest.append(enqueued_at)
+        return self._spawn(self._in_lane(lane, enqueued_at, fn, *args))
+
+    async def _in_lane(self, lane: _AsyncLane, enqueued_at: float, fn: Callable, *args):
+        try:
+            async with lane.lock:
+                lane.oldest.remove(enqueued_at)
+                wait = time.monotonic() - enqueued_at
+                lane.wait_total += wait
+                lane.wait_max = max(lane.wait_max, wait)
+                return await fn(*args)
+        finally:
+            lane.depth -= 1
+            lane.processed += 1
+
+    async def execute(self, symbol: str, order: Any, signal_id: str):
+        """Esegue l'ordine nella corsia del symbol e ne attende il risultato."""
+        # shield: un client che chiude la connessione non interrompe un ordine già partito
+        return await asyncio.shield(self._schedule(symbol, self.handler, order, signal_id))
+
+    def submit(self, symbol: str, order: Any, signal_id: str):
+        """Accoda l'ordine nella corsia del symbol; il risultato viene passato a on_done."""
+        self._set_status(signal_id, "queued")
+        try:
+            self._schedule(symbol, self._run, order, signal_id)
+        except LaneFull:
+            self._set_status(signal_id, "rejected")
+            raise
+
+    async def _call(self, order: Any, signal_id: str):
+        try:
+            return await self.handler(order, signal_id)
+        except Exception as e:
+            return _error_result(signal_id, e)
+
+    def _submit_group(self, jobs: List[Tuple[str, Any]], signal_id: str) -> List[asyncio.Future]:
+        futures = []
+        for symbol, order in jobs:
+            try:
+                futures.append(self._schedule(symbol, self._call, order, signal_id))
+            except LaneFull as e:
+                # Una corsia piena rifiuta solo la sua gamba, non l'intero gruppo
+                rejected = asyncio.get_running_loop().create_future()
+                rejected.set_result({"status": "rejected", "signal_id": signal_id, "message": str(e)})
+                futures.append(rejected)
+        return futures
+
+    async def execute_group(self, jobs: List[Tuple[str, Any]], signal_id: str) -> List[Any]:
+        """Blocchi dello stesso segnale in parallelo, ciascuno nella propria corsia (ordine di `jobs`)."""
+        return list(await asyncio.shield(asyncio.gather(*self._submit_group(jobs, signal_id))))
+
+    def submit_group(self, jobs: List[Tuple[str, Any]], signal_id: str,
+                     aggregate: Optional[Callable[[List[Any]], Any]] = None):
+        """Versione asincrona di execute_group: on_done riceve aggregate(risultati) a gruppo concluso."""
+        self._set_status(signal_id, "queued")
+        futures = self._submit_group(jobs, signal_id)
+
+        async def finish():
+            results = list(await asyncio.gather(*futures))
+            result = aggregate(results) if aggregate else results
+            try:
+                if self.on_done:
+                    await self.on_done(signal_id, result)
+            finally:
+                self._set_status(signal_id, "done")
+
+        self._spawn(finish())
+
+    async def _run(self, order: Any, signal_id: str):
+        self._set_status(signal_id, "running")
+        try:
+            result = await self.handler(order, signal_id)
+            status = "done"
+        except Exception as e:
+            result = _error_result(signal_id, e)
+            status = "error"
+        try:
+            if self.on_done:
+                await self.on_done(signal_id, result)
+        finally:
+            self._set_status(signal_id, status)
+        return result
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        lanes = {}
+        for key, lane in self._lanes.items():
+            lanes[str(key)] = {
+                "depth": lane.depth,
+                "lag_ms": round((now - lane.oldest[0]) * 1000, 3) if lane.oldest else 0.0,
+                "processed": lane.processed,
+                "avg_wait_ms": round(lane.wait_total / lane.processed * 1000, 3) if lane.processed else 0.0,
+                "max_wait_ms": round(lane.wait_max * 1000, 3),
+            }
+        return {"max_depth": self.max_depth, "rejected": self.rejected, "lanes": lanes}
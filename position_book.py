@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import logging
+import threading
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Riconciliazione periodica con /position/all-position (0 = disattivata: i CLOSE vanno sempre all'exchange)
+POSITION_RECONCILE_SECONDS = float(os.getenv("POSITION_RECONCILE_SECONDS", 30))
+# Oltre questa età senza riconciliazione il book non basta per saltare un CLOSE
+POSITION_MAX_AGE_SECONDS = float(os.getenv("POSITION_MAX_AGE_SECONDS", max(3 * POSITION_RECONCILE_SECONDS, 60)))
+POSITION_STREAM = os.getenv("BITGET_POSITION_STREAM", "false").lower() == "true"
+# CLOSE su un symbol flat risolto senza chiamare Bitget. Solo con un unico processo: il book è
+# locale al worker, quindi una posizione aperta da un altro worker (o a mano) non sarebbe chiusa
+POSITION_SKIP_FLAT_CLOSE = os.getenv("POSITION_SKIP_FLAT_CLOSE", "false").lower() == "true"
+WS_PRIVATE_URL = os.getenv("BITGET_WS_PRIVATE_URL", "wss://ws.bitget.com/v2/ws/private")
+WS_PING_SECONDS = 25  # Bitget chiude la connessione senza un "ping" entro 30 s
+
+
+def _size(value) -> Decimal:
+    try:
+        return abs(Decimal(str(value)))
+    except (InvalidOperation, TypeError):
+        return Decimal(0)
+
+
+def hold_side_of(side: str) -> str:
+    return "long" if side == "buy" else "short"
+
+
+class PositionBook:
+    """
+    Posizioni aperte per (symbol, holdSide), aggiornate dai nostri ordini eseguiti e
+    riconciliate con Bitget (polling REST ed eventualmente lo stream privato "positions").
+    Un symbol è flat solo se il book è stato sincronizzato di recente e nessuna chiamata
+    sul symbol è finita in errore dopo l'ultima sincronizzazione: nel dubbio il CLOSE
+    viene comunque inviato all'exchange. Senza `skip_flat` (default) il CLOSE esce sempre.
+    """
+
+    def __init__(self, fetch: Optional[Callable[[], List[dict]]] = None,
+                 refresh_seconds: float = POSITION_RECONCILE_SECONDS, max_age: float = POSITION_MAX_AGE_SECONDS,
+                 skip_flat: bool = POSITION_SKIP_FLAT_CLOSE):
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age
+        self.skip_flat = skip_flat
+        self._sizes: Dict[Tuple[str, str], Decimal] = {}
+        self._touched: Dict[str, float] = {}  # symbol -> monotonic dell'ultima modifica locale
+        self._dirty = set()  # symbol con stato incerto fino alla prossima sincronizzazione
+        self.synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reconciles = 0
+        self.reconcile_errors = 0
+        self.drifts = 0
+        self.flat_skips = 0
+
+    # --- lettura ---
+
+    def size(self, symbol: str, hold_side: str) -> Decimal:
+        with self._lock:
+            return self._sizes.get((symbol, hold_side), Decimal(0))
+
+    def is_flat(self, symbol: str) -> bool:
+        """True solo se il book è affidabile per il symbol e non ci sono posizioni aperte."""
+        with self._lock:
+            if self.synced_at is None or time.monotonic() - self.synced_at > self.max_age:
+                return False
+            if symbol in self._dirty:
+                return False
+            return not any(key[0] == symbol for key in self._sizes)
+
+    def skip_close(self, symbol: str) -> bool:
+        """Come is_flat se POSITION_SKIP_FLAT_CLOSE è attivo (altrimenti False), contando i CLOSE evitati."""
+        flat = self.skip_flat and self.is_flat(symbol)
+        if flat:
+            self.flat_skips += 1
+        return flat
+
+    # --- aggiornamenti dai nostri ordini ---
+
+    def _set(self, key: Tuple[str, str], size: Decimal):
+        if size > 0:
+            self._sizes[key] = size
+        else:
+            self._sizes.pop(key, None)
+
+    def apply_fill(self, symbol: str, side: str, trade_side: str, size):
+        """Ordine a mercato accettato da Bitget: apre (o riduce) la posizione del lato."""
+        key = (symbol, hold_side_of(side))
+        delta = _size(size)
+        with self._lock:
+            current = self._sizes.get(key, Decimal(0))
+            self._set(key, current + delta if trade_side == "open" else current - delta)
+            self._touched[symbol] = time.monotonic()
+
+    def mark_closed(self, symbol: str):
+        with self._lock:
+            for key in [key for key in self._sizes if key[0] == symbol]:
+                del self._sizes[key]
+            self._touched[symbol] = time.monotonic()
+
+    def invalidate(self, symbol: Optional[str]):
+        """Esito incerto di una chiamata (errore o timeout): il symbol non è flat fino alla riconciliazione."""
+        if not symbol:
+            return
+        with self._lock:
+            self._dirty.add(symbol)
+            self._touched[symbol] = time.monotonic()
+
+    # --- riconciliazione ---
+
+    def replace(self, positions: Iterable[Tuple[str, str, Decimal]], as_of: float):
+        """
+        Sostituisce il book con lo snapshot dell'exchange richiesto all'istante `as_of` (monotonic).
+        I symbol modificati localmente dopo `as_of` mantengono lo stato locale: lo snapshot
+        potrebbe non contenere ancora l'ultimo ordine.
+        """
+        snapshot = {}
+        for symbol, hold_side, size in positions:
+            if size > 0:
+                snapshot[(symbol, hold_side)] = size
+        with self._lock:
+            recent = {symbol for symbol, touched in self._touched.items() if touched > as_of}
+            for key in set(self._sizes) | set(snapshot):
+                if key[0] in recent:
+                    continue
+                if self._sizes.get(key) != snapshot.get(key):
+                    self.drifts += 1
+                    logger.info("🔄 Posizione %s %s riallineata: %s -> %s", key[0], key[1],
+                                self._sizes.get(key, 0), snapshot.get(key, 0))
+                    self._set(key, snapshot.get(key, Decimal(0)))
+            self._dirty &= recent
+            self._touched = {symbol: touched for symbol, touched in self._touched.items() if symbol in recent}
+            self.synced_at = as_of
+
+    def reconcile(self) -> bool:
+        """Legge le posizioni aperte da Bitget; in caso di errore il book resta com'è (e invecchia)."""
+        as_of = time.monotonic()
+        try:
+            items = self.fetch()
+        except Exception as e:
+            self.reconcile_errors += 1
+            logger.warning("⚠️ Riconciliazione delle posizioni non riuscita: %s", e)
+            return False
+        self.replace(((item["symbol"], item["holdSide"], _size(item.get("total"))) for item in items), as_of)
+        self.reconciles += 1
+        return True
+
+    def start(self):
+        """Avvia il thread di riconciliazione (idempotente)."""
+        with self._lock:
+            if self._thread is not None or self.fetch is None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="positions-reconcile", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.reconcile()
+            self._stop.wait(self.refresh_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": {f"{symbol}:{side}": str(size) for (symbol, side), size in self._sizes.items()},
+                "uncertain": sorted(self._dirty),
+                "age_seconds": round(time.monotonic() - self.synced_at, 1) if self.synced_at is not None else None,
+                "reconciles": self.reconciles,
+                "reconcile_errors": self.reconcile_errors,
+                "drifts": self.drifts,
+                "close_calls_avoided": self.flat_skips,
+            }
+
+
+class _WebSocket:
+    """Connessione websocket-client con recv() che restituisce None allo scadere del timeout."""
+
+    def __init__(self, ws, timeout_error):
+        self.ws = ws
+        self.timeout_error = timeout_error
+
+    def send(self, message: str):
+        self.ws.send(message)
+
+    def recv(self) -> Optional[str]:
+        try:
+            return self.ws.recv()
+        except self.timeout_error:
+            return None
+
+    def close(self):
+        self.ws.close()
+
+
+def websocket_connect(url: str, timeout: float):
+    import websocket  # websocket-client, dipendenza opzionale (solo con BITGET_POSITION_STREAM=true)
+    return _WebSocket(websocket.create_connection(url, timeout=timeout), websocket.WebSocketTimeoutException)
+
+
+class PositionStream:
+    """
+    Canale privato "positions" del WebSocket Bitget: ogni push contiene lo snapshot completo
+    delle posizioni e aggiorna il book senza attendere il polling. `connect(url, timeout)`
+    restituisce un oggetto con send/recv/close (recv -> None se non arriva nulla), quindi
+    il simulatore locale può sostituire l'exchange.
+    """
+
+    def __init__(self, book: PositionBook, signer, url: str = WS_PRIVATE_URL, connect=None,
+                 product_type: str = "USDT-FUTURES"):
+        self.book = book
+        self.signer = signer
+        self.url = url
+        self.connect = connect or websocket_connect
+        self.product_type = product_type
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.messages = 0
+        self.reconnects = 0
+
+    def login_message(self) -> str:
+        return json.dumps({"op": "login", "args": [self.signer.login_args()]})
+
+    def subscribe_message(self) -> str:
+        return json.dumps({"op": "subscribe", "args": [
+            {"instType": self.product_type, "channel": "positions", "instId": "default"}]})
+
+    def handle(self, message: str, as_of: Optional[float] = None) -> bool:
+        """Applica un messaggio dello stream; True se era uno snapshot delle posizioni."""
+        if message == "pong":
+            return False
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return False
+        if data.get("event") == "error":
+            raise ConnectionError(f"Stream posizioni: code={data.get('code')} msg={data.get('msg')}")
+        if (data.get("arg") or {}).get("channel") != "positions" or "data" not in data:
+            return False
+        self.messages += 1
+        self.book.replace(((item["instId"], item["holdSide"], _size(item.get("total")))
+                           for item in data["data"] or []),
+                          as_of if as_of is not None else time.monotonic())
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="positions-stream", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._session()
+                backoff = 1.0
+            except Exception as e:
+                logger.warning("⚠️ Stream delle posizioni interrotto: %s", e)
+            self.connected = False
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, 60.0)
+            self.reconnects += 1
+
+    def _session(self):
+        ws = self.connect(self.url, timeout=WS_PING_SECONDS)
+        try:
+            ws.send(self.login_message())
+            ws.send(self.subscribe_message())
+            self.connected = True
+            last_ping = time.monotonic()
+            while not self._stop.is_set():
+                if time.monotonic() - last_ping >= WS_PING_SECONDS:
+                    ws.send("ping")
+                    last_ping = time.monotonic()
+                message = ws.recv()
+                if message is not None:
+                    self.handle(message)
+        finally:
+            ws.close()
+
+    def stats(self) -> dict:
+        return {"connected": self.connected, "messages": self.messages, "reconnects": self.reconnects}
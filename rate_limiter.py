@@ -0,0 +1,191 @@
+import os
+import json
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+PRIORITY_ENTRY = 0   # leva, ordine di ingresso, chiusura
+PRIORITY_PLAN = 1    # gambe TP/SL
+
+# Limiti Bitget per UID (richieste/secondo) sugli endpoint usati dal client
+DEFAULT_LIMITS: Dict[str, float] = {
+    "/api/v2/mix/account/set-leverage": 5,
+    "/api/v2/mix/order/place-order": 10,
+    "/api/v2/mix/order/place-tpsl-order": 10,
+    "/api/v2/mix/order/place-pos-tpsl": 10,
+    "/api/v2/mix/order/close-positions": 1,
+    "/api/v2/mix/order/cancel-plan-order": 10,
+    "/api/v2/mix/position/all-position": 5,
+    "/api/v2/mix/order/detail": 10,
+    "/api/v2/mix/order/orders-plan-pending": 10,
+}
+DEFAULT_RATE = float(os.getenv("BITGET_DEFAULT_RATE", 10))
+# Limite complessivo facoltativo su tutte le chiamate private (0 = disattivato): Bitget applica
+# solo i limiti per endpoint e UID, un tetto comune ridurrebbe il throughput nei picchi di alert
+GLOBAL_RATE = float(os.getenv("BITGET_GLOBAL_RATE", 0))
+
+
+def _configured_limits() -> Dict[str, float]:
+    limits = dict(DEFAULT_LIMITS)
+    override = os.getenv("BITGET_RATE_LIMITS")  # es. {"/api/v2/mix/order/place-order": 20}
+    if override:
+        limits.update({path: float(rate) for path, rate in json.loads(override).items()})
+    return limits
+
+
+class PriorityTokenBucket:
+    """
+    Token bucket condiviso tra thread. I chiamanti in attesa sono serviti per priorità
+    (valore più basso prima) e, a parità, in ordine di arrivo.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []  # heap di (priorità, sequenza)
+        self._seq = itertools.count()
+        self.acquired = 0
+        self.waited = 0
+        self.delay_total = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority: int = PRIORITY_ENTRY) -> float:
+        """Attende un token e restituisce il tempo passato in coda (secondi)."""
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiters[0] == ticket and now >= self.paused_until and self.tokens >= 1:
+                    heapq.heappop(self._waiters)
+                    self.tokens -= 1
+                    break
+                if self._waiters[0] != ticket:
+                    wait = None  # risvegliati quando il primo della coda prende il token
+                elif now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    wait = (1 - self.tokens) / self.rate
+                self._cond.wait(wait)
+            delay = time.monotonic() - start
+            self.acquired += 1
+            if delay > 0.001:
+                self.waited += 1
+            self.delay_total += delay
+            self._cond.notify_all()
+        return delay
+
+    def reserve(self, priority: int = PRIORITY_ENTRY) -> float:
+        """
+        Prenota subito un token senza attendere e restituisce dopo quanti secondi usarlo
+        (per il client asincrono, che attende con asyncio.sleep invece di bloccare il thread).
+        I token possono andare in negativo: chi arriva dopo, thread o coroutine, attende di più.
+        Le prenotazioni sono servite in ordine di arrivo, senza la precedenza degli ingressi.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(0.0, self.paused_until - now)
+            if self.tokens < 1 or self._waiters:
+                delay = max(delay, (1 - self.tokens) / self.rate)
+            self.tokens -= 1
+            self.acquired += 1
+            if delay > 0.001:
+                self.waited += 1
+            self.delay_total += delay
+        return delay
+
+    def pause(self, seconds: float):
+        """Blocca il bucket (es. dopo un 429) e azzera i token disponibili."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "acquired": self.acquired,
+                "queued": self.waited,
+                "waiting": len(self._waiters),
+                "avg_delay_ms": round(self.delay_total / self.acquired * 1000, 3) if self.acquired else 0.0,
+            }
+
+
+class EndpointRateLimiter:
+    """
+    Un PriorityTokenBucket per path, creato al primo uso e condiviso tra tutti i thread del client,
+    più un bucket globale facoltativo comune a tutti gli endpoint (global_rate > 0).
+    """
+
+    def __init__(self, limits: Optional[Dict[str, float]] = None, default_rate: float = DEFAULT_RATE,
+                 global_rate: float = GLOBAL_RATE):
+        self.limits = limits if limits is not None else _configured_limits()
+        self.default_rate = default_rate
+        self.global_bucket = PriorityTokenBucket(global_rate) if global_rate > 0 else None
+        self._buckets: Dict[str, PriorityTokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, path: str) -> PriorityTokenBucket:
+        bucket = self._buckets.get(path)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(path)
+                if bucket is None:
+                    bucket = self._buckets[path] = PriorityTokenBucket(self.limits.get(path, self.default_rate))
+        return bucket
+
+    def acquire(self, path: str, priority: int = PRIORITY_ENTRY) -> float:
+        delay = self.bucket(path).acquire(priority)
+        if self.global_bucket is not None:
+            delay += self.global_bucket.acquire(priority)
+        return delay
+
+    async def acquire_async(self, path: str, priority: int = PRIORITY_ENTRY) -> float:
+        """Come acquire, ma l'attesa non occupa il thread: il loop serve altri segnali nel frattempo."""
+        delay = self.bucket(path).reserve(priority)
+        if self.global_bucket is not None:
+            delay = max(delay, self.global_bucket.reserve(priority))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def penalize(self, path: str, seconds: float = 1.0):
+        self.bucket(path).pause(seconds)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        stats = {path: bucket.stats() for path, bucket in buckets.items()}
+        if self.global_bucket is not None:
+            stats["*"] = self.global_bucket.stats()
+        return stats
+
+
+def retry_after(response, data=None, default: float = 1.0) -> Tuple[bool, float]:
+    """
+    Indica se la risposta è un rate limit (HTTP 429 o code "429") e quanto attendere.
+    `data` è il corpo JSON già letto dal chiamante, che lo riusa per l'esito della chiamata.
+    """
+    if response is None:
+        return False, 0.0
+    limited = response.status_code == 429 or (isinstance(data, dict) and str(data.get("code")) == "429")
+    if not limited:
+        return False, 0.0
+    try:
+        return True, float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return True, default
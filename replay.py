@@ -0,0 +1,431 @@
+"""
+Replay offline degli alert storici attraverso la pipeline del webhook.
+
+Legge i corpi dei webhook da request_log (a blocchi per id, memoria costante) o da un export
+JSONL, li parsifica in parallelo in un pool di processi (process_order_request,
+parse_signal_string, parse_basket) e li esegue in ordine con plan_order / place_order contro
+un BitgetClient simulato in-process (nessuna chiamata HTTP né scrittura su DB).
+Il report riporta alert non parsificabili, ordini rifiutati dalla validazione locale,
+gambe rifiutate dal simulatore e tempi per fase.
+
+    python replay.py --since 2024-01-01 --until 2024-04-01
+    python replay.py --jsonl request_log.jsonl --workers 4 --json
+    python replay.py --jsonl alerts.jsonl --parse-only --contracts contracts_cache.json
+
+Il JSONL accetta una riga per alert con il campo "text" (corpo del webhook) oppure
+"request" (export di request_log), come benchmarks/load_test.py.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+SELECT_QUERY = """
+    SELECT id_request, request
+    FROM request_log
+    WHERE id_request > %s AND request_time >= %s AND request_time < %s
+    ORDER BY id_request
+    LIMIT %s
+"""
+
+TIMING_SAMPLE = 10000  # campioni per fase usati per i percentili (memoria costante)
+EXAMPLES = 3  # id di esempio per ogni motivo di errore nel report
+
+
+class StoredRequest:
+    """Corpo di un webhook salvato, con la stessa interfaccia usata da process_order_request."""
+
+    def __init__(self, body: Any):
+        self.body = body
+
+    def get_json(self):
+        return self.body
+
+
+class StageTimer:
+    """Durate di una fase: conteggio, media e massimo esatti, percentili da un campione a dimensione fissa."""
+
+    def __init__(self, sample_size: int = TIMING_SAMPLE, seed: int = 0):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample: List[float] = []
+        self.sample_size = sample_size
+        self._random = random.Random(seed)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if len(self.sample) < self.sample_size:
+            self.sample.append(ms)
+        else:
+            slot = self._random.randrange(self.count)
+            if slot < self.sample_size:
+                self.sample[slot] = ms
+
+    def summary(self) -> dict:
+        values = sorted(self.sample)
+
+        def pct(p):
+            return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))], 3) if values else 0.0
+
+        return {"count": self.count, "total_s": round(self.total / 1000, 3),
+                "mean_ms": round(self.total / self.count, 4) if self.count else 0.0,
+                "p50_ms": pct(50), "p99_ms": pct(99), "max_ms": round(self.max, 3)}
+
+
+class Reasons:
+    """Conteggio per motivo con qualche id di esempio."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.examples = {}
+
+    def add(self, reason: str, row_id: Any):
+        self.counts[reason] += 1
+        examples = self.examples.setdefault(reason, [])
+        if len(examples) < EXAMPLES:
+            examples.append(row_id)
+
+    def summary(self, top: int = 20) -> List[dict]:
+        return [{"reason": reason, "count": count, "examples": self.examples[reason]}
+                for reason, count in self.counts.most_common(top)]
+
+
+# --- sorgenti (generatori: una riga alla volta) ---
+
+def _request_body(value: Any) -> Any:
+    """request_log.request contiene il corpo JSON serializzato (a volte due volte)."""
+    for _ in range(2):
+        if not isinstance(value, (str, bytes)):
+            break
+        try:
+            value = json.loads(value)
+        except ValueError:
+            break
+    return value
+
+
+def rows_from_jsonl(path: str) -> Iterator[Tuple[Any, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, None
+                continue
+            if isinstance(record, dict) and "text" not in record and "request" in record:
+                yield record.get("id_request", number), _request_body(record["request"])
+            else:
+                yield number, record
+
+
+def rows_from_db(since: datetime, until: datetime, batch_size: int) -> Iterator[Tuple[Any, Any]]:
+    """Righe di request_log in ordine di id, lette a blocchi (keyset) senza caricare la tabella."""
+    from storage import get_backend
+    backend = get_backend()
+    last_id = 0
+    while True:
+        with backend.get_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(SELECT_QUERY, (last_id, since, until, batch_size))
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row["id_request"], _request_body(row["request"])
+        last_id = rows[-1]["id_request"]
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- fase di parsing (processi del pool) ---
+
+def parse_chunk(rows: List[Tuple[Any, Any]]) -> List[dict]:
+    """Parsifica un blocco di alert; ogni elemento riporta esito e tempi della fase."""
+    from Order import process_order_request
+    from utils import parse_signal_string
+    from basket import parse_basket
+
+    parsed = []
+    for row_id, body in rows:
+        item = {"id": row_id}
+        start = time.perf_counter()
+        try:
+            if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+                raise ValueError("Corpo del webhook senza campo text")
+            order = process_order_request(StoredRequest(body))
+            item["order"] = order
+            item["basket"] = parse_basket(body["text"], order.order_type)
+            if order.order_type == "OPEN" and not item["basket"]:
+                item["msg"] = parse_signal_string(order.message or "")
+        except Exception as e:
+            item["error"] = f"{type(e).__name__}: {e}"
+        item["parse_ms"] = (time.perf_counter() - start) * 1000
+        parsed.append(item)
+    return parsed
+
+
+def parse_all(chunks: Iterable[list], workers: int, in_flight: int) -> Iterator[dict]:
+    """
+    Risultati del parsing nello stesso ordine delle righe. Al massimo `in_flight` blocchi
+    sono in lavorazione o in attesa di essere consumati: la memoria non cresce con lo storico.
+    """
+    if workers <= 0:
+        for chunk in chunks:
+            yield from parse_chunk(chunk)
+        return
+    # spawn: i processi non ereditano i thread (log, pool HTTP) del processo principale
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk))
+            if len(pending) >= in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# --- fase di esecuzione (processo principale, in ordine) ---
+
+def _replay_environment(storage_from_db: bool):
+    """
+    Variabili lette all'import dei moduli del webhook: niente thread di background, outbox né warmup.
+    Per questo i moduli del webhook vengono importati solo dopo, dentro le funzioni.
+    """
+    defaults = {
+        "BITGET_WARMUP": "false",
+        "ASYNC_ORDERS": "false",
+        "ORDER_OUTBOX": "false",
+        "CONTRACTS_REFRESH_SECONDS": "0",
+        "POSITION_RECONCILE_SECONDS": "0",
+        "BITGET_POSITION_STREAM": "false",
+        "TRACE_SIGNALS": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    if not storage_from_db:
+        defaults.update({"STORAGE_BACKEND": "sqlite", "SQLITE_PATH": ":memory:"})
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+def replay_client(contracts_path: Optional[str]):
+    """BitgetClient che invia i payload direttamente al simulatore, senza HTTP, firma né DB."""
+    from bitget_client import BitgetClient
+    from bitget_simulator import BitgetSimulator
+    from contracts import ContractCache
+    from position_book import PositionBook
+
+    class ReplayClient(BitgetClient):
+        def __init__(self):
+            super().__init__(db_service=_NullDatabase())
+            self.sim = BitgetSimulator(latency_ms=0, jitter_ms=0)
+            self.calls = Counter()
+            self.rejected = Counter()
+            # Book affidabile per tutto il replay: con POSITION_SKIP_FLAT_CLOSE i CLOSE su symbol flat non escono
+            self.positions = PositionBook(max_age=float("inf"))
+            self.positions.replace([], time.monotonic())
+            if contracts_path:
+                self.contracts = ContractCache(None, path=contracts_path)
+
+        def _send(self, path, payload, signal_id=None, priority=None, split=None):
+            endpoint = path.rsplit("/", 1)[-1]
+            self.calls[endpoint] += 1
+            _, response_data, _ = self.sim.handle(path, payload)
+            legs = split(payload, response_data) if split else [(payload, response_data)]
+            for _, result in legs:
+                if result.get("code") != "00000":
+                    self.rejected[f"{endpoint} {result.get('code')} {result.get('msg')}"] += 1
+            return response_data
+
+    return ReplayClient()
+
+
+class _NullDatabase:
+    """Il replay non scrive su request_log né su api_requests."""
+
+    def log_outgoing_api(self, *args, **kwargs):
+        return None
+
+
+def _failed_legs(result: Any) -> List[str]:
+    """Gambe di un risultato di execute_position con errore o code Bitget diverso da 00000."""
+    if not isinstance(result, dict):
+        return ["signal"]
+    legs = {name: result.get(name) for name in ("leverage", "order", "stopLoss") if name in result}
+    legs.update(result.get("takeProfit") or {})
+    return [name for name, leg in legs.items()
+            if not isinstance(leg, dict) or "error" in leg or leg.get("code", "00000") != "00000"]
+
+
+def run(rows: Iterable[Tuple[Any, Any]], workers: int, chunk_size: int, in_flight: int,
+        execute: bool, contracts_path: Optional[str]) -> dict:
+    from signal_dedup import SignalDeduplicator, fingerprint, signal_id_for
+
+    stages = {name: StageTimer() for name in ("parse", "plan", "execute")}
+    parse_failures, invalid, errors = Reasons(), Reasons(), Reasons()
+    order_types, failed_legs = Counter(), Counter()
+    totals = Counter()
+    dedup = SignalDeduplicator()
+
+    app = client = None
+    if execute:
+        import services
+        client = replay_client(contracts_path)
+        services.set_client(client)
+        import app
+
+    started = time.perf_counter()
+    for item in parse_all(chunked(rows, chunk_size), workers, in_flight):
+        totals["alerts"] += 1
+        stages["parse"].add(item["parse_ms"])
+        if "error" in item:
+            parse_failures.add(item["error"], item["id"])
+            continue
+        order, basket = item["order"], item["basket"]
+        kind = "BASKET" if basket else order.order_type or "UNKNOWN"
+        order_types[kind] += 1
+        if kind == "UNKNOWN":
+            parse_failures.add("Tipo di ordine non riconosciuto", item["id"])
+            continue
+        fp = fingerprint(order)
+        signal_id = signal_id_for(fp)
+        if dedup.register(fp, signal_id):
+            totals["duplicates"] += 1
+            continue
+        if not execute:
+            continue
+
+        try:
+            start = time.perf_counter()
+            if basket:
+                plans = []
+                for leg in basket:
+                    try:
+                        leg.plan = app.plan_basket_leg(leg)
+                        plans.append(leg)
+                    except ValueError as e:
+                        invalid.add(str(e), item["id"])
+                stages["plan"].add((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                results = [app.place_basket_leg(leg, signal_id) for leg in plans]
+            elif kind == "OPEN":
+                try:
+                    plan = app.plan_order(order, item["msg"])
+                except ValueError as e:
+                    invalid.add(str(e), item["id"])
+                    continue
+                finally:
+                    stages["plan"].add((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                results = [app.execute_plan(plan, signal_id)]
+            else:
+                results = [app.execute_order(order, signal_id)]
+            stages["execute"].add((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            errors.add(f"{type(e).__name__}: {e}", item["id"])
+            continue
+        totals["executed"] += 1
+        for result in results:
+            if kind == "CLOSE":
+                totals[f"close_{result.get('status')}"] += 1
+                continue
+            failed = _failed_legs(result)
+            failed_legs.update(failed)
+            totals["positions_with_rejected_legs"] += bool(failed)
+
+    report = {
+        "alerts": totals["alerts"],
+        "duration_s": round(time.perf_counter() - started, 3),
+        "order_types": dict(order_types),
+        "duplicates": totals["duplicates"],
+        "parse_failures": {"count": sum(parse_failures.counts.values()), "reasons": parse_failures.summary()},
+        "stages": {name: timer.summary() for name, timer in stages.items() if timer.count},
+    }
+    if execute:
+        report.update({
+            "executed": totals["executed"],
+            "closes": {key[len("close_"):]: value for key, value in totals.items() if key.startswith("close_")},
+            "invalid_orders": {"count": sum(invalid.counts.values()), "reasons": invalid.summary()},
+            "execution_errors": {"count": sum(errors.counts.values()), "reasons": errors.summary()},
+            "rejected_legs": dict(failed_legs),
+            "positions_with_rejected_legs": totals["positions_with_rejected_legs"],
+            "exchange_rejections": dict(client.rejected.most_common(20)),
+            "exchange_calls": dict(client.calls),
+        })
+    return report
+
+
+def _print_report(report: dict):
+    print(f"alert: {report['alerts']} in {report['duration_s']} s "
+          f"({report['alerts'] / report['duration_s'] if report['duration_s'] else 0:.0f} alert/s)")
+    print(f"tipi: {report['order_types']}  duplicati: {report['duplicates']}")
+    print(f"non parsificabili: {report['parse_failures']['count']}")
+    for reason in report["parse_failures"]["reasons"]:
+        print(f"  {reason['count']:>7}  {reason['reason']}  (es. id {reason['examples']})")
+    if "executed" in report:
+        print(f"eseguiti: {report['executed']}  CLOSE: {report['closes']}")
+        for title, key in (("rifiutati dalla validazione", "invalid_orders"), ("errori", "execution_errors")):
+            print(f"{title}: {report[key]['count']}")
+            for reason in report[key]["reasons"]:
+                print(f"  {reason['count']:>7}  {reason['reason']}  (es. id {reason['examples']})")
+        print(f"gambe rifiutate: {report['rejected_legs'] or 'nessuna'} "
+              f"(posizioni coinvolte: {report['positions_with_rejected_legs']})")
+        for reason, count in report["exchange_rejections"].items():
+            print(f"  {count:>7}  {reason}")
+    print("tempi per fase:")
+    for name, timer in report["stages"].items():
+        print(f"  {name:<8} n={timer['count']} media={timer['mean_ms']} ms p50={timer['p50_ms']} ms "
+              f"p99={timer['p99_ms']} ms max={timer['max_ms']} ms totale={timer['total_s']} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jsonl", help="export JSONL degli alert (default: request_log dal DB configurato)")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=datetime(1970, 1, 1))
+    parser.add_argument("--until", type=datetime.fromisoformat, default=datetime(9999, 1, 1))
+    parser.add_argument("--limit", type=int, help="numero massimo di alert")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processi per il parsing (0 = nel processo principale)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="alert per blocco inviato al pool")
+    parser.add_argument("--in-flight", type=int, default=0, help="blocchi in lavorazione (default: 2 x workers)")
+    parser.add_argument("--db-batch-size", type=int, default=1000)
+    parser.add_argument("--contracts", help="cache dei contratti per arrotondamenti e minimi (contracts_cache.json)")
+    parser.add_argument("--parse-only", action="store_true", help="solo parsing, senza esecuzione simulata")
+    parser.add_argument("--json", action="store_true", help="report in JSON")
+    args = parser.parse_args()
+
+    _replay_environment(storage_from_db=not args.jsonl)
+    rows = rows_from_jsonl(args.jsonl) if args.jsonl else rows_from_db(args.since, args.until, args.db_batch_size)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+
+    report = run(rows, args.workers, args.chunk_size, args.in_flight or 2 * max(1, args.workers),
+                 not args.parse_only, args.contracts)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Any, Optional
+
+_separators = (",", ":")
+
+
+def serialize_payload(payload: Any) -> bytes:
+    """Serializza il payload una sola volta: gli stessi byte vengono firmati e inviati."""
+    return json.dumps(payload, separators=_separators, ensure_ascii=False).encode("utf-8")
+
+
+class RequestSigner:
+    """
+    Firma HMAC-SHA256 delle richieste Bitget.
+    Lo stato HMAC con la chiave segreta viene creato una volta e copiato a ogni firma
+    (hmac.copy evita di rielaborare la chiave), e gli header fissi sono un template
+    da cui si parte per ogni richiesta.
+    """
+
+    def __init__(self, api_key: Optional[str], api_secret: str, passphrase: Optional[str], demo: bool = False):
+        if api_secret is None:
+            raise ValueError("SECRET non configurato: impossibile firmare le richieste Bitget")
+        self._keyed = hmac.new(api_secret.encode(), digestmod=hashlib.sha256)
+        self._template = {
+            "ACCESS-KEY": api_key,
+            "ACCESS-PASSPHRASE": passphrase,
+            "Content-Type": "application/json",
+            "locale": "en-US",
+            "paptrading": "1"
+        }
+        if demo:
+            self._template["X-CHANNEL-API-CODE"] = "default"
+
+    def sign(self, timestamp: str, method: str, path: str, body: bytes = b"") -> str:
+        mac = self._keyed.copy()
+        mac.update(f"{timestamp}{method}{path}".encode())
+        mac.update(body)
+        return base64.b64encode(mac.digest()).decode()
+
+    def headers(self, method: str, path: str, body: bytes = b"") -> dict:
+        timestamp = str(int(time.time() * 1000))
+        headers = self._template.copy()
+        headers["ACCESS-SIGN"] = self.sign(timestamp, method, path, body)
+        headers["ACCESS-TIMESTAMP"] = timestamp
+        return headers
+
+    def login_args(self) -> dict:
+        """Argomenti del login al WebSocket privato: firma di timestamp (in secondi) + GET + /user/verify."""
+        timestamp = str(int(time.time()))
+        return {
+            "apiKey": self._template["ACCESS-KEY"],
+            "passphrase": self._template["ACCESS-PASSPHRASE"],
+            "timestamp": timestamp,
+            "sign": self.sign(timestamp, "GET", "/user/verify"),
+        }
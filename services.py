@@ -0,0 +1,228 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional
+
+import env_setup  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+BITGET_WARMUP = os.getenv("BITGET_WARMUP", "true").lower() == "true"
+
+# Singleton del processo, creati al primo uso: l'import di app.py non apre connessioni
+# né importa requests/mysql-connector. set_* li sostituisce (benchmark, replay) purché
+# venga chiamato prima del primo uso.
+_UNSET = object()
+_db = _UNSET
+_client = _UNSET
+_dedup = _UNSET
+_outbox = _UNSET
+_accounts = _UNSET
+# Thread di background per account (il principale per primo)
+_outbox_workers = {}
+_position_streams = {}
+# Un lock per singolo: un ordine che attende la deduplica non resta bloccato dietro il client
+_locks = {name: threading.Lock() for name in ("_db", "_client", "_dedup", "_outbox", "_accounts", "_startup")}
+
+_startup_thread: Optional[threading.Thread] = None
+_ready = threading.Event()
+_started_at = time.monotonic()
+_ready_seconds: Optional[float] = None
+_startup_error: Optional[str] = None
+
+
+def _lazy(name: str, create):
+    value = globals()[name]
+    if value is _UNSET:
+        with _locks[name]:
+            value = globals()[name]
+            if value is _UNSET:
+                value = create()
+                globals()[name] = value
+    return value
+
+
+def _replace(name: str, value):
+    with _locks[name]:
+        globals()[name] = value
+
+
+def _create_db():
+    from db_module import DatabaseService
+    db = DatabaseService()
+    # /ping legge lo snapshot in memoria: il DB viene interrogato solo qui, alla creazione
+    try:
+        db.load_last_signal()
+    except Exception as e:
+        logger.warning("⚠️ Impossibile leggere l'ultimo segnale da request_log: %s", e)
+    return db
+
+
+def _create_client():
+    from accounts import load_accounts
+    from bitget_client import BitgetClient
+    # Client dell'account principale; un solo DatabaseService (e backend) per processo
+    return BitgetClient(db_service=get_db(), account=load_accounts()[0])
+
+
+def _create_dedup():
+    from signal_dedup import SignalDeduplicator
+    dedup = SignalDeduplicator(get_db())
+    # Le impronte recenti vengono caricate prima che il primo ordine possa registrarne una
+    try:
+        dedup.warm()
+    except Exception as e:
+        logger.warning("⚠️ Impossibile caricare le impronte recenti da request_log: %s", e)
+    return dedup
+
+
+def _create_outbox():
+    from order_outbox import ORDER_OUTBOX, OrderOutbox
+    return OrderOutbox() if ORDER_OUTBOX else None
+
+
+def _create_accounts():
+    from accounts import AccountRegistry, load_accounts
+    from bitget_client import BitgetClient
+    from order_outbox import ORDER_OUTBOX, OrderOutbox, account_outbox_path
+    accounts = load_accounts()
+    primary = get_client()
+
+    def create_client(account):
+        # Pool, rate limiter e position book propri; i metadati dei contratti sono quelli del principale
+        return BitgetClient(db_service=get_db(), account=account, contracts=primary.contracts)
+
+    def create_outbox(account):
+        if account is accounts[0]:
+            return get_outbox()
+        return OrderOutbox(account_outbox_path(account.name)) if ORDER_OUTBOX else None
+
+    return AccountRegistry(accounts, create_client, create_outbox, primary_client=primary)
+
+
+def get_db():
+    return _lazy("_db", _create_db)
+
+
+def set_db(db):
+    _replace("_db", db)
+
+
+def get_client():
+    return _lazy("_client", _create_client)
+
+
+def set_client(client):
+    _replace("_client", client)
+
+
+def get_dedup():
+    return _lazy("_dedup", _create_dedup)
+
+
+def set_dedup(dedup):
+    _replace("_dedup", dedup)
+
+
+def get_outbox():
+    """Outbox delle gambe da ritentare (None con ORDER_OUTBOX=false)."""
+    return _lazy("_outbox", _create_outbox)
+
+
+def set_outbox(outbox):
+    _replace("_outbox", outbox)
+
+
+def get_accounts():
+    """Account di ACCOUNTS con i rispettivi client (il principale è get_client())."""
+    return _lazy("_accounts", _create_accounts)
+
+
+def peek_db():
+    """DB già creato, oppure None: non avvia connessioni (usato da /ping)."""
+    return None if _db is _UNSET else _db
+
+
+def outbox_worker():
+    """Worker dell'outbox dell'account principale."""
+    return next(iter(_outbox_workers.values()), None)
+
+
+def position_stream():
+    return next(iter(_position_streams.values()), None)
+
+
+def account_stats() -> dict:
+    stats = get_accounts().stats()
+    for name, account in stats.items():
+        worker = _outbox_workers.get(name)
+        account["outbox"] = worker.stats() if worker else None
+    return stats
+
+
+def _start_background_services():
+    """Connessioni e thread che non servono per rispondere, avviati dopo l'import."""
+    from contracts import CONTRACTS_REFRESH_SECONDS
+    from position_book import POSITION_RECONCILE_SECONDS, POSITION_STREAM
+    from order_outbox import OutboxWorker
+
+    # Prima il DB: deduplica e ultimo segnale servono al primo webhook
+    get_db()
+    get_dedup()
+
+    # Regole dei contratti (passo size, tick prezzo, minimi): dal file su disco, poi aggiornate in background
+    if CONTRACTS_REFRESH_SECONDS > 0:
+        get_client().contracts.start()
+
+    accounts = get_accounts()
+    for account in accounts:
+        client = accounts.client(account.name)
+        if BITGET_WARMUP:
+            client.warmup()
+        # Position book: riconciliato con Bitget in background (e dallo stream privato, se attivo)
+        if POSITION_RECONCILE_SECONDS > 0:
+            client.positions.start()
+        if POSITION_STREAM and account.name not in _position_streams:
+            _position_streams[account.name] = client.position_stream().start()
+        # Gambe fallite per errori transitori: ritentate in background, anche dopo un riavvio
+        outbox = accounts.outbox(account.name)
+        if outbox is not None and account.name not in _outbox_workers:
+            _outbox_workers[account.name] = OutboxWorker(outbox, client).start()
+
+
+def _startup():
+    global _ready_seconds, _startup_error
+    try:
+        _start_background_services()
+    except Exception as e:
+        _startup_error = str(e)
+        logger.exception("❌ Avvio dei servizi non riuscito: verranno creati al primo ordine")
+    _ready_seconds = time.monotonic() - _started_at
+    _ready.set()
+    logger.info("✅ Servizi pronti in %.0f ms", _ready_seconds * 1000)
+
+
+def start(background: bool = True):
+    """Avvia i servizi (idempotente); in background /ping risponde già durante l'avvio."""
+    global _startup_thread
+    with _locks["_startup"]:
+        if _startup_thread is not None:
+            return
+        _startup_thread = threading.Thread(target=_startup, name="services-startup", daemon=True)
+    if background:
+        _startup_thread.start()
+    else:
+        _startup_thread.run()
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    return _ready.wait(timeout)
+
+
+def startup_stats() -> dict:
+    return {
+        "ready": _ready.is_set(),
+        "ready_ms": round(_ready_seconds * 1000, 1) if _ready_seconds is not None else None,
+        "error": _startup_error,
+    }
@@ -0,0 +1,101 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", 3600))
+DEDUP_MAX_SIZE = int(os.getenv("DEDUP_MAX_SIZE", 10000))
+
+# Namespace fisso: lo stesso alert produce sempre lo stesso signal_id (e quindi gli stessi clientOid)
+SIGNAL_NAMESPACE = uuid.UUID("6f1c3a52-8a4e-4b8e-9d55-1f0e2b7c9a10")
+
+
+class DuplicateSignal(Exception):
+    """
+    Impronta già presente in request_log: lo stesso alert è stato registrato da un altro
+    worker prima che la LRU locale lo conoscesse. `signal_id` è quello dell'originale.
+    """
+
+    def __init__(self, signal_id: str):
+        super().__init__(f"Segnale già registrato: {signal_id}")
+        self.signal_id = signal_id
+
+
+def fingerprint(order) -> Optional[str]:
+    """
+    Impronta dell'alert TradingView (trade_id, ticker, time, action, tipo di ordine).
+    Senza trade_id né orario l'alert non è distinguibile da uno nuovo: restituisce None.
+    """
+    if not order.trade_id and not order.time:
+        return None
+    key = "|".join(str(v or "") for v in (order.trade_id, order.ticker, order.time,
+                                               order.action, order.order_type))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def signal_id_for(fp: Optional[str]) -> str:
+    """signal_id deterministico per un'impronta, casuale se l'alert non ha impronta."""
+    return str(uuid.uuid5(SIGNAL_NAMESPACE, fp)) if fp else str(uuid.uuid4())
+
+
+def client_oid(signal_id: str, leg: str) -> str:
+    """clientOid Bitget di una gamba: un retry della stessa gamba è idempotente lato exchange."""
+    return f"{signal_id.replace('-', '')}-{leg}"
+
+
+class SignalDeduplicator:
+    """
+    LRU in memoria con TTL delle impronte già ricevute.
+    All'avvio viene ripopolata dalle impronte recenti di request_log (indice univoco
+    sulla colonna fingerprint), così la deduplicazione sopravvive a un riavvio.
+    """
+
+    def __init__(self, db_service=None, ttl: float = DEDUP_TTL, max_size: int = DEDUP_MAX_SIZE):
+        self.db_service = db_service
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen = OrderedDict()  # fingerprint -> (signal_id, scadenza)
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def warm(self):
+        """Carica le impronte ricevute negli ultimi `ttl` secondi da request_log."""
+        if self.db_service is None:
+            return 0
+        rows = self.db_service.get_recent_fingerprints(self.ttl) or []
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                age = max(0.0, row.get("age_seconds") or 0.0)
+                self._remember(row["fingerprint"], row["signal_id"], now + self.ttl - age)
+        return len(rows)
+
+    def _remember(self, fp: str, signal_id: str, expires_at: float):
+        self._seen[fp] = (signal_id, expires_at)
+        self._seen.move_to_end(fp)
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+
+    def register(self, fp: Optional[str], signal_id: str) -> Optional[str]:
+        """
+        Registra l'impronta del segnale. Se era già stata vista (e non è scaduta)
+        restituisce il signal_id originale, altrimenti None.
+        """
+        if fp is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(fp)
+            if entry and entry[1] > now:
+                self.duplicates += 1
+                self._seen.move_to_end(fp)
+                return entry[0]
+            self._remember(fp, signal_id, now + self.ttl)
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._seen), "duplicates": self.duplicates, "ttl_seconds": self.ttl}
@@ -0,0 +1,284 @@
+"""
+Percorso di un segnale, comune al server Flask (app.py) e a quello ASGI (asgi_app.py):
+parsing dell'alert, esito della deduplica, validazione e piano di ordini e basket,
+risposte HTTP di /order, /signal/<id>, /signal/<id>/calls e /signals.
+I due front-end eseguono solo l'I/O (request_log, corsie di esecuzione), con thread
+o con asyncio; le decisioni stanno qui, così le rotte dei due server non divergono.
+"""
+import json
+import uuid
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from typing import Any, List, Optional, Tuple
+
+import order_flow
+from Order import Order, process_order_request
+from basket import BasketLeg, parse_basket, aggregate as aggregate_basket
+from signal_dedup import fingerprint, signal_id_for
+from metrics import SignalTrace, measure, ORDER_PARSE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SIGNALS_PAGE_SIZE = 50
+SIGNALS_PAGE_MAX = 500
+
+
+@dataclass
+class Signal:
+    """Alert ricevuto: ordine, eventuale basket e identità assegnata dalla deduplica."""
+    body: dict
+    order: Order
+    signal_id: str
+    fingerprint: Optional[str]
+    duplicate_of: Optional[str] = None
+    basket: List[BasketLeg] = field(default_factory=list)
+    basket_error: Optional[str] = None
+
+    @property
+    def ticker(self) -> Optional[str]:
+        return self.order.ticker.replace(".P", "") if self.order.ticker else None
+
+    def log_fields(self) -> dict:
+        """Argomenti di log_incoming_request (DatabaseService o AsyncDatabaseService)."""
+        return {"signal_id": self.signal_id, "request_text": self.body, "response_text": "null",
+                "fingerprint": self.fingerprint, "ticker": self.ticker}
+
+    def mark_duplicate(self, trace: SignalTrace):
+        """Impronta già registrata da un altro worker (DuplicateSignal): duplicato con un proprio id."""
+        self.duplicate_of, self.signal_id, self.fingerprint = self.signal_id, str(uuid.uuid4()), None
+        trace.signal_id = self.signal_id
+
+
+@dataclass
+class Reply:
+    """Risposta immediata a /order; con `save` viene scritta anche in request_log."""
+    status: int
+    body: dict
+    save: bool = True
+
+
+@dataclass
+class OrderJob:
+    """Ordine (o piano per account) da eseguire nella corsia del suo symbol."""
+    signal_id: str
+    symbol: str
+    job: Any
+
+    def submit(self, dispatcher):
+        dispatcher.submit(self.symbol, self.job, self.signal_id)
+
+    def execute(self, dispatcher):
+        """Risultato di dispatcher.execute (da attendere con AsyncOrderDispatcher), da passare a result()."""
+        return dispatcher.execute(self.symbol, self.job, self.signal_id)
+
+    def result(self, executed):
+        return executed
+
+    def accepted(self) -> Reply:
+        return Reply(202, {"status": "accepted", "signal_id": self.signal_id}, save=False)
+
+
+@dataclass
+class BasketJob:
+    """
+    Blocchi di un alert basket, ciascuno nella corsia del proprio symbol, in parallelo e con
+    lo stesso signal_id. I blocchi non validi non vengono inviati e compaiono tra le gambe
+    fallite del risultato aggregato.
+    """
+    signal_id: str
+    basket: List[BasketLeg]
+    jobs: List[Tuple[str, Any]]
+    valid: List[BasketLeg]
+    invalid: dict
+
+    def submit(self, dispatcher):
+        dispatcher.submit_group(self.jobs, self.signal_id, self.result)
+
+    def execute(self, dispatcher):
+        """Risultati di dispatcher.execute_group (da attendere con AsyncOrderDispatcher), da passare a result()."""
+        return dispatcher.execute_group(self.jobs, self.signal_id)
+
+    def result(self, executed):
+        by_leg = dict(zip((leg.index for leg in self.valid), executed))
+        return aggregate_basket(self.signal_id, self.basket,
+                                [self.invalid.get(leg.index, by_leg.get(leg.index)) for leg in self.basket])
+
+    def accepted(self) -> Reply:
+        return Reply(202, {"status": "accepted", "signal_id": self.signal_id, "legs": len(self.basket)}, save=False)
+
+
+def receive(request, dedup, trace: SignalTrace) -> Signal:
+    """Parsing dell'alert (request espone get_json()) ed esito della deduplica in memoria."""
+    basket_error = None
+    with measure(ORDER_PARSE_SECONDS, "parse") as labels:
+        order = process_order_request(request)
+        try:
+            basket = parse_basket(request.get_json().get("text"), order.order_type)
+        except ValueError as e:
+            basket, basket_error = [], str(e)
+        labels["order_type"] = "BASKET" if basket else order.order_type or "unknown"
+    trace.order_type = "BASKET" if basket else order.order_type
+
+    fp = fingerprint(order)
+    signal = Signal(request.get_json(), order, signal_id_for(fp), fp, basket=basket, basket_error=basket_error)
+    duplicate_of = dedup.register(fp, signal.signal_id)
+    if duplicate_of:
+        # Il duplicato viene registrato con un proprio id, senza impronta (indice univoco)
+        signal.duplicate_of, signal.signal_id, signal.fingerprint = duplicate_of, str(uuid.uuid4()), None
+    trace.signal_id = signal.signal_id
+    return signal
+
+
+def log_received(signal: Signal):
+    order = signal.order
+    logger.info("richiesta ricevuta", extra={
+        "ticker": order.ticker, "action": order.action, "order_type": order.order_type,
+        "trade_id": order.trade_id, "duplicate_of": signal.duplicate_of, "basket_legs": len(signal.basket),
+    })
+
+
+def plan(signal: Signal, accounts, contracts):
+    """
+    Passo successivo di un segnale già registrato in request_log: una Reply (duplicato,
+    alert non valido) oppure un OrderJob / BasketJob da eseguire.
+    Arrotondamento e validazione sono locali: un ordine che Bitget rifiuterebbe non parte.
+    Con più account il job contiene il piano di ciascuno, con la size scalata per account.
+    """
+    signal_id, order = signal.signal_id, signal.order
+    if signal.duplicate_of:
+        return Reply(200, {"status": "duplicate", "signal_id": signal_id, "duplicate_of": signal.duplicate_of})
+    if signal.basket_error:
+        return invalid(signal_id, signal.basket_error)
+    if signal.basket:
+        return plan_basket(signal, accounts, contracts)
+
+    if order.order_type not in ("OPEN", "CLOSE"):
+        return Reply(400, {"error": "Tipo di ordine non riconosciuto"}, save=False)
+    if not order.ticker:
+        return Reply(400, {"error": "Ticker mancante"}, save=False)
+
+    job = order
+    if order.order_type == "OPEN" or len(accounts) > 1:
+        try:
+            if len(accounts) > 1:
+                job = order_flow.plan_accounts(accounts, signal.ticker, partial(order_flow.plan_job, order, contracts))
+            else:
+                job = order_flow.plan_order(order, contracts)
+        except ValueError as e:
+            return invalid(signal_id, str(e))
+    return OrderJob(signal_id, signal.ticker, job)
+
+
+def plan_basket(signal: Signal, accounts, contracts) -> BasketJob:
+    invalid_legs, planned = {}, {}
+    for leg in signal.basket:
+        try:
+            if len(accounts) > 1:
+                planned[leg.index] = order_flow.plan_accounts(
+                    accounts, leg.symbol, partial(order_flow.plan_basket_leg, leg, contracts),
+                    oid_prefix=f"{leg.key}-")
+            else:
+                leg.plan = order_flow.plan_basket_leg(leg, contracts)
+                planned[leg.index] = leg
+        except ValueError as e:
+            invalid_legs[leg.index] = {"status": "invalid", "message": str(e)}
+    valid = [leg for leg in signal.basket if leg.index not in invalid_legs]
+    jobs = [(leg.symbol, planned[leg.index]) for leg in valid]
+    return BasketJob(signal.signal_id, signal.basket, jobs, valid, invalid_legs)
+
+
+def invalid(signal_id: str, message: str) -> Reply:
+    return Reply(400, {"status": "invalid", "signal_id": signal_id, "message": message})
+
+
+def rejected(signal_id: str, error: Exception) -> Reply:
+    """Corsia del symbol piena (LaneFull)."""
+    return Reply(429, {"status": "rejected", "signal_id": signal_id, "message": str(error)})
+
+
+# --- Consultazione ---
+
+def format_time(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if hasattr(value, "strftime") else value
+
+
+def decode_response(response):
+    try:
+        return json.loads(response) if response and response != "null" else None
+    except (TypeError, json.JSONDecodeError):
+        return response
+
+
+def signal_status(signal_id: str, record: Optional[dict], queued_status: Optional[str]) -> Tuple[int, dict]:
+    """Stato di un segnale: risposta salvata in request_log o stato della corsia se non ancora scritta."""
+    response = record.get("response") if record else None
+    if response and response != "null":
+        result = decode_response(response)
+        failed = isinstance(result, dict) and result.get("status") == "error"
+        return 200, {
+            "status": "error" if failed else "done",
+            "signal_id": signal_id,
+            "received_at": format_time(record["request_time"]),
+            "result": result
+        }
+    if record or queued_status:
+        return 200, {"status": queued_status or "pending", "signal_id": signal_id}
+    return 404, {"error": "Segnale non trovato", "signal_id": signal_id}
+
+
+def signal_calls(signal_id: str, record: Optional[dict], calls: Optional[list]) -> Tuple[int, dict]:
+    """Dettaglio di un segnale: richiesta salvata e chiamate Bitget con payload e risposta."""
+    if not record:
+        return 404, {"error": "Segnale non trovato", "signal_id": signal_id}
+    if calls is None:
+        return 503, {"error": "Database non disponibile"}
+    for call in calls:
+        call["request_time"] = format_time(call["request_time"])
+    return 200, {
+        "signal_id": signal_id,
+        "ticker": record.get("ticker"),
+        "received_at": format_time(record["request_time"]),
+        "result": decode_response(record.get("response")),
+        "calls": calls
+    }
+
+
+def _parse_time(args, name):
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Parametro '{name}' non valido: usare il formato ISO (es. 2024-01-31T12:00:00)")
+
+
+def _int_arg(args, name, default=None):
+    # Come request.args.get(name, default, type=int) di Flask: un valore non intero vale default
+    try:
+        return int(args.get(name))
+    except (TypeError, ValueError):
+        return default
+
+
+def signals_query(args) -> tuple:
+    """
+    Filtri di /signals da un mapping di parametri della query string: ticker, from/to (ISO,
+    orario del server) e paginazione keyset con before=<next_before>. ValueError se non validi.
+    """
+    since, until = _parse_time(args, "from"), _parse_time(args, "to")
+    limit = min(max(_int_arg(args, "limit", SIGNALS_PAGE_SIZE), 1), SIGNALS_PAGE_MAX)
+    return args.get("ticker"), since, until, _int_arg(args, "before"), limit
+
+
+def signals_page(result) -> Tuple[int, dict]:
+    """Risposta di /signals dal risultato di find_signals (None se il DB non è disponibile)."""
+    if result is None:
+        return 503, {"error": "Database non disponibile"}
+    page, next_before = result
+    for signal in page:
+        signal["request_time"] = format_time(signal["request_time"])
+        signal["response"] = decode_response(signal["response"])
+    return 200, {"signals": page, "next_before": next_before}
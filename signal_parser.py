@@ -0,0 +1,204 @@
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Pattern
+
+# Ogni tokenizer è una sola regex precompilata letta con un unico finditer/findall.
+# Viene consumata solo la parola chiave (più gli spazi che la seguono), mentre i
+# valori testuali sono catturati in un lookahead: così una parola chiave che compare
+# dentro il valore di un altro campo (es. "Message: ... size: 1") viene comunque
+# vista e la prima occorrenza di ogni campo coincide con quella di re.search.
+# Le parole chiave hanno prefissi diversi, quindi in una stessa posizione può
+# corrispondere al massimo un campo. Ogni alternativa inizia con un carattere
+# letterale, così il motore salta velocemente le posizioni che non possono
+# iniziare un token.
+
+ALERT_TOKENS = re.compile(
+    r"Segnale su (?=(?P<ticker>.+))"
+    r"|Ora:\s*(?=(?P<time>.+))"
+    r"|Prezzo chiusura:\s*(?=(?P<close_price>[\d.]+))"
+    r"|Azione:\s*(?=(?P<action>.+))"
+    r"|Commento:\s*(?=(?P<comment>.+))"
+    r"|id trade\s+(?=(?P<trade_id>.+))"
+    r"|size:\s*(?=(?P<size>[\d.]+))"
+    r"|Message:\s*(?=(?P<message>.+))"
+)
+ALERT_FIELDS = ("ticker", "time", "close_price", "action", "comment", "trade_id", "size", "message")
+
+# Le parole chiave senza distinzione tra maiuscole e minuscole iniziano con una classe
+# di caratteri seguita da un lookbehind ("ſ" equivale a "s" con re.IGNORECASE).
+# I valori numerici sono consumati: una parola chiave non può iniziare dentro [\d.]+
+SIGNAL_TOKENS = re.compile(
+    r"[OoCcEeSsſTt](?:"
+    r"(?<=[Oo])(?i:(?P<open>PEN))\s+(?=(?i:(?P<open_direction>LONG|SHORT)))"
+    r"|(?<=[Cc])(?i:(?P<close>LOSE))\s+(?=(?i:(?P<close_direction>LONG|SHORT)))"
+    r"|(?<=E)ntry:\s*(?P<entry>[\d.]+)"
+    r"|(?<=[Ssſ])(?i:top Loss|L):\s*(?P<stop_loss>[\d.]+)"
+    r"|(?<=[Tt])(?i:P)(?P<tp_idx>\d)?:\s*(?P<tp_val>[\d.]+)(?P<tp_pct>%)?"
+    r"|(?<=[Ssſ])(?i:ize):\s*(?P<size>[\d.]+)"
+    r")"
+)
+
+# Parametri generali e inizio dei blocchi; il corpo del blocco è letto con BLOCK_BODY
+BLOCK_TOKENS = re.compile(
+    r"Segnale su (?=(?P<symbol>\w+))"
+    r"|Ora: (?=(?P<timestamp>[\d\-T:Z]+))"
+    r"|Prezzo chiusura: (?=(?P<close_price>[\d.]+))"
+    r"|Azione: (?=(?P<action>\w+))"
+    r"|L(?=ONG SIGNAL \| )"
+    r"|S(?=HORT SIGNAL \| )"
+)
+BLOCK_BODY = re.compile(
+    r"(LONG|SHORT) SIGNAL \| Entry: ([\d.]+) \| Stop Loss: ([\d.]+) \| TP1: ([\d.]+) \| TP2: ([\d.]+)"
+    r" \| TP3: ([\d.]+) \| Size: ([\-\d.]+) \| Qty % → TP1: (\d+)% \| TP2: (\d+)% \| TP3: (\d+)%"
+)
+BLOCK_HEADER_FIELDS = ("symbol", "timestamp", "close_price", "action")
+# Symbol del singolo blocco negli alert basket: "ETHUSDT.P LONG SIGNAL | ..." (in fondo al testo che precede il blocco),
+# un'etichetta come "TP3: " non è un symbol
+BLOCK_SYMBOL = re.compile(r"\b((?=[A-Z0-9]*[A-Z])[A-Z0-9]{2,})(?:\.P)?(?!\s*:)\W*$")
+
+
+@dataclass
+class SignalParams:
+    """Parametri del messaggio di alert Pine Script (entry, SL, TP, size)."""
+    signal_type: Optional[str] = None
+    direction: Optional[str] = None
+    entry: Optional[float] = None
+    stop_loss: Optional[float] = None
+    take_profits: Dict[str, float] = field(default_factory=dict)  # "tp1" -> prezzo
+    qty_distribution: Optional[Dict[str, int]] = None              # "TP1" -> percentuale
+    tp: Optional[float] = None
+    size: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        """Rappresentazione a dizionario usata da parse_signal_string."""
+        result = {}
+        if self.signal_type is not None:
+            result["signal_type"] = self.signal_type
+            result["direction"] = self.direction
+        if self.entry is not None:
+            result["entry"] = self.entry
+        if self.stop_loss is not None:
+            result["stop_loss"] = self.stop_loss
+        result.update(self.take_profits)
+        if self.qty_distribution is not None:
+            result["qty_distribution"] = self.qty_distribution
+        if self.tp is not None:
+            result["tp"] = self.tp
+        if self.size is not None:
+            result["size"] = self.size
+        return result
+
+
+@dataclass
+class SignalBlock:
+    """Blocco "LONG|SHORT SIGNAL | Entry: ... | Qty % → ..." di un alert multi-segnale."""
+    symbol: Optional[str]
+    timestamp: Optional[str]
+    close_price: Optional[str]
+    action: Optional[str]
+    direction: str
+    entry: str
+    stop_loss: str
+    tp1: str
+    tp2: str
+    tp3: str
+    size: str
+    tp1_qty: str
+    tp2_qty: str
+    tp3_qty: str
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_alert_fields(text: str, tokens: Pattern = ALERT_TOKENS) -> Dict[str, str]:
+    """
+    Estrae in un solo passaggio i campi testuali dell'alert TradingView (Segnale su, Ora, Azione, ...).
+    `tokens` è il tokenizer con i pattern del chiamante (stessi gruppi di ALERT_TOKENS).
+    """
+    extracted = {}
+    for match in tokens.finditer(text):
+        key = match.lastgroup
+        if key not in extracted:
+            extracted[key] = match.group(key).strip()
+            if len(extracted) == len(ALERT_FIELDS):
+                break
+    # Stesso ordine dei campi del formato originale
+    return {key: extracted[key] for key in ALERT_FIELDS if key in extracted}
+
+
+def parse_signal(text: str) -> SignalParams:
+    """Parsifica in un solo passaggio il messaggio di alert Pine Script."""
+    signal = direction = entry = stop_loss = tp = size = None
+    tp_tokens = []
+
+    # findall restituisce una tupla per token: i gruppi che non partecipano sono stringhe vuote
+    for (open_, open_dir, close, close_dir, ent, sl,
+         tp_idx, tp_val, tp_pct, sz) in SIGNAL_TOKENS.findall(text):
+        if tp_val:
+            if tp_idx:
+                tp_tokens.append((tp_idx, tp_val, tp_pct))
+            elif tp is None:
+                tp = tp_val
+        elif open_ or close:
+            if signal is None:
+                signal, direction = ("OPEN", open_dir) if open_ else ("CLOSE", close_dir)
+                direction = direction.upper()
+        elif ent:
+            if entry is None:
+                entry = ent
+        elif sl:
+            if stop_loss is None:
+                stop_loss = sl
+        elif sz:
+            if size is None:
+                size = sz
+
+    # Conversioni nello stesso ordine del parser originale (gli errori emergono allo stesso punto)
+    params = SignalParams(signal_type=signal, direction=direction)
+    if entry is not None:
+        params.entry = float(entry)
+    if stop_loss is not None:
+        params.stop_loss = float(stop_loss)
+    if tp_tokens:
+        for tp_idx, tp_val, pct in tp_tokens:
+            # "TP1: 30%" è la quota del TP, non il suo prezzo: non sovrascrive "TP1: 1.2345"
+            if not pct:
+                params.take_profits[f"tp{tp_idx}"] = float(tp_val)
+        # Le percentuali "TP1: 30%" valgono solo se il valore è un intero seguito da %
+        qty = {f"TP{tp_idx}": int(tp_val) for tp_idx, tp_val, pct in tp_tokens if pct and "." not in tp_val}
+        if qty:
+            params.qty_distribution = qty
+    elif tp is not None:
+        params.tp = float(tp)
+    if size is not None:
+        params.size = float(size)
+    return params
+
+
+def parse_signal_blocks(text: str) -> List[SignalBlock]:
+    """Estrae tutti i blocchi LONG/SHORT SIGNAL e i parametri generali dell'alert in un solo passaggio."""
+    header: Dict[str, str] = {}
+    blocks = []
+    symbols = []
+    block_end = 0
+    for match in BLOCK_TOKENS.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            # Inizio di un blocco: come re.findall, i blocchi non si sovrappongono
+            start = match.start()
+            if start < block_end:
+                continue
+            body = BLOCK_BODY.match(text, start)
+            if body:
+                blocks.append(body.groups())
+                prefix = BLOCK_SYMBOL.search(text, max(block_end, text.rfind("\n", 0, start) + 1), start)
+                symbols.append(prefix.group(1) if prefix else None)
+                block_end = body.end()
+        elif kind not in header:
+            header[kind] = match.group(kind)
+
+    symbol, timestamp, close_price, action = (header.get(key) for key in BLOCK_HEADER_FIELDS)
+    # Un symbol davanti al blocco prevale su quello di "Segnale su" (alert basket multi-symbol)
+    return [SignalBlock(block_symbol or symbol, timestamp, close_price, action, *values)
+            for block_symbol, values in zip(symbols, blocks)]
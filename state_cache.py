@@ -0,0 +1,57 @@
+import os
+import time
+import threading
+from typing import Any, Hashable, Optional, Tuple
+
+LEVERAGE_CACHE_TTL = float(os.getenv("LEVERAGE_CACHE_TTL", 3600))
+
+
+class ExchangeStateCache:
+    """
+    Cache dello stato già impostato sull'exchange (es. leva per symbol/holdSide/marginMode).
+    Le voci scadono dopo `ttl` secondi e vengono invalidate quando l'exchange risponde con un errore,
+    così una chiamata viene saltata solo se il valore richiesto coincide con l'ultimo confermato.
+    """
+
+    def __init__(self, ttl: float = LEVERAGE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # key -> (valore, risposta, scadenza)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, key: Tuple[Hashable, ...], value: Any) -> Optional[dict]:
+        """Restituisce la risposta memorizzata se `value` è già impostato per `key`, altrimenti None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > now and entry[0] == value:
+                self.hits += 1
+                return entry[1]
+            if entry and entry[2] <= now:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, key: Tuple[Hashable, ...], value: Any, response: dict):
+        with self._lock:
+            self._entries[key] = (value, response, time.monotonic() + self.ttl)
+
+    def invalidate(self, symbol: Optional[str] = None):
+        """Rimuove le voci del symbol indicato (la prima componente della chiave) o tutte."""
+        with self._lock:
+            keys = [k for k in self._entries if symbol is None or k[0] == symbol]
+            for k in keys:
+                del self._entries[k]
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "calls_avoided": self.hits,
+                "calls_sent": self.misses,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl,
+            }
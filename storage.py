@@ -0,0 +1,312 @@
+import os
+import shlex
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import env_setup  # noqa: F401  (.env caricato prima delle variabili lette qui sotto)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql").lower()  # mysql | sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", "webhook.db")
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")  # se assente viene calcolato da worker e thread di gunicorn
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 0))  # tetto complessivo lato MySQL (0 = nessuno)
+MYSQL_POOL_MAX = 32  # limite di mysql-connector per un singolo pool
+
+
+def gunicorn_concurrency() -> Tuple[int, int]:
+    """(worker, thread per worker) da GUNICORN_CMD_ARGS, WEB_CONCURRENCY e GUNICORN_THREADS."""
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    threads = int(os.getenv("GUNICORN_THREADS", 1))
+    args = shlex.split(os.getenv("GUNICORN_CMD_ARGS", ""))
+    for i, arg in enumerate(args):
+        name, _, value = arg.partition("=")
+        if not value and i + 1 < len(args):
+            value = args[i + 1]
+        if name in ("-w", "--workers") and value.isdigit():
+            workers = int(value)
+        elif name == "--threads" and value.isdigit():
+            threads = int(value)
+    return workers, threads
+
+
+def background_writers() -> int:
+    """Thread interni che possono usare una connessione insieme ai thread delle richieste."""
+    if os.getenv("DB_BATCH_WRITES", "true").lower() == "true":
+        return 1  # solo lo scrittore batch
+    # Scritture sincrone: ogni worker degli ordini e ogni gamba parallela può scrivere
+    from order_queue import ORDER_WORKERS
+    from execution_planner import MAX_WORKERS
+    return ORDER_WORKERS + MAX_WORKERS
+
+
+def default_pool_size(background_threads: Optional[int] = None) -> int:
+    """
+    Connessioni per processo: una per thread di richiesta gunicorn più i thread interni
+    che scrivono. Con DB_MAX_CONNECTIONS il totale dei worker gunicorn non supera il
+    limite del server MySQL.
+    """
+    if DB_POOL_SIZE:
+        return max(1, min(MYSQL_POOL_MAX, int(DB_POOL_SIZE)))
+    workers, threads = gunicorn_concurrency()
+    if background_threads is None:
+        background_threads = background_writers()
+    size = threads + background_threads
+    if DB_MAX_CONNECTIONS:
+        size = min(size, max(1, DB_MAX_CONNECTIONS // workers))
+    return max(1, min(MYSQL_POOL_MAX, size))
+
+
+class StorageBackend:
+    """
+    Interfaccia del livello di persistenza usato dai DAO.
+    get_connection() restituisce una connessione DB-API con cursor(dictionary=...) e commit();
+    le query usano i placeholder %s, ogni backend li adatta al proprio driver.
+    """
+    dialect = ""
+
+    @property
+    def errors(self) -> Tuple[type, ...]:
+        """Eccezioni del driver gestite da DatabaseService e BatchWriter."""
+        raise NotImplementedError
+
+    @contextmanager
+    def get_connection(self):
+        raise NotImplementedError
+        yield
+
+
+class MySQLBackend(StorageBackend):
+    """Pool di connessioni MySQL creato alla prima richiesta di connessione, non all'import."""
+    dialect = "mysql"
+
+    def __init__(self, pool_size: Optional[int] = None):
+        self.pool_size = pool_size or default_pool_size()
+        self.config = {
+            "host": os.getenv("DB_HOST"),
+            "port": int(os.getenv("DB_PORT", 3306)),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "database": os.getenv("DB_NAME"),
+            "ssl_disabled": os.getenv("DB_SSL_DISABLED", "False").lower() == "true"
+        }
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def errors(self):
+        from mysql.connector import Error
+        return (Error,)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    from mysql.connector import pooling
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name="mypool",
+                        pool_size=self.pool_size,
+                        **self.config
+                    )
+        return self._pool
+
+    @contextmanager
+    def get_connection(self):
+        """Restituisce una connessione dal pool e la chiude automaticamente."""
+        conn = None
+        try:
+            conn = self.pool.get_connection()
+            yield conn
+        finally:
+            if conn and conn.is_connected():
+                conn.close()
+
+
+@lru_cache(maxsize=256)
+def _qmark(query: str) -> str:
+    return query.replace("%s", "?")
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class _SQLiteConnection:
+    """Adatta sqlite3 all'interfaccia usata dai DAO (cursor(dictionary=True), placeholder %s)."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def cursor(self, dictionary: bool = False):
+        cursor = _SQLiteCursor(self.conn.cursor())
+        if dictionary:
+            cursor.cursor.row_factory = _dict_row
+        return cursor
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        return self.cursor.execute(_qmark(query), params)
+
+    def executemany(self, query, rows):
+        return self.cursor.executemany(_qmark(query), rows)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_log (
+    id_request INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_time TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    request TEXT,
+    response TEXT,
+    signal_id TEXT,
+    fingerprint TEXT UNIQUE,
+    ticker TEXT,
+    trace TEXT
+);
+
+CREATE TABLE IF NOT EXISTS api_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_time TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+    endpoint TEXT,
+    response_status TEXT,
+    response_code TEXT,
+    response_msg TEXT,
+    order_id TEXT,
+    latency_ms REAL,
+    queue_delay_ms REAL,
+    signal_id TEXT,
+    account TEXT,
+    data BLOB,
+    compressed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Colonne aggiunte dopo la prima versione dello schema: i file già esistenti vengono aggiornati
+SQLITE_ADDED_COLUMNS = {
+    "request_log": {"ticker": "TEXT"},
+    "api_requests": {"order_id": "TEXT", "latency_ms": "REAL", "data": "BLOB",
+                     "compressed": "INTEGER NOT NULL DEFAULT 0", "account": "TEXT"},
+}
+
+SQLITE_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_request_log_signal_id ON request_log (signal_id);
+CREATE INDEX IF NOT EXISTS idx_request_log_ticker ON request_log (ticker, id_request);
+CREATE INDEX IF NOT EXISTS idx_request_log_time ON request_log (request_time);
+CREATE INDEX IF NOT EXISTS idx_api_requests_signal_id ON api_requests (signal_id);
+CREATE INDEX IF NOT EXISTS idx_api_requests_endpoint ON api_requests (endpoint);
+CREATE INDEX IF NOT EXISTS idx_api_requests_code ON api_requests (response_code);
+CREATE INDEX IF NOT EXISTS idx_api_requests_order_id ON api_requests (order_id);
+CREATE INDEX IF NOT EXISTS idx_api_requests_account ON api_requests (account, id);
+"""
+
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Database SQLite embedded per installazioni su un solo nodo.
+    Modalità WAL: le letture non bloccano lo scrittore; una connessione per thread,
+    le scritture di log passano comunque dal BatchWriter (un commit per batch).
+    Con path ":memory:" ogni connessione sarebbe un database vuoto a sé: una sola
+    connessione condivisa, usata da un thread alla volta.
+    """
+    dialect = "sqlite"
+
+    def __init__(self, path: str = SQLITE_PATH, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._memory: Optional[_SQLiteConnection] = None
+        self._memory_lock = threading.RLock()
+
+    @property
+    def errors(self):
+        return (sqlite3.Error,)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._apply_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _apply_schema(conn: sqlite3.Connection):
+        conn.executescript(SQLITE_SCHEMA)
+        for table, columns in SQLITE_ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, kind in columns.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        conn.executescript(SQLITE_INDEXES)
+
+    def _connection(self) -> _SQLiteConnection:
+        if self.path == ":memory:":
+            if self._memory is None:
+                self._memory = _SQLiteConnection(self._connect())
+            return self._memory
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _SQLiteConnection(self._connect())
+        return conn
+
+    @contextmanager
+    def get_connection(self):
+        with self._memory_lock if self.path == ":memory:" else nullcontext():
+            conn = self._connection()
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+    if name == "mysql":
+        return MySQLBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"STORAGE_BACKEND non supportato: {name}")
+
+
+def get_backend() -> StorageBackend:
+    """Backend condiviso dal processo, creato al primo uso (nessuna connessione all'import)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: StorageBackend):
+    """Sostituisce il backend condiviso (es. benchmark o DB finto)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,71 @@
+"""
+Deduplica tra worker con le scritture in batch (DB_BATCH_WRITES=true, il default): due
+DatabaseService con BatchWriter propri sullo stesso file SQLite, come due worker gunicorn.
+Il secondo alert con la stessa impronta deve sollevare DuplicateSignal prima dell'invio
+dell'ordine, anche per un CLOSE (che non ha clientOid da far rifiutare a Bitget).
+
+    python -m pytest tests/test_dedup.py
+"""
+import os
+import sys
+import json
+import uuid
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_module import DatabaseService  # noqa: E402
+from storage import SQLiteBackend  # noqa: E402
+from Order import parse_order_text  # noqa: E402
+from signal_dedup import DuplicateSignal, fingerprint, signal_id_for  # noqa: E402
+
+ALERT = ("Segnale su BTCUSDT.P\nOra: 2024-01-01T00:00:00Z\nPrezzo chiusura: 100\nAzione: {action}\n"
+         "Commento: {comment}\nid trade t-1\nsize: 3\n"
+         "Message: {comment} LONG | Entry: 100 | SL: 95 | TP: 110 | Size: 3")
+
+
+class BatchDedupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "dedup.db")
+        self.workers = [DatabaseService(batch_writes=True, backend=SQLiteBackend(path)) for _ in range(2)]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.writer.close()
+        self.tmp.cleanup()
+
+    def receive(self, worker: DatabaseService, text: str) -> str:
+        """Percorso di app._handle_signal: registrazione con impronta, poi risposta per signal_id."""
+        fp = fingerprint(parse_order_text(text))
+        signal_id = signal_id_for(fp)
+        try:
+            worker.log_incoming_request(signal_id=signal_id, request_text={"text": text}, response_text="null",
+                                        fingerprint=fp, ticker="BTCUSDT")
+            status = "sent"
+        except DuplicateSignal:
+            # Duplicato con un proprio id, senza impronta (come signal_flow.Signal.mark_duplicate)
+            signal_id = str(uuid.uuid4())
+            worker.log_incoming_request(signal_id=signal_id, request_text={"text": text}, response_text="null")
+            status = "duplicate"
+        worker.update_request_response(None, json.dumps({"status": status}), signal_id=signal_id)
+        return status
+
+    def test_same_alert_on_two_workers(self):
+        for comment, action in (("OPEN", "buy"), ("CLOSE", "sell")):
+            with self.subTest(comment):
+                text = ALERT.format(comment=comment, action=action)
+                statuses = [self.receive(worker, text) for worker in self.workers]
+                self.assertEqual(statuses, ["sent", "duplicate"])
+
+                for worker in self.workers:
+                    worker.writer.flush(timeout=10)
+                row = self.workers[1].get_request_by_signal(signal_id_for(fingerprint(parse_order_text(text))))
+                self.assertEqual(json.loads(row["response"]), {"status": "sent"})
+
+
+if __name__ == "__main__":
+    unittest.main()
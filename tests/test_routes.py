@@ -0,0 +1,100 @@
+"""
+Stesse rotte e stesse risposte dal server Flask (app.py) e da quello ASGI (asgi_app.py):
+entrambi sul simulatore Bitget locale con DB in memoria, come benchmarks/bench_asgi.py.
+Ogni server riceve i propri alert (trade id diversi), quindi si confrontano stato HTTP,
+chiavi e "status" delle risposte, non i valori.
+
+    python -m pytest tests/test_routes.py
+
+Richiede aiohttp e uvicorn.
+"""
+import os
+import sys
+import unittest
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bitget_simulator import BitgetSimulator  # noqa: E402
+from memory_db import InMemoryDatabaseService  # noqa: E402
+import bench_asgi  # noqa: E402
+
+OPEN = ("Segnale su BTCUSDT.P\nOra: 2024-01-01T00:00:00Z\nPrezzo chiusura: 100\nAzione: buy\nCommento: OPEN\n"
+        "id trade {server}-open\nsize: 3\nMessage: OPEN LONG | Entry: 100 | SL: 95 | TP: 110 | Size: 3")
+BASKET = ("Segnale su BTCUSDT.P\nOra: 2024-01-01T00:01:00Z\nAzione: buy\nCommento: OPEN\nid trade {server}-basket\n"
+          "ETHUSDT.P LONG SIGNAL | Entry: 100 | Stop Loss: 95 | TP1: 110 | TP2: 120 | TP3: 130 | Size: 3 | "
+          "Qty % → TP1: 30% | TP2: 30% | TP3: 40%\n"
+          # Size nulla: blocco non valido, tra le gambe fallite senza chiamate a Bitget
+          "SOLUSDT.P SHORT SIGNAL | Entry: 100 | Stop Loss: 105 | TP1: 90 | TP2: 80 | TP3: 70 | Size: 0 | "
+          "Qty % → TP1: 30% | TP2: 30% | TP3: 40%")
+NO_TICKER = "Commento: OPEN\nid trade {server}-none"
+
+
+def setUpModule():
+    global simulator, servers
+    simulator = BitgetSimulator(latency_ms=1, jitter_ms=0).start()
+    bench_asgi.configure(simulator, pool_size=4)
+    servers = {"sync": bench_asgi.serve_sync(4, InMemoryDatabaseService()),
+               "asgi": bench_asgi.serve_asgi(InMemoryDatabaseService())}
+
+
+def tearDownModule():
+    simulator.stop()
+
+
+def shape(response) -> tuple:
+    body = response.json()
+    return response.status_code, sorted(body), body.get("status")
+
+
+class RouteParityTest(unittest.TestCase):
+
+    def run_session(self, server: str, url: str) -> dict:
+        post = lambda template: requests.post(url + "/order", json={"text": template.format(server=server)},  # noqa
+                                              timeout=30)
+        get = lambda path: requests.get(url + path, timeout=30)  # noqa: E731
+        opened = post(OPEN)
+        signal_id = get("/signals?limit=1").json()["signals"][0]["signal_id"]
+        calls = get(f"/signal/{signal_id}/calls")
+        duplicate = post(OPEN)
+        basket = post(BASKET)
+        return {
+            "open": shape(opened),
+            "duplicate": shape(duplicate),
+            "basket": shape(basket),
+            "basket_failed": basket.json()["failed"],
+            "no_ticker": shape(post(NO_TICKER)),
+            "status": shape(get(f"/signal/{signal_id}")),
+            "calls": shape(calls),
+            "call_paths": sorted(call["endpoint"] for call in calls.json()["calls"]),
+            "unknown": shape(get("/signal/sconosciuto")),
+            "unknown_calls": shape(get("/signal/sconosciuto/calls")),
+            "other": get(f"/signal/{signal_id}/altro").status_code,  # 404 HTML di Flask
+            "signals": shape(get("/signals?limit=2")),
+            "signals_page": len(get("/signals?limit=2").json()["signals"]),
+            "bad_from": shape(get("/signals?from=ieri")),
+        }
+
+    def test_same_responses(self):
+        sessions = {server: self.run_session(server, url) for server, url in servers.items()}
+        sync, asgi = sessions["sync"], sessions["asgi"]
+        for name in sync:
+            with self.subTest(name):
+                self.assertEqual(sync[name], asgi[name])
+        self.assertEqual(sync["open"][0], 200, sync)
+        self.assertEqual(sync["duplicate"][2], "duplicate")
+        self.assertEqual(sync["basket"][2], "basket")
+        self.assertEqual(sync["basket_failed"], ["SOLUSDT"])
+        self.assertEqual(sync["calls"][0], 200)
+        self.assertIn("/api/v2/mix/order/place-order", sync["call_paths"])
+        self.assertEqual(sync["unknown_calls"][0], 404)
+        self.assertEqual(sync["other"], 404)
+        self.assertEqual(sync["signals_page"], 2)
+        self.assertEqual(sync["bad_from"][0], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
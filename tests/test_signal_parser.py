@@ -0,0 +1,241 @@
+"""
+Equivalenza del parser dei segnali (signal_parser, un solo passaggio) con il codice originale.
+
+baseline_utils.py e baseline_order.py sono copie identiche di utils.py e Order.py del primo
+commit del repository. Le uniche differenze volute sono i casi di EXPECTED_DIFFS, ammesse dal
+fuzz solo nella forma descritta lì:
+- "TPn: 30%" è la quota del TP, non il suo prezzo: non sovrascrive tpn né passa da float();
+- negli alert basket un symbol davanti a "LONG/SHORT SIGNAL" prevale su "Segnale su".
+
+    python -m pytest tests
+    FUZZ_ALERTS=100000 python -m pytest tests/test_signal_parser.py
+"""
+import io
+import os
+import re
+import sys
+import random
+import unittest
+import contextlib
+import subprocess
+from dataclasses import asdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils  # noqa: E402
+import Order  # noqa: E402
+import baseline_utils  # noqa: E402
+import baseline_order  # noqa: E402
+
+FUZZ_ALERTS = int(os.getenv("FUZZ_ALERTS", 5000))
+SEEDS = (1, 2, 3)
+
+# Token TP della baseline (stesso pattern) con il "%" che segue il valore
+TP_TOKENS = re.compile(r"TP(\d):\s*([\d.]+)(%?)", re.IGNORECASE)
+TP_PRICE_KEY = re.compile(r"tp\d")
+
+MULTI_TP = ("OPEN LONG | Entry: 100 | SL: 95 | TP1: 110 | TP2: 120 | TP3: 130 | Size: 3 | "
+            "Qty % → TP1: 30% | TP2: 30% | TP3: 40%")
+BASKET = ("Segnale su BTCUSDT.P\nAzione: buy\nETHUSDT.P LONG SIGNAL | Entry: 1 | Stop Loss: 0.9 | TP1: 1.1 | "
+          "TP2: 1.2 | TP3: 1.3 | Size: 2 | Qty % → TP1: 30% | TP2: 30% | TP3: 40%")
+BASKET_BLOCK = {"timestamp": None, "close_price": None, "action": "buy", "direction": "LONG", "entry": "1",
+                "stop_loss": "0.9", "tp1": "1.1", "tp2": "1.2", "tp3": "1.3", "size": "2",
+                "tp1_qty": "30", "tp2_qty": "30", "tp3_qty": "40"}
+
+# (funzione, testo, esito della baseline, esito attuale)
+EXPECTED_DIFFS = [
+    # La quota "TP1: 30%" sovrascriveva il prezzo del TP1 nella baseline
+    ("parse_signal_string", MULTI_TP,
+     ("ok", {"signal_type": "OPEN", "direction": "LONG", "entry": 100.0, "stop_loss": 95.0,
+             "tp1": 30.0, "tp2": 30.0, "tp3": 40.0, "qty_distribution": {"TP1": 30, "TP2": 30, "TP3": 40},
+             "size": 3.0}),
+     ("ok", {"signal_type": "OPEN", "direction": "LONG", "entry": 100.0, "stop_loss": 95.0,
+             "tp1": 110.0, "tp2": 120.0, "tp3": 130.0, "qty_distribution": {"TP1": 30, "TP2": 30, "TP3": 40},
+             "size": 3.0})),
+    # Una quota senza prezzo del TP non diventa il prezzo
+    ("parse_signal_string", "OPEN LONG | TP1: 25%",
+     ("ok", {"signal_type": "OPEN", "direction": "LONG", "tp1": 25.0, "qty_distribution": {"TP1": 25}}),
+     ("ok", {"signal_type": "OPEN", "direction": "LONG", "qty_distribution": {"TP1": 25}})),
+    # Il valore di una quota non passa da float(): niente ValueError
+    ("parse_signal_string", "OPEN SHORT | Entry: 100 | SL: 105 | TP1: 90 | Qty % → TP1: 1..%",
+     ("error", "ValueError"),
+     ("ok", {"signal_type": "OPEN", "direction": "SHORT", "entry": 100.0, "stop_loss": 105.0, "tp1": 90.0})),
+    # Alert basket: il symbol davanti al blocco prevale su "Segnale su"
+    ("extract_signals_from_text", BASKET,
+     ("ok", [dict(BASKET_BLOCK, symbol="BTCUSDT")]),
+     ("ok", [dict(BASKET_BLOCK, symbol="ETHUSDT")])),
+]
+
+
+def baseline_signal_string(text):
+    # La baseline stampa il risultato su stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        return baseline_utils.parse_signal_string(text)
+
+
+FUNCTIONS = {
+    "parse_signal_string": (baseline_signal_string, utils.parse_signal_string),
+    "extract_signals_from_text": (baseline_utils.extract_signals_from_text, utils.extract_signals_from_text),
+    "utils.parse_order_text": (baseline_utils.parse_order_text, utils.parse_order_text),
+    "Order.parse_order_text": (lambda t: asdict(baseline_order.parse_order_text(t)),
+                               lambda t: asdict(Order.parse_order_text(t))),
+}
+
+
+def outcome(fn, text):
+    try:
+        return ("ok", fn(text))
+    except Exception as e:
+        return ("error", type(e).__name__)
+
+
+# -----------------------------
+# Generazione degli alert
+# -----------------------------
+
+def price(rng):
+    return f"{rng.uniform(0.0001, 70000):.{rng.randint(0, 6)}f}"
+
+
+def sample_alert(rng):
+    tp = [price(rng) for _ in range(3)]
+    pct = [rng.randint(0, 100) for _ in range(3)]
+    message = (f"{rng.choice(['OPEN', 'CLOSE', 'open', 'Close'])} {rng.choice(['LONG', 'SHORT', 'long'])} | "
+               f"Entry: {price(rng)} | {rng.choice(['SL', 'Stop Loss', 'sl'])}: {price(rng)} | ")
+    if rng.random() < 0.7:
+        message += (f"TP1: {tp[0]} | TP2: {tp[1]} | TP3: {tp[2]} | Size: {rng.randint(1, 500)} | "
+                    f"Qty % → TP1: {pct[0]}% | TP2: {pct[1]}% | TP3: {pct[2]}%")
+    else:
+        message += f"TP: {tp[0]} | Size: {rng.randint(1, 500)}"
+    block = (f"{rng.choice(['LONG', 'SHORT'])} SIGNAL | Entry: {price(rng)} | Stop Loss: {price(rng)} | "
+             f"TP1: {tp[0]} | TP2: {tp[1]} | TP3: {tp[2]} | Size: -{rng.randint(1, 9)} | "
+             f"Qty % → TP1: {pct[0]}% | TP2: {pct[1]}% | TP3: {pct[2]}%")
+    lines = [
+        f"Segnale su {rng.choice(['BTCUSDT.P', 'ETHUSDT.P', 'SOLUSDT'])}",
+        f"Ora: 2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T1{rng.randint(0, 9)}:00:00Z",
+        f"Prezzo chiusura: {price(rng)}",
+        f"Azione: {rng.choice(['buy', 'sell'])}",
+        f"Commento: {rng.choice(['OPEN LONG', 'CLOSE SHORT', 'Bullish Rejection Entry'])}",
+        f"id trade {rng.randint(1, 10 ** 6)}",
+        f"size: {rng.randint(1, 500)}",
+        f"Message: {message}",
+    ]
+    if rng.random() < 0.3:
+        lines.append(block)
+        lines.append(block.replace("LONG", "SHORT"))
+    if rng.random() < 0.1:
+        lines.append(f"{rng.choice(['XRPUSDT.P', 'DOGEUSDT'])} {block}")  # blocco di un alert basket
+    return "\n".join(lines)
+
+
+ALPHABET = list("abcdefgSLTPpsz0123456789.:%| \n-→") + [
+    "TP1:", "TP:", "SL:", "Stop Loss:", "Size:", "size:", "Entry:", "OPEN ", "CLOSE ", "LONG", "SHORT",
+    "Segnale su ", "Ora:", "Azione:", "Message:", "id trade ", "Prezzo chiusura:", "Commento:", " SIGNAL | ",
+]
+
+
+def mutate(rng, text):
+    """Inserisce, cancella o duplica frammenti per produrre alert malformati."""
+    chars = list(text)
+    for _ in range(rng.randint(1, 8)):
+        op = rng.random()
+        pos = rng.randint(0, len(chars))
+        if op < 0.4:
+            chars[pos:pos] = list(rng.choice(ALPHABET))
+        elif op < 0.7 and chars:
+            del chars[pos:pos + rng.randint(1, 6)]
+        else:
+            end = min(len(chars), pos + rng.randint(1, 30))
+            chars[pos:pos] = chars[pos:end]
+    return "".join(chars)
+
+
+def corpus(seed, count=FUZZ_ALERTS):
+    """Alert generati con il seed, metà dei quali mutati."""
+    rng = random.Random(seed)
+    for i in range(count):
+        text = sample_alert(rng)
+        yield mutate(rng, text) if i % 2 else text
+
+
+class BaselineCopiesTest(unittest.TestCase):
+
+    def test_copies_match_first_commit(self):
+        for name, copy in (("utils.py", "baseline_utils.py"), ("Order.py", "baseline_order.py")):
+            try:
+                root = subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=ROOT, check=True,
+                                      capture_output=True, text=True).stdout.split()[0]
+                original = subprocess.run(["git", "show", f"{root}:{name}"], cwd=ROOT, check=True,
+                                          capture_output=True).stdout
+            except (OSError, subprocess.CalledProcessError, IndexError):
+                self.skipTest("storia git non disponibile")
+            with open(os.path.join(os.path.dirname(__file__), copy), "rb") as f:
+                self.assertEqual(f.read(), original, f"{copy} non è più identico a {name} del primo commit")
+
+
+class ExpectedDiffsTest(unittest.TestCase):
+
+    def test_expected_diffs(self):
+        for name, text, before, after in EXPECTED_DIFFS:
+            baseline, current = FUNCTIONS[name]
+            with self.subTest(name=name, text=text):
+                self.assertEqual(outcome(baseline, text), before)
+                self.assertEqual(outcome(current, text), after)
+
+
+class FuzzEquivalenceTest(unittest.TestCase):
+
+    def assert_same(self, name):
+        baseline, current = FUNCTIONS[name]
+        for seed in SEEDS:
+            for text in corpus(seed):
+                self.assertEqual(outcome(current, text), outcome(baseline, text), f"{name} diverge su {text!r}")
+
+    def test_utils_parse_order_text(self):
+        self.assert_same("utils.parse_order_text")
+
+    def test_order_parse_order_text(self):
+        self.assert_same("Order.parse_order_text")
+
+    def test_parse_signal_string(self):
+        baseline, current = FUNCTIONS["parse_signal_string"]
+        for seed in SEEDS:
+            for text in corpus(seed):
+                expected, actual = outcome(baseline, text), outcome(current, text)
+                tokens = TP_TOKENS.findall(text)
+                if actual == expected or actual[0] == "error":
+                    self.assertEqual(actual, expected, f"parse_signal_string diverge su {text!r}")
+                    continue
+                # Differenza voluta: i prezzi dei TP vengono solo dai token senza "%"
+                self.assertTrue(any(pct for _, _, pct in tokens), f"differenza senza quote TP su {text!r}")
+                result = dict(actual[1])
+                prices = {key: result.pop(key) for key in list(result) if TP_PRICE_KEY.fullmatch(key)}
+                self.assertEqual(prices, {f"tp{idx}": float(val) for idx, val, pct in tokens if not pct}, text)
+                if expected[0] == "ok":
+                    rest = {key: value for key, value in expected[1].items() if not TP_PRICE_KEY.fullmatch(key)}
+                    self.assertEqual(result, rest, f"parse_signal_string diverge oltre ai TP su {text!r}")
+                else:
+                    # La baseline falliva solo su float() del valore di una quota (es. "TP1: 1..%")
+                    self.assertEqual(expected, ("error", "ValueError"), text)
+
+    def test_extract_signals_from_text(self):
+        baseline, current = FUNCTIONS["extract_signals_from_text"]
+        for seed in SEEDS:
+            for text in corpus(seed):
+                expected, actual = outcome(baseline, text), outcome(current, text)
+                if actual == expected or "error" in (actual[0], expected[0]):
+                    self.assertEqual(actual, expected, f"extract_signals_from_text diverge su {text!r}")
+                    continue
+                self.assertEqual(len(actual[1]), len(expected[1]), text)
+                for old, new in zip(expected[1], actual[1]):
+                    if new["symbol"] != old["symbol"]:
+                        # Differenza voluta: symbol del blocco basket, subito prima di "LONG/SHORT SIGNAL"
+                        pattern = rf"\b{re.escape(new['symbol'])}(?:\.P)?\W*(?:LONG|SHORT) SIGNAL \|"
+                        self.assertRegex(text, pattern)
+                    self.assertEqual(dict(new, symbol=None), dict(old, symbol=None), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Budget di avvio del webhook (modalità lazy di create_app), misurati come benchmarks/bench_startup.py:
+ogni avvio in un interprete nuovo contro il simulatore Bitget locale e SQLite in memoria.
+
+    python -m pytest tests/test_startup.py
+    STARTUP_IMPORT_BUDGET_MS=300 python -m pytest tests/test_startup.py
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bitget_simulator import BitgetSimulator  # noqa: E402
+from bench_startup import IMPORT_BUDGET_MS, PING_BUDGET_MS, run_child, summarize  # noqa: E402
+
+RUNS = 3
+# Connessione al DB più lenta di entrambi i budget: /ping non deve attenderla
+SLOW_DB_MS = 2 * max(IMPORT_BUDGET_MS, PING_BUDGET_MS)
+
+
+class StartupBudgetTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.simulator = BitgetSimulator(latency_ms=30, jitter_ms=0).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.simulator.stop()
+
+    def test_import_and_ping_within_budget(self):
+        runs = [run_child("lazy", self.simulator.base_url, 0) for _ in range(RUNS)]
+        report = summarize(runs)
+        self.assertLessEqual(report["import_ms"], IMPORT_BUDGET_MS, f"import di app.py fuori budget: {report}")
+        self.assertLessEqual(report["ping_ms"], PING_BUDGET_MS, f"prima risposta di /ping fuori budget: {report}")
+        self.assertTrue(all(run["ping_status"] == 200 for run in runs), runs)
+
+    def test_ping_does_not_wait_for_db(self):
+        runs = [run_child("lazy", self.simulator.base_url, SLOW_DB_MS) for _ in range(RUNS)]
+        report = summarize(runs)
+        self.assertLessEqual(report["ping_ms"], PING_BUDGET_MS, f"/ping attende il DB: {report}")
+        self.assertFalse(any(run["ready_at_ping"] for run in runs), "servizi già pronti alla prima /ping")
+        self.assertGreaterEqual(report["ready_ms"], SLOW_DB_MS, report)
+
+
+if __name__ == "__main__":
+    unittest.main()